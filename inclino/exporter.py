@@ -4,7 +4,7 @@ import time
 from prometheus_client import start_http_server, Gauge
 
 INCLO_HOST = "192.168.50.80"
-INCLO_PORT = 2017
+INCLO_PORT = 2019  # inclino_broker.py
 EXPORTER_PORT = 9101
 POLL_INTERVAL = 15
 
@@ -25,6 +25,7 @@ def get_reading():
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.settimeout(5)
         s.connect((INCLO_HOST, INCLO_PORT))
+        s.sendall(f"mean {POLL_INTERVAL}\n".encode())
         data = s.recv(1024).decode().strip()
     parts = data.split("\t")
     reading = {
@@ -9,14 +9,16 @@ import time
 
 REF_JSON_DEFAULT = os.path.expanduser("~/reference_position.json")
 
-PORT = 2017
+BROKER_SOCKET = "/tmp/scl3300-broker.sock"
+REFRESH_S = 0.2
 MIN_RANGE = 0.005  # minimum +/- range in degrees
 
 
 def get_angles():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
         s.settimeout(5)
-        s.connect(("127.0.0.1", PORT))
+        s.connect(BROKER_SOCKET)
+        s.sendall(f"mean {REFRESH_S}\n".encode())
         data = s.recv(1024).decode().strip()
     parts = data.split("\t")
     if len(parts) < 11:
@@ -112,7 +114,7 @@ def main():
             print(f"  error: {e}")
             if args.once:
                 return
-        time.sleep(0.2)
+        time.sleep(REFRESH_S)
 
 
 if __name__ == "__main__":
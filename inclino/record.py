@@ -5,7 +5,7 @@ import time
 import os
 from datetime import date
 
-PORT = 2017
+BROKER_SOCKET = "/tmp/scl3300-broker.sock"
 INTERVAL = 60
 
 
@@ -14,9 +14,10 @@ def output_file():
 
 
 def get_reading():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
         s.settimeout(5)
-        s.connect(("127.0.0.1", PORT))
+        s.connect(BROKER_SOCKET)
+        s.sendall(f"mean {INTERVAL}\n".encode())
         data = s.recv(1024).decode().strip()
     parts = data.split("\t")
     reading = {
@@ -80,6 +80,13 @@ const char SELBANK = 0x1F;
 // Server
 const int PORT = 2017;
 
+// Streaming server: every connected client gets one averaged frame per
+// stream period, from its own accumulator, so streaming never drains the
+// window seen by clients of PORT.
+const int STREAM_PORT = 2018;
+#define STREAM_HZ_DEFAULT 100
+#define MAX_STREAM_CLIENTS 16
+
 // Accumulator for continuous sensor reads — uses int64_t to avoid overflow.
 // At 2 kHz for 60s = 120,000 samples; max sum = 120k * 32767 = 3.93 billion,
 // which exceeds int32_t range (2.15 billion). int64_t handles this safely.
@@ -100,6 +107,23 @@ static accumulator_t g_acc = {
     .mutex = PTHREAD_MUTEX_INITIALIZER
 };
 
+// Same samples as g_acc, drained by the streamer thread instead of PORT clients
+static accumulator_t g_stream_acc = {
+    .sum_x = 0, .sum_y = 0, .sum_z = 0,
+    .sum_temp = 0,
+    .sum_ang_x = 0, .sum_ang_y = 0, .sum_ang_z = 0,
+    .count = 0, .last_sto = -100,
+    .mutex = PTHREAD_MUTEX_INITIALIZER
+};
+
+// Connected streaming clients, -1 means free slot
+static int g_stream_clients[MAX_STREAM_CLIENTS];
+static pthread_mutex_t g_stream_clients_mutex = PTHREAD_MUTEX_INITIALIZER;
+static int stream_hz = STREAM_HZ_DEFAULT;
+
+// Guards the first-read reference, frames are formatted from two threads
+static pthread_mutex_t g_ref_mutex = PTHREAD_MUTEX_INITIALIZER;
+
 static uint8_t CRC8(uint8_t BitValue, uint8_t CRC)
 {
   uint8_t Temp;
@@ -413,6 +437,23 @@ void setMode4(int h) {
   }
 }
 
+void accumulate(accumulator_t *acc, short x, short y, short z, short sto,
+                short temp_raw, short ang_x, short ang_y, short ang_z) {
+  pthread_mutex_lock(&acc->mutex);
+  acc->sum_x += x;
+  acc->sum_y += y;
+  acc->sum_z += z;
+  acc->sum_temp += temp_raw;
+  acc->sum_ang_x += ang_x;
+  acc->sum_ang_y += ang_y;
+  acc->sum_ang_z += ang_z;
+  acc->count++;
+  if (sto != -100) {
+    acc->last_sto = sto;
+  }
+  pthread_mutex_unlock(&acc->mutex);
+}
+
 // Background thread: continuously reads sensor at ODR to maintain noise performance
 // (datasheet section 4.1) and accumulates samples for averaging.
 void *reader_thread(void *arg) {
@@ -460,19 +501,8 @@ void *reader_thread(void *arg) {
     // Only accumulate if all reads succeeded
     if (x != -100 && y != -100 && z != -100 && temp_raw != -1000
         && ang_x != -32768 && ang_y != -32768 && ang_z != -32768) {
-      pthread_mutex_lock(&g_acc.mutex);
-      g_acc.sum_x += x;
-      g_acc.sum_y += y;
-      g_acc.sum_z += z;
-      g_acc.sum_temp += temp_raw;
-      g_acc.sum_ang_x += ang_x;
-      g_acc.sum_ang_y += ang_y;
-      g_acc.sum_ang_z += ang_z;
-      g_acc.count++;
-      if (sto != -100) {
-        g_acc.last_sto = sto;
-      }
-      pthread_mutex_unlock(&g_acc.mutex);
+      accumulate(&g_acc, x, y, z, sto, temp_raw, ang_x, ang_y, ang_z);
+      accumulate(&g_stream_acc, x, y, z, sto, temp_raw, ang_x, ang_y, ang_z);
     }
 
     time_sleep(delay_s);
@@ -480,7 +510,9 @@ void *reader_thread(void *arg) {
   return NULL;
 }
 
-void collectSensorData(char *dataSending, size_t dataCapacity) {
+// Formats one averaged frame from acc into dataSending and resets acc.
+// Returns the number of samples averaged, 0 if there were none yet.
+uint32_t collectSensorData(accumulator_t *acc, char *dataSending, size_t dataCapacity, bool verbose) {
 	char* p = dataSending;
 	char* end = dataSending + dataCapacity;
 	int n = 0;
@@ -491,29 +523,29 @@ void collectSensorData(char *dataSending, size_t dataCapacity) {
   uint32_t snap_count;
   short snap_sto;
 
-  pthread_mutex_lock(&g_acc.mutex);
-  snap_x = g_acc.sum_x;
-  snap_y = g_acc.sum_y;
-  snap_z = g_acc.sum_z;
-  snap_temp = g_acc.sum_temp;
-  snap_ang_x = g_acc.sum_ang_x;
-  snap_ang_y = g_acc.sum_ang_y;
-  snap_ang_z = g_acc.sum_ang_z;
-  snap_count = g_acc.count;
-  snap_sto = g_acc.last_sto;
-  g_acc.sum_x = 0;
-  g_acc.sum_y = 0;
-  g_acc.sum_z = 0;
-  g_acc.sum_temp = 0;
-  g_acc.sum_ang_x = 0;
-  g_acc.sum_ang_y = 0;
-  g_acc.sum_ang_z = 0;
-  g_acc.count = 0;
-  pthread_mutex_unlock(&g_acc.mutex);
+  pthread_mutex_lock(&acc->mutex);
+  snap_x = acc->sum_x;
+  snap_y = acc->sum_y;
+  snap_z = acc->sum_z;
+  snap_temp = acc->sum_temp;
+  snap_ang_x = acc->sum_ang_x;
+  snap_ang_y = acc->sum_ang_y;
+  snap_ang_z = acc->sum_ang_z;
+  snap_count = acc->count;
+  snap_sto = acc->last_sto;
+  acc->sum_x = 0;
+  acc->sum_y = 0;
+  acc->sum_z = 0;
+  acc->sum_temp = 0;
+  acc->sum_ang_x = 0;
+  acc->sum_ang_y = 0;
+  acc->sum_ang_z = 0;
+  acc->count = 0;
+  pthread_mutex_unlock(&acc->mutex);
 
   if (snap_count == 0) {
     snprintf(dataSending, dataCapacity, "ERROR: no samples accumulated yet\n");
-    return;
+    return 0;
   }
 
   // Average using double to preserve precision
@@ -528,6 +560,7 @@ void collectSensorData(char *dataSending, size_t dataCapacity) {
 	double len;
   double angle, angle_deg;
 
+  pthread_mutex_lock(&g_ref_mutex);
   if (first_read) {
       x_0 = (short)(avg_x + 0.5);
       y_0 = (short)(avg_y + 0.5);
@@ -536,6 +569,7 @@ void collectSensorData(char *dataSending, size_t dataCapacity) {
       first_read = false;
       printf("reference: first-read x=%d y=%d z=%d (raw)\n", x_0, y_0, z_0);
   }
+  pthread_mutex_unlock(&g_ref_mutex);
   len = sqrt(avg_x * avg_x + avg_y * avg_y + avg_z * avg_z);
   angle = acos((x_0 * avg_x + y_0 * avg_y + z_0 * avg_z) / (len_0 * len));
   angle_deg = angle * (180.0 / M_PI);
@@ -589,7 +623,95 @@ void collectSensorData(char *dataSending, size_t dataCapacity) {
 		exit(1);
 	}
 
-  printf("angle=%f samples=%u\n", angle_deg, snap_count);
+  if (verbose) {
+    printf("angle=%f samples=%u\n", angle_deg, snap_count);
+  }
+
+  return snap_count;
+}
+
+int listenOn(int port) {
+		struct sockaddr_in ipOfServer;
+		int listn = socket(AF_INET, SOCK_STREAM, 0);
+		memset(&ipOfServer, '0', sizeof(ipOfServer));
+		ipOfServer.sin_family = AF_INET;
+		ipOfServer.sin_addr.s_addr = htonl(INADDR_ANY);
+		ipOfServer.sin_port = htons(port);
+		bind(listn, (struct sockaddr*)&ipOfServer , sizeof(ipOfServer));
+		listen(listn , 20);
+		return listn;
+}
+
+// Accepts streaming clients on STREAM_PORT and registers them for the streamer
+void *stream_accept_thread(void *arg) {
+  int listn = listenOn(STREAM_PORT);
+
+  while (true) {
+    int conn = accept(listn, (struct sockaddr*)NULL, NULL);
+    if (conn < 0) {
+      continue;
+    }
+
+    bool added = false;
+    pthread_mutex_lock(&g_stream_clients_mutex);
+    for (int i = 0; i < MAX_STREAM_CLIENTS; ++i) {
+      if (g_stream_clients[i] == -1) {
+        g_stream_clients[i] = conn;
+        added = true;
+        break;
+      }
+    }
+    pthread_mutex_unlock(&g_stream_clients_mutex);
+
+    if (!added) {
+      printf("stream: too many clients, dropping new connection\n");
+      close(conn);
+    }
+  }
+  return NULL;
+}
+
+// Pushes one averaged frame per stream period to every streaming client
+void *streamer_thread(void *arg) {
+  char frame[1025];
+  double period_s = 1.0 / stream_hz;
+
+  while (true) {
+    time_sleep(period_s);
+
+    pthread_mutex_lock(&g_stream_clients_mutex);
+    int num_clients = 0;
+    for (int i = 0; i < MAX_STREAM_CLIENTS; ++i) {
+      if (g_stream_clients[i] != -1) {
+        num_clients++;
+      }
+    }
+    pthread_mutex_unlock(&g_stream_clients_mutex);
+
+    // always drain, so a new client does not get a stale long window
+    if (collectSensorData(&g_stream_acc, frame, sizeof(frame), false) == 0 || num_clients == 0) {
+      continue;
+    }
+
+    size_t len = strlen(frame);
+    pthread_mutex_lock(&g_stream_clients_mutex);
+    for (int i = 0; i < MAX_STREAM_CLIENTS; ++i) {
+      int conn = g_stream_clients[i];
+      if (conn == -1) {
+        continue;
+      }
+      // never block the streamer on a slow client, it just misses this frame;
+      // one that took part of it would read the rest run into the next frame,
+      // so it is dropped and reconnects
+      ssize_t sent = send(conn, frame, len, MSG_NOSIGNAL | MSG_DONTWAIT);
+      if ((sent < 0 && errno != EAGAIN && errno != EWOULDBLOCK) || (sent >= 0 && (size_t)sent < len)) {
+        close(conn);
+        g_stream_clients[i] = -1;
+      }
+    }
+    pthread_mutex_unlock(&g_stream_clients_mutex);
+  }
+  return NULL;
 }
 
 void swResetAndCheck(int h) {
@@ -631,7 +753,7 @@ int main(int argc, char *argv[]) {
 
     int cli_rx = 0, cli_ry = 0, cli_rz = 0;
 
-    while ((opt = getopt(argc, argv, "r:f:")) != -1) {
+    while ((opt = getopt(argc, argv, "r:f:s:")) != -1) {
         switch (opt) {
         case 'r':
             if (sscanf(optarg, "%d,%d,%d", &cli_rx, &cli_ry, &cli_rz) == 3) {
@@ -644,8 +766,15 @@ int main(int argc, char *argv[]) {
         case 'f':
             ref_file = optarg;
             break;
+        case 's':
+            stream_hz = atoi(optarg);
+            if (stream_hz < 1 || stream_hz > 1000) {
+                fprintf(stderr, "Usage: -s stream_hz (1-1000, frames per second pushed on port %d)\n", STREAM_PORT);
+                return 1;
+            }
+            break;
         default:
-            fprintf(stderr, "Usage: %s [-r raw_x,raw_y,raw_z] [-f reference.json]\n", argv[0]);
+            fprintf(stderr, "Usage: %s [-r raw_x,raw_y,raw_z] [-f reference.json] [-s stream_hz]\n", argv[0]);
             return 1;
         }
     }
@@ -679,15 +808,8 @@ int main(int argc, char *argv[]) {
 		// start TCP server
 		char dataSending[1025]; // Actually this is called packet in Network Communication, which contain data and send through.
 		int clintListn = 0, clintConnt = 0;
-		struct sockaddr_in ipOfServer;
-		clintListn = socket(AF_INET, SOCK_STREAM, 0); // creating socket
-		memset(&ipOfServer, '0', sizeof(ipOfServer));
+		clintListn = listenOn(PORT); // this is the port number of running server
 		memset(dataSending, '0', sizeof(dataSending));
-		ipOfServer.sin_family = AF_INET;
-		ipOfServer.sin_addr.s_addr = htonl(INADDR_ANY);
-		ipOfServer.sin_port = htons(PORT); // this is the port number of running server
-		bind(clintListn, (struct sockaddr*)&ipOfServer , sizeof(ipOfServer));
-		listen(clintListn , 20);
 
 
     // read sensor data for ever TCP request
@@ -712,10 +834,24 @@ int main(int argc, char *argv[]) {
     }
     pthread_detach(reader_tid);
 
+    // Launch streaming server threads
+    for (int i = 0; i < MAX_STREAM_CLIENTS; ++i) {
+        g_stream_clients[i] = -1;
+    }
+    pthread_t stream_accept_tid, streamer_tid;
+    if (pthread_create(&stream_accept_tid, NULL, stream_accept_thread, NULL) != 0 ||
+        pthread_create(&streamer_tid, NULL, streamer_thread, NULL) != 0) {
+        printf("Failed to create streaming threads!\n");
+        return 1;
+    }
+    pthread_detach(stream_accept_tid);
+    pthread_detach(streamer_tid);
+
 		printf("Listening on port %d, reader at %d%% ODR speed\n", PORT, READ_SPEED_PCT);
+		printf("Streaming on port %d at %d Hz\n", STREAM_PORT, stream_hz);
 		while (true) {
 				clintConnt = accept(clintListn, (struct sockaddr*)NULL, NULL);
-				collectSensorData(&dataSending[0], 1025);
+				collectSensorData(&g_acc, &dataSending[0], 1025, true);
 				write(clintConnt, dataSending, strlen(dataSending));
 
         close(clintConnt);
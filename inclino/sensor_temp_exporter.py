@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 """Prometheus exporter for SCL3300-D01 sensor temperature.
 
-Reads from the local inclinometer TCP server (port 2017) and exposes
+Reads from the local inclinometer broker (inclino_broker.py) and exposes
 the sensor temperature as a Prometheus gauge on port 9103.
 """
 import socket
 import time
 from prometheus_client import start_http_server, Gauge
 
-INCLO_PORT = 2017
+BROKER_SOCKET = "/tmp/scl3300-broker.sock"
 EXPORTER_PORT = 9103
 POLL_INTERVAL = 15
 
@@ -16,9 +16,10 @@ g_temp = Gauge("scl3300_temperature_celsius", "SCL3300-D01 sensor temperature")
 
 
 def get_sensor_temp():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
         s.settimeout(5)
-        s.connect(("127.0.0.1", INCLO_PORT))
+        s.connect(BROKER_SOCKET)
+        s.sendall(f"mean {POLL_INTERVAL}\n".encode())
         data = s.recv(1024).decode().strip()
     parts = data.split("\t")
     return float(parts[7])
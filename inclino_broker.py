@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Sample broker for the SCL3300 daemon.
+
+The broker is the only reader of collect.c. It takes every frame from the
+fixed-cadence streaming port, keeps the last minutes of them and serves any
+number of subscribers, each with its own averaging window, so readers no
+longer take samples from each other.
+
+Subscribers connect to BROKER_SOCKET (or BROKER_PORT for other hosts) and send
+one request line:
+
+    mean <window_s>     one frame averaged over the last window_s, then close
+    stream <window_s>   one frame averaged over each window_s, forever
+                        (stream 0 forwards every frame as is)
+
+Replies use collect.c's tab separated format with the number of averaged
+frames appended as a 12th field.
+
+With several reflectors (see solar_tracker/trackers.py) each inclinometer
+daemon gets its own broker:
+
+    inclino_broker.py [--stream-port 2018] [--socket /tmp/scl3300-broker.sock] [--port 2019]
+"""
+import argparse
+import os
+import socketserver
+import threading
+import time
+
+from solar_tracker.inclino_client import BROKER_SOCKET
+from solar_tracker.inclino_client import InclinoClient
+from solar_tracker.inclino_client import STREAM_PORT
+from solar_tracker.inclino_client import format_sample
+from solar_tracker.inclino_client import mean_sample
+
+BROKER_PORT = 2019  # same protocol over TCP, for the exporter on other hosts
+
+MAX_WINDOW_S = 120
+RING_SIZE = 100 * MAX_WINDOW_S  # frames at the default 100 Hz stream
+
+SOURCE = None
+
+
+class SubscriberHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            command, window_s = self.rfile.readline().decode().split()
+            window_s = float(window_s)
+            if not 0 <= window_s <= MAX_WINDOW_S:
+                raise ValueError("window must be 0..{}s".format(MAX_WINDOW_S))
+        except ValueError as e:
+            self.wfile.write("ERROR: bad request, {}\n".format(e).encode())
+            return
+
+        try:
+            if command == "mean":
+                self.send_mean(window_s)
+            elif command == "stream":
+                if window_s == 0:
+                    self.stream_frames()
+                else:
+                    self.stream_means(window_s)
+            else:
+                self.wfile.write("ERROR: unknown command {}\n".format(command).encode())
+        except TimeoutError as e:
+            self.wfile.write("ERROR: {}\n".format(e).encode())
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # subscriber went away
+
+    def send_mean(self, window_s):
+        latest = SOURCE.latest()
+        if latest is None:
+            latest = SOURCE.next_sample()
+
+        window = SOURCE.samples_between(latest.ts - window_s, latest.ts)
+        if len(window) == 0:
+            window = [latest]
+        self.wfile.write(format_sample(mean_sample(window), count=len(window)))
+
+    def stream_frames(self):
+        sample = SOURCE.next_sample()
+        while True:
+            self.wfile.write(format_sample(sample, count=1))
+            sample = SOURCE.next_sample(after_ts=sample.ts)
+
+    def stream_means(self, window_s):
+        window_start = time.time()
+        while True:
+            window_end = window_start + window_s
+            time.sleep(max(0, window_end - time.time()))
+
+            # wait for the first frame past the window so it is complete
+            SOURCE.next_sample(after_ts=window_end)
+            window = SOURCE.samples_between(window_start, window_end)
+            if len(window) > 0:
+                self.wfile.write(format_sample(mean_sample(window), count=len(window)))
+
+            window_start = window_end
+
+
+class UnixBrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TCPBrokerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stream-port", type=int, default=STREAM_PORT, help="collect.c's streaming port")
+    parser.add_argument("--socket", default=BROKER_SOCKET)
+    parser.add_argument("--port", type=int, default=BROKER_PORT)
+    args = parser.parse_args()
+
+    SOURCE = InclinoClient(port=args.stream_port, ring_size=RING_SIZE)
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    unix_server = UnixBrokerServer(args.socket, SubscriberHandler)
+    tcp_server = TCPBrokerServer(('', args.port), SubscriberHandler)
+
+    print("Broker serving {} and port {}".format(args.socket, args.port))
+    threading.Thread(target=tcp_server.serve_forever, daemon=True).start()
+    unix_server.serve_forever()
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 
-import json
 import sys
 import math
 import sys
@@ -8,29 +7,19 @@ import time
 import os
 from shutil import get_terminal_size
 
-import threading
-import socket
-from http.server import BaseHTTPRequestHandler
-from http.server import HTTPServer
-
 import logging
 
-import RPi.GPIO as GPIO
 import time
 import random
 
-# shunt imports
-from ina219 import INA219
-from ina219 import DeviceRangeError
-
-# Set the constants that were calculated
-SHUNT_MV = 75
-MAX_EXPECTED_AMPS = 100
-SHUNT_OHMS = (SHUNT_MV / 1000) / MAX_EXPECTED_AMPS  # R = V / i
+from solar_tracker import actuator
+from solar_tracker.inclino_client import BROKER_SOCKET
+from solar_tracker.inclino_client import InclinoClient
+from solar_tracker.metrics_server import start_metrics_server
+from solar_tracker.power_sampler import PowerSampler
 
 MEASURE_SLEEP = 0.01
 
-SENSOR_PORT = 2017
 MEASUREMENTS_FILE = "/home/pi/measurements.txt"
 MEASUREMENTS_FILE = "/home/pi/measurements.txt"
 ACTUATOR_FILE = "/home/pi/actuator.txt"
@@ -51,58 +40,32 @@ ret_channel = 20
 ext_channel = 21
 sleep_time = 0.5
 
-def setup():
-    # GPIO setup
-    GPIO.setmode(GPIO.BCM)
-
 def motor_on(pin):
-    setup()
-    GPIO.setup(pin, GPIO.OUT)
-    GPIO.output(pin, GPIO.HIGH)  # Turn motor on
+    actuator.setup(pin)
+    actuator.motor_on(pin)
 
 def motor_off(pin):
-    setup()
-    GPIO.setup(pin, GPIO.OUT)
-    GPIO.output(pin, GPIO.LOW)  # Turn motor off
+    actuator.setup(pin)
+    actuator.motor_off(pin)
 
 def ext(duration_s):
-    setup()
-    motor_on(ext_channel)
-    time.sleep(duration_s)
-    motor_off(ext_channel)
+    actuator.move_arm(ext_channel, duration_s)
 
 def ret(duration_s):
-    setup()
-    GPIO.setup(ret_channel, GPIO.OUT)
-    motor_on(ret_channel)
-    time.sleep(duration_s)
-    motor_off(ret_channel)
+    actuator.move_arm(ret_channel, duration_s)
 
 logging.getLogger("imported_module").setLevel(logging.WARNING)
 
-LAST_WATTS_READ = None
 
 class WattsFetcher(object):
     def __init__(self):
-        # Instantiate the ina object with the above constants
-        self.ina = INA219(SHUNT_OHMS, MAX_EXPECTED_AMPS, address=0x40)
-        # Configure the object with the expected bus voltage
-        # (either up to 16V or up to 32V with .RANGE_32V)
-        # Also, configure the gain to be GAIN_2_80MW for the above example
-        self.ina.configure(voltage_range=INA219.RANGE_32V)
-
-        #if not ina.is_conversion_ready():
-        #    log("INA Conversion not ready, sleeping for 100ms")
-        #    time.sleep(0.1)
-        #    continue
+        self.sampler = PowerSampler(log=log)
 
     def read(self):
-        try:
-            measured_power = self.ina.power()  # Power in milliwatts
-            return {"milliwatts": measured_power, "ts": time.time()}
-
-        except Exception as e:
-            log("Exception when reading from INA, {}".format(e))
+        sample = self.sampler.latest()
+        if sample is None:
+            return None
+        return {"milliwatts": sample["power"], "ts": sample["ts"]}
 
 
 class Metrics(object):
@@ -136,49 +99,6 @@ class Metrics(object):
 
 METRICS = Metrics()
 
-class MetricsHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header("Content-type", "application/json")
-        self.end_headers()
-
-        response_obj = METRICS.getValue()
-        self.wfile.write(json.dumps(response_obj).encode(encoding='utf_8'))
-
-        # # debug print in a way that is easy to read
-        # value = response_obj.get("value")
-        # new_obj = {}
-        # for k, v in response_obj.items():
-        #     if k != "value":
-        #         new_obj[k] = v
-        # print("{}\t{}".format(new_obj, value))
-
-    def log_message(self, *args):
-        pass
-
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sock.bind(Metrics.ADDR)
-sock.listen(5)
-
-class MetricsListenerThread(threading.Thread):
-    def __init__(self, i):
-        threading.Thread.__init__(self)
-        self.i = i
-        self.daemon = True
-        self.start()
-        self.httpd = None
-
-    def run(self):
-        httpd = HTTPServer(Metrics.ADDR, MetricsHandler, False)
-        httpd.socket = sock
-        httpd.server_bind = self.server_close = lambda self: None
-        httpd.serve_forever()
-        self.httpd = httpd
-
-# Launch listener threads for Metrics
-LISTENER_THREADS = [MetricsListenerThread(i) for i in range(Metrics.NUM_LISTENER_THREADS)]
-
 def pretty_print_pow(measured_power):
     label = "Power: %.3f W " % (measured_power / 1000)
     term_width = get_terminal_size()[0] - len(label) - 1
@@ -195,49 +115,6 @@ def pretty_print_deg(angle_degrees):
     log(label + ("*" * int(term_width * ratio)))
 
 
-# calculating simple moving average over window_size points
-def rolling_mean(data, window_size):
-    moving_averages = []
-
-    for i in range(len(data)):
-        new_window_size = window_size
-        if (i + 1) >= window_size:
-            window_start = i - (window_size - 1)
-        else:
-            window_start = 0
-            new_window_size = i + 1
-
-        window = data[window_start:(i + 1)]
-        window_average = sum(window) / new_window_size
-        moving_averages.append(window_average)
-
-    return moving_averages
-
-
-def has_wobble(angles):
-    # 1. when SMA stops changing more than 0.01 degree from previous sma datapoint
-    sma = rolling_mean(angles, 300)
-    prev_sma = sma[0] - 1  # first data point always fails condition 1
-    for i in range(len(sma)):
-        currnet_sma = sma[i]
-        if abs(prev_sma - currnet_sma) > 0.001:
-            sma[i] = None  # fail condition 1
-
-        prev_sma = currnet_sma
-
-    # 2. values are within 0.05 degree of the SMA
-    for i in range(len(sma)):
-        if sma[i] is not None and abs(angles[i] - sma[i]) > 0.05:
-            sma[i] = None
-
-    # 3. all of the aboive is true for the the last 50 datapoints
-    for s in sma[-50:]:
-        if s is None:
-            return True
-
-    return False  # does not have wobble
-
-
 class MeasurementsRecorder(object):
     def __init__(self, is_ext):
         self.count = 0
@@ -264,12 +141,9 @@ class MeasurementsRecorder(object):
                 pretty_print_pow(milliwatts)
 
 
-def get_line():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect(("127.0.0.1", SENSOR_PORT))
-        return s.recv(1024)
-
 if __name__ == "__main__":
+    start_metrics_server(METRICS, Metrics.ADDR, Metrics.NUM_LISTENER_THREADS)
+    inclino = InclinoClient(path=BROKER_SOCKET, log=log)
     wattsFetcher = WattsFetcher()
     duration = 30
     if len(sys.argv) > 1 and sys.argv[1] == "1":
@@ -283,6 +157,7 @@ if __name__ == "__main__":
         arm_channel = ret_channel
 
     recorder = MeasurementsRecorder(is_ext)
+    sample = None
 
     num_stops = 8
     duration /= num_stops
@@ -300,19 +175,18 @@ if __name__ == "__main__":
                             log("time for a stop")
                             done = True
                         else:
-                            line = None
                             try:
-                                line = get_line()
-                                ts, x, y, z, angle, crc_ok_rate, sto = line.split(b'\t')
+                                inclino.next_sample(after_ts=sample.ts if sample else None)
+                                # the newest frame, the stream runs faster than this loop
+                                sample = inclino.latest()
                             except Exception as e:
                                 log("ERROR: could not read data from network")
                                 log(repr(e))
-                                log(repr(line))
                                 sys.exit(1)
 
-                            if -70 < int(sto) < 70:
-                                angle = float(angle)
-                                ts = float(ts)
+                            if -70 < sample.sto < 70:
+                                angle = sample.angle
+                                ts = sample.ts
 
                                 if time.time() - ts > 0.1:
                                     log("ERROR: sensor data is too stale")
@@ -326,7 +200,7 @@ if __name__ == "__main__":
                                     log("did not get angle")
 
                             else:
-                                log("Bad STO (self test output) {} for {}".format(sto, line))
+                                log("Bad STO (self test output) {} for {}".format(sample.sto, sample))
 
                             time.sleep(MEASURE_SLEEP)
 
@@ -337,11 +211,9 @@ if __name__ == "__main__":
                     time.sleep(MEASURE_SLEEP)
 
                 except KeyboardInterrupt:
-                    GPIO.cleanup()
+                    actuator.cleanup()
                     motor_off(arm_channel)
-                    LAST_WATTS_READ.stop_reads = True
-                    LAST_WATTS_READ.join()
                     log("done")
 
                 finally:
-                    GPIO.cleanup()
+                    actuator.cleanup()
@@ -0,0 +1,6 @@
+"""Solar reflector tracker.
+
+Importing the package or any of its modules does not touch the hardware,
+bind ports or start threads; solar_tracker.controller.Controller.start()
+does that.
+"""
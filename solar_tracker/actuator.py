@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Linear actuator relays on the Raspberry Pi GPIO.
+
+RPi.GPIO and pigpio are imported on first use, so the controller can be
+imported and tested on machines without them.
+
+Pins are set up once, on their first use after a cleanup, not on every
+move. Timed pulses are pigpio waves when the pigpio daemon runs: the DMA
+engine switches the relay on and off, so no thread of this process times
+the pulse, and the falling edge is queued before the rising one goes out,
+so not even a crash leaves the motor running. Without pigpio a thread of
+its own at real-time priority (if the process may have it) times the
+pulses, sleeping through most of each and spinning for the last SPIN_S.
+Priority doesn't help a thread waiting for the GIL, so the interpreter's
+switch interval is shortened while a pulse runs.
+
+Either way pulse() returns how long the motor actually ran, from pigpio's
+edge ticks or the thread's clock around the two writes.
+"""
+import os
+import queue
+import sys
+import threading
+import time
+
+from solar_tracker.hal import Actuator
+
+SPIN_S = 0.002  # the end of a thread timed pulse is busy waited, sleeps wake late
+PULSE_PRIORITY = 50  # SCHED_FIFO, above the sampler and metrics threads
+PULSE_SWITCH_INTERVAL_S = 0.0002  # how long other threads keep the GIL while a pulse runs
+WAVE_POLL_S = 0.01
+EDGE_TIMEOUT_S = 0.5  # for pigpio to report the falling edge after the wave
+PULSE_TIMEOUT_MARGIN_S = 1.0  # past the duration, for the pulse thread to answer
+
+_GPIO = None
+_SET_UP = set()  # output channels since the last cleanup
+_WAVES = None  # WaveTimer, False without pigpio
+_THREAD = None  # ThreadTimer
+
+
+def gpio():
+    global _GPIO
+    if _GPIO is None:
+        import RPi.GPIO as GPIO
+        _GPIO = GPIO
+    return _GPIO
+
+
+def setup(channel):
+    # GPIO setup, once per channel
+    if channel in _SET_UP:
+        return
+    if len(_SET_UP) == 0:
+        gpio().setmode(gpio().BCM)
+    gpio().setup(channel, gpio().OUT, initial=gpio().LOW)
+    _SET_UP.add(channel)
+
+
+def motor_on(pin):
+    gpio().output(pin, gpio().HIGH)  # Turn motor on
+
+
+def motor_off(pin):
+    gpio().output(pin, gpio().LOW)  # Turn motor off
+
+
+class WaveTimer(object):
+    """
+    Pulses as pigpio waves, on-times from pigpio's edge ticks (microseconds,
+    sampled every 5us)
+    """
+    def __init__(self, pi):
+        self.pi = pi
+        self.max_s = pi.wave_get_max_micros() / 1e6
+        self.callbacks = {}  # channel -> pigpio callback
+        self.cond = threading.Condition()
+        self.ticks = []  # rising, falling edge of the current pulse
+        self.channel = None
+
+    @staticmethod
+    def connect():
+        """
+        None without pigpio or its daemon
+        """
+        try:
+            import pigpio
+        except ImportError:
+            return None
+        pi = pigpio.pi()
+        if not pi.connected:
+            return None
+        return WaveTimer(pi)
+
+    def _edge(self, channel, level, tick):
+        with self.cond:
+            if level == 1:
+                self.ticks = [tick]
+            elif level == 0 and len(self.ticks) == 1:
+                self.ticks.append(tick)
+                self.cond.notify_all()
+
+    def pulse(self, channel, duration_s):
+        import pigpio
+
+        if channel not in self.callbacks:
+            self.callbacks[channel] = self.pi.callback(channel, pigpio.EITHER_EDGE, self._edge)
+        with self.cond:
+            self.ticks = []
+
+        self.pi.wave_add_generic([
+            pigpio.pulse(1 << channel, 0, int(round(duration_s * 1e6))),
+            pigpio.pulse(0, 1 << channel, 0),
+        ])
+        wave = self.pi.wave_create()
+        self.channel = channel
+        try:
+            self.pi.wave_send_once(wave)
+            while self.pi.wave_tx_busy():
+                time.sleep(WAVE_POLL_S)
+        except BaseException:
+            self.stop()
+            raise
+        finally:
+            self.channel = None
+            self.pi.wave_delete(wave)
+
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.ticks) == 2, EDGE_TIMEOUT_S)
+            ticks = list(self.ticks)
+        if len(ticks) < 2:
+            return duration_s  # edges missed, the wave ran as requested
+        return pigpio.tickDiff(ticks[0], ticks[1]) / 1e6
+
+    def stop(self):
+        self.pi.wave_tx_stop()
+        if self.channel is not None:
+            self.pi.write(self.channel, 0)
+
+
+class ThreadTimer(threading.Thread):
+    """
+    Pulses timed by a thread of their own, one at a time
+    """
+    def __init__(self, log=print):
+        threading.Thread.__init__(self, name="pulse", daemon=True)
+        self.log = log
+        self.requests = queue.Queue()
+        self.abort = threading.Event()
+        self.busy = threading.Lock()  # held while the motor runs
+        self.start()
+
+    def run(self):
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(PULSE_PRIORITY))
+            self.log("Actuator pulses: timed by a thread at SCHED_FIFO priority {}".format(PULSE_PRIORITY))
+        except (AttributeError, OSError) as e:
+            self.log("Actuator pulses: timed by a thread at normal priority, no SCHED_FIFO: {}".format(e))
+
+        while True:
+            channel, duration_s, done = self.requests.get()
+            with self.busy:
+                if self.abort.is_set():
+                    # taken off the queue just before stop() drained it
+                    done.put(RuntimeError("Pulse cancelled, the actuator was stopped"))
+                    continue
+                try:
+                    done.put(self._pulse(channel, duration_s))
+                except Exception as e:
+                    done.put(e)  # raised in pulse(), the thread goes on
+
+    def _pulse(self, channel, duration_s):
+        # a woken thread waits for the GIL up to the switch interval, 5ms by default
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(PULSE_SWITCH_INTERVAL_S)
+        try:
+            motor_on(channel)
+            on_ts = time.perf_counter()
+            try:
+                end_ts = on_ts + duration_s
+                if not self.abort.wait(max(end_ts - SPIN_S - on_ts, 0)):
+                    while time.perf_counter() < end_ts and not self.abort.is_set():
+                        pass
+            finally:
+                motor_off(channel)
+            return time.perf_counter() - on_ts
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+    def pulse(self, channel, duration_s):
+        done = queue.Queue()
+        self.abort.clear()
+        self.requests.put((channel, duration_s, done))
+        try:
+            result = done.get(timeout=duration_s + PULSE_TIMEOUT_MARGIN_S)
+        except queue.Empty:
+            self.stop()
+            raise RuntimeError("Pulse thread did not answer within {:0.1f}s of a {:0.3f}s pulse on channel {}".format(
+                PULSE_TIMEOUT_MARGIN_S, duration_s, channel))
+        except BaseException:
+            self.stop()
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stop(self):
+        """
+        Drops the queued pulses and cuts the running one short, returns once
+        the motor is off
+        """
+        while True:
+            try:
+                _, _, done = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            done.put(RuntimeError("Pulse cancelled, the actuator was stopped"))
+        self.abort.set()
+        with self.busy:
+            pass
+
+
+def pulse(channel, duration_s, log=print):
+    """
+    Runs the motor for duration_s, returns how long it actually ran
+    """
+    global _WAVES, _THREAD
+    setup(channel)
+    if _WAVES is None:
+        _WAVES = WaveTimer.connect() or False
+        if _WAVES:
+            log("Actuator pulses: pigpio waves, up to {:0.0f}s".format(_WAVES.max_s))
+    if _WAVES and duration_s <= _WAVES.max_s:
+        return _WAVES.pulse(channel, duration_s)
+
+    if _THREAD is None:
+        _THREAD = ThreadTimer(log=log)
+    return _THREAD.pulse(channel, duration_s)
+
+
+def move_arm(channel, movement_sleep):
+    return pulse(channel, movement_sleep)
+
+
+def cleanup():
+    # stop a pulse another thread is waiting for before the pins go
+    for timer in (_WAVES, _THREAD):
+        if timer:
+            timer.stop()
+    gpio().cleanup()
+    _SET_UP.clear()
+
+
+class GpioActuator(Actuator):
+    def __init__(self, log=print):
+        self.log = log
+
+    def setup(self, channel):
+        setup(channel)
+
+    def motor_on(self, channel):
+        motor_on(channel)
+
+    def motor_off(self, channel):
+        motor_off(channel)
+
+    def pulse(self, channel, duration_s):
+        return pulse(channel, duration_s, log=self.log)
+
+    def cleanup(self):
+        cleanup()
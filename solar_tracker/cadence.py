@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""When to hill climb, when to scan and when to do nothing at all.
+
+Decisions used to run back to back and scans on a fixed timer, day and
+night. Now:
+ - after a run of "stay" decisions the pause before the next one doubles,
+   up to MAX_PAUSE_S, but never longer than the optimum takes to drift half
+   a step at the rate the reflector has been following it
+ - a scan that is due waits while the reflector has hardly moved since the
+   last one (up to MAX_SCAN_STRETCH times the interval) and while the sun
+   is too low for the reflector to add anything
+ - below NIGHT_POWER_MW the tracker idles: no decisions, slow power
+   sampling and cached metrics, until the output is back over DAY_POWER_MW
+"""
+BASE_PAUSE_S = 5
+MAX_PAUSE_S = 60
+DRIFT_WINDOW_S = 1800  # decisions this recent give the drift rate
+MIN_DRIFT_SPAN_S = 300  # the drift rate needs decisions at least this far apart
+
+SCAN_STABLE_DEG = 1.0  # the reflector moved less since the last scan
+MAX_SCAN_STRETCH = 3
+MIN_SCAN_ELEVATION_DEG = 10  # lower sun, the scan would see the sun rise, not the reflector
+MIN_SCAN_POWER_MW = 5000  # without a location
+
+NIGHT_POWER_MW = 1000
+DAY_POWER_MW = 2000
+IDLE_POLL_S = 60
+
+
+def trailing_stays(decision_history):
+    stays = 0
+    for decision in reversed(decision_history):
+        if decision != "stay":
+            break
+        stays += 1
+    return stays
+
+
+def drift_rate(positions):
+    """
+    Degrees per second the reflector followed the optimum over
+    (ts, pos) decisions, None if they span too little time
+    """
+    if len(positions) < 2:
+        return None
+    (ts0, pos0), (ts1, pos1) = positions[0], positions[-1]
+    if ts1 - ts0 < MIN_DRIFT_SPAN_S:
+        return None
+    return abs(pos1 - pos0) / (ts1 - ts0)
+
+
+def climb_pause_s(decision_history, positions, step_deg):
+    """
+    Seconds to wait before the next decision
+    """
+    stays = trailing_stays(decision_history)
+    if stays == 0:
+        return 0
+    pause = min(BASE_PAUSE_S * 2 ** (stays - 1), MAX_PAUSE_S)
+
+    rate = drift_rate(positions)
+    if rate is not None and rate > 0:
+        pause = min(pause, step_deg / 2 / rate)
+    return pause
+
+
+def scan_due(since_scan_s, every_s, moved_deg, sun_elevation, power_mw):
+    """
+    (True, None) if it is time for a scan, otherwise (False, why not).
+    sun_elevation is None without a location, power_mw None without a
+    reading.
+    """
+    if since_scan_s < every_s:
+        return False, "not due yet"
+    if moved_deg is not None and moved_deg < SCAN_STABLE_DEG and since_scan_s < every_s * MAX_SCAN_STRETCH:
+        return False, "moved {:0.2f} degrees since".format(moved_deg)
+    if sun_elevation is not None:
+        if sun_elevation < MIN_SCAN_ELEVATION_DEG:
+            return False, "sun too low, {:0.1f} degrees up".format(sun_elevation)
+        return True, None
+    if power_mw is None:
+        return False, "no power reading"
+    if power_mw < MIN_SCAN_POWER_MW:
+        return False, "output too low, {:0.3f} W".format(power_mw / 1000)
+    return True, None
+
+
+def is_night(power_mw, idle):
+    """
+    Whether to idle, with hysteresis between NIGHT_POWER_MW and DAY_POWER_MW
+    """
+    if power_mw is None:
+        return idle
+    if idle:
+        return power_mw < DAY_POWER_MW
+    return power_mw < NIGHT_POWER_MW
@@ -0,0 +1,1786 @@
+#!/usr/bin/env python3
+"""The tracker controller: hill climb, scans and the main loop.
+
+Importing this module has no side effects. Controller.start() binds the
+metrics port, starts the hardware (hal.pi_hardware() unless given, e.g. the
+simulator from sim.py) and loads the learned models, Controller.run() is the
+main loop. All timing goes through CLOCK, so a simulated clock makes the
+controller run as fast as the simulation.
+
+Everything that belongs to one reflector (its channels, sensors, learned
+models and files, metrics) hangs off its TrackerState, so one controller can
+run several of them, see trackers.py.
+"""
+import threading
+import time
+from shutil import get_terminal_size
+
+import json
+
+import logging
+logging.getLogger("imported_module").setLevel(logging.WARNING)
+
+import statistics
+import os
+import collections
+
+from solar_tracker.cadence import DRIFT_WINDOW_S
+from solar_tracker.cadence import IDLE_POLL_S
+from solar_tracker.cadence import climb_pause_s
+from solar_tracker.cadence import drift_rate
+from solar_tracker.cadence import is_night
+from solar_tracker.cadence import scan_due
+from solar_tracker.cadence import trailing_stays
+from solar_tracker.drag_model import DragModel
+from solar_tracker.ephemeris import SunCalibration
+from solar_tracker.ephemeris import solar_position
+from solar_tracker.hal import pi_hardware
+from solar_tracker.metrics_server import start_metrics_server
+from solar_tracker.motion import CoastModel
+from solar_tracker.motion import run_closed_loop
+from solar_tracker.move_cost import DEFER_S
+from solar_tracker.move_cost import EFFORT_SMOOTHING
+from solar_tracker.move_cost import decision_cost_wh
+from solar_tracker.move_cost import expected_gain_wh
+from solar_tracker.move_cost import motor_wh
+from solar_tracker.move_cost import relative_curvature
+from solar_tracker.multi_axis import MIN_MOVE_DEG
+from solar_tracker.multi_axis import TrackingPoll
+from solar_tracker.multi_axis import run_spiral_scan
+from solar_tracker.power_sampler import CONVERSION_S
+from solar_tracker.power_sampler import SHUNT_OHMS
+from solar_tracker.power_curve import fit_quadratic
+from solar_tracker.power_curve import slope_at
+from solar_tracker.scan import CoarseToFineStrategy
+from solar_tracker.scan import ContinuousStrategy
+from solar_tracker.scan import SweepStrategy
+from solar_tracker.scan import run_scan
+from solar_tracker.scan import with_range
+from solar_tracker.scan_store import ScanStore
+from solar_tracker.settle_model import SettleTable
+from solar_tracker.sky import SkyDetector
+from solar_tracker.sprt import MIN_SAMPLES as SPRT_MIN_SAMPLES
+from solar_tracker.sprt import compare
+from solar_tracker.trackers import Scheduler
+from solar_tracker.trackers import load_tracker_configs
+from solar_tracker.wobble import WobbleDetector
+
+HOME = os.path.expanduser("~")
+LOCATION_FILE = HOME + "/location.json"  # see location.example.json
+
+# in each tracker's home directory, HOME when there is only one
+DRAG_FILE = "drag.tab"
+SCANS_FILE = "scans.tab"
+SCANS_DB_FILE = "scans.sqlite"
+SUN_CALIBRATION_FILE = "sun-calibration.tab"
+CHECKPOINT_FILE = "tracker-checkpoint.json"
+SETTLE_FILE = "settle.tab"
+
+# the hardware's clock, set by Controller.start()
+CLOCK = time
+
+START_TIME = time.time()
+def log(text):
+    seconds_since_start = CLOCK.time() - START_TIME
+    minutes = int(seconds_since_start / 60) % 60
+    hours = int(minutes / 60)
+    seconds = seconds_since_start % 60
+
+    if threading.current_thread() is not threading.main_thread():
+        text = "{}: {}".format(threading.current_thread().name, text)  # one thread per tracker
+
+    print("[{: >2}h {: >2}m {:0>6}s] {}".format(hours, minutes, "{:0.3f}".format(seconds), text))
+
+
+MODE_HILL_CLIMB = "hill-climb"
+MODE_HILL_CLIMB_RET = "hill-climb-ret"
+MODE_HILL_CLIMB_EXT = "hill-climb-ext"
+MODE_IDLE = "idle"
+
+EXACT_MOVE_PRECISION = 0.05
+MAX_EXACT_CORRECTIONS = 5  # e.g. against the end stop the error never shrinks
+INEXACT_DIST_OVER_TIME_RATIO = 0.951497
+
+# exact moves cut the motor on inclinometer feedback instead of a fixed sleep
+CLOSED_LOOP_MOVES = True
+CLOSED_LOOP_MAX_DURATION_MULT = 3  # safety cut, times the open-loop duration
+
+MEASURE_SLEEP = 0.6  # oldest power reading still considered current
+
+# part of the predicted settle time slept before checking for wobble; below
+# 1 so over-predictions show up as settling right away and shrink the table
+SETTLE_SLEEP_FRACTION = 0.5
+POWER_WINDOW_S = 0.2  # readings after a move that make up one power value
+
+OPTIMA_SAMPLES = 8
+
+STEP_DEG = 0.5  # hill climb step
+
+# hill climb holds position while the power stream shows a passing cloud,
+# for at most this long per decision
+SKY_MAX_WAIT_S = 60
+SKY_POLL_S = 0.25
+
+# hill climb algorithm, can also be given as the first command line argument
+ALGORITHM_PROBE = "probe"  # further, undo, undo, further
+ALGORITHM_MODEL = "model"  # fit the local power curve, move to its peak
+ALGORITHM_SPRT = "sprt"  # one step, kept if a sequential test says it is better
+ALGORITHM_PATTERN = "pattern"  # sprt's step on every axis in turn, for trackers with more than one
+HILL_CLIMB_ALGORITHM = ALGORITHM_PROBE
+
+CURVE_WINDOW = 16  # (position, power) samples kept for the model
+CURVE_SPAN_DEG = 3  # only samples this close to the current position are fit
+CURVE_MAX_AGE_S = 600  # the sun moves the curve, older samples are dropped
+MAX_PEAK_STD_DEG = 0.5  # a less certain peak is probed instead
+MAX_MODEL_MOVE_DEG = 2  # at most this far past the sampled positions
+
+SPRT_BUDGET_S = 3.0  # readings per comparison stop after this, can't tell
+SAMPLES_PER_DECISION_KEPT = 1000  # for the distribution in the metrics
+PULSE_ERRORS_KEPT = 1000  # same
+DECISION_POSITIONS_KEPT = 256  # (ts, pos) of recent decisions, for the drift rate
+
+IDLE_HTTP_CACHE_S = 60  # metrics responses are reused this long at night
+
+GATE_DECISIONS = True  # skip decisions that cost more than they win back, see move_cost.py
+
+REWIND_DEG = 6
+SCAN_DEG_START = 1
+SCAN_DEG_END = 60
+SCAN_STEP_DEG = 0.5
+SCAN_COARSE_STEP_DEG = 4
+SCAN_TOLERANCE_DEG = 0.5
+
+SCAN_STRATEGIES = {
+    "sweep": SweepStrategy(SCAN_DEG_START, SCAN_DEG_END, REWIND_DEG, SCAN_STEP_DEG),
+    "coarse-to-fine-golden": CoarseToFineStrategy(
+        SCAN_DEG_START, SCAN_DEG_END, REWIND_DEG, SCAN_COARSE_STEP_DEG, SCAN_TOLERANCE_DEG, refine="golden"),
+    "coarse-to-fine-ternary": CoarseToFineStrategy(
+        SCAN_DEG_START, SCAN_DEG_END, REWIND_DEG, SCAN_COARSE_STEP_DEG, SCAN_TOLERANCE_DEG, refine="ternary"),
+    # a power reading's ts is the start of its averaging, the middle is a better guess
+    "continuous": ContinuousStrategy(SCAN_DEG_START, SCAN_DEG_END, REWIND_DEG, power_offset_s=CONVERSION_S / 2),
+}
+SCAN_STRATEGY = "coarse-to-fine-golden"
+
+# scans only cover the band the optimum was in at this time of day on the
+# previous days, once there are enough of them
+SCAN_HISTORY_DAYS = 14
+SCAN_HISTORY_MIN_DAYS = 3
+SCAN_HISTORY_WINDOW_MIN = 30
+SCAN_BAND_MARGIN_DEG = 4
+
+SCAN_EVERY_N_SECONDS = 3600  # 1h
+# once the sun calibration predicts the optimum this well, scans are only
+# needed to keep it calibrated and the reflector is pre-positioned instead
+CALIBRATION_MAX_STD_DEG = 1.0
+CALIBRATED_SCAN_EVERY_N_SECONDS = 4 * 3600
+PREPOSITION_EVERY_N_SECONDS = 600
+PREPOSITION_MIN_DEG = 0.5  # smaller corrections are left to hill climb
+
+# a checkpoint is resumed from only if it is this recent and the reflector
+# is still where it says
+CHECKPOINT_MAX_AGE_S = 1800
+CHECKPOINT_MAX_POS_ERROR_DEG = 1.0
+
+
+
+class Metrics(object):
+    PORT = 9732
+    ADDR = ('', PORT)
+    NUM_LISTENER_THREADS = 2
+
+    def __init__(self):
+        self.value = None
+        self.last_updated = None
+        self.mode = None
+        self.pos = None
+        self.axis_pos = None  # axis name -> angle, with more than one axis
+        self.efficiency_pct = None
+        self.wobble_data = None
+        self.step_deg = None
+        self.idle = False
+
+        self.algorithm = None
+        self.last_scan = None
+        self.decision_counts = {}  # decision -> count
+        self.decision_moves = 0  # moves spent on all decisions
+        self.energy_wh = {}  # algorithm or "scan" -> energy harvested while it ran
+        self.time_to_first_decision_s = None
+        self.restored_from_checkpoint = None
+        self.settle = None  # last move's predicted, slept and actual settle time
+        self.settle_error_total = 0.0
+        self.settle_predictions = 0
+        self.sky = None  # what gave the last transient away
+        self.sky_waits = 0  # decisions put off until the sky was steady
+        self.sky_holds = 0  # decisions skipped, the transient outlasted SKY_MAX_WAIT_S
+        self.sky_wait_s = 0.0
+        self.suppressed_moves = 0.0  # estimated, moves per decision times decisions not made
+        self.cloud_trips = 0  # clouds only hill climb's own anti-improvement check caught
+        self.samples_per_decision = collections.deque(maxlen=SAMPLES_PER_DECISION_KEPT)
+        self.pulse_errors_ms = collections.deque(maxlen=PULSE_ERRORS_KEPT)  # on-time minus requested, timed pulses
+        self.gained_wh = 0.0  # expected, of the decisions weighed (after a "stay") and made
+        self.spent_wh = 0.0  # by those
+        self.spent_motor_wh = 0.0  # of all decisions
+        self.spent_settle_wh = 0.0  # output below the level before each move, while it ran and settled
+        self.skipped = 0  # decisions not worth their moves
+        self.skipped_cost_wh = 0.0  # expected cost of those
+
+        # is_probe and is_decision only applies to hill climb
+        self.is_probe = None
+        self.is_decision = None
+
+    def setMode(self, mode):
+        self.mode = mode
+
+    def setValue(self, value, is_probe=None, is_decision=None):
+        assert value is not None
+        if is_probe is not None:
+            self.is_probe = is_probe
+        if is_decision is not None:
+            self.is_decision = is_decision
+        self.value = value
+        self.last_updated = CLOCK.time()
+
+    def setPos(self, value):
+        self.pos = value
+
+    def setAxisPos(self, value):
+        self.axis_pos = value
+
+    def setEfficiency(self, value):
+        self.efficiency_pct = value
+
+    def setWobbleData(self, value):
+        self.wobble_data = value
+
+    def setStep(self, value):
+        self.step_deg = value
+
+    def setIdle(self, value):
+        self.idle = value
+        if value:
+            self.mode = MODE_IDLE
+
+    def maxAge(self):
+        """
+        Seconds the metrics server may serve the same response
+        """
+        return IDLE_HTTP_CACHE_S if self.idle else 0
+
+    def setAlgorithm(self, value):
+        self.algorithm = value
+
+    def setScanResult(self, value):
+        self.last_scan = value
+
+    def countDecision(self, decision, moves):
+        self.decision_counts[decision] = self.decision_counts.get(decision, 0) + 1
+        self.decision_moves += moves
+
+    def addEnergy(self, key, wh):
+        self.energy_wh[key] = self.energy_wh.get(key, 0) + wh
+
+    def setSettle(self, predicted_s, slept_s, actual_s):
+        self.settle = {'predicted_s': predicted_s, 'slept_s': slept_s, 'actual_s': actual_s}
+        if predicted_s is not None:
+            self.settle_error_total += abs(predicted_s - actual_s)
+            self.settle_predictions += 1
+
+    def addSkyWait(self, wait_s, held, reason):
+        self.sky = reason
+        self.sky_wait_s += wait_s
+        if held:
+            self.sky_holds += 1
+            num_decisions = sum(self.decision_counts.values())
+            if num_decisions > 0:
+                self.suppressed_moves += self.decision_moves / num_decisions
+        else:
+            self.sky_waits += 1
+
+    def countCloudTrip(self):
+        self.cloud_trips += 1
+
+    def addDecisionSamples(self, samples):
+        self.samples_per_decision.append(samples)
+
+    def addPulse(self, requested_s, on_s):
+        self.pulse_errors_ms.append(1000 * (on_s - requested_s))
+
+    def addDecisionEnergy(self, gained_wh, motor_wh, settle_wh):
+        if gained_wh is not None:
+            self.gained_wh += gained_wh
+            self.spent_wh += motor_wh + settle_wh
+        self.spent_motor_wh += motor_wh
+        self.spent_settle_wh += settle_wh
+
+    def countSkip(self, cost_wh):
+        self.skipped += 1
+        self.skipped_cost_wh += cost_wh
+
+    def setTimeToFirstDecision(self, value, restored):
+        self.time_to_first_decision_s = value
+        self.restored_from_checkpoint = restored
+
+    def getValue(self):
+        age = None
+        if self.last_updated:
+            age = CLOCK.time() - self.last_updated
+
+        if self.value is None:
+            return {'starting': True}
+
+        retval = {
+            'value': self.value,
+            'age': age,
+            'mode': self.mode,
+            'pos': self.pos,
+            'wobble_data': self.wobble_data,
+            'step_deg': self.step_deg,
+            'idle': self.idle,
+            'is_probe': self.is_probe,
+            'is_decision': self.is_decision,
+            'algorithm': self.algorithm,
+            'decisions': self.decision_counts,
+            'energy_wh': self.energy_wh,
+            'last_scan': self.last_scan,
+            'time_to_first_decision_s': self.time_to_first_decision_s,
+            'restored_from_checkpoint': self.restored_from_checkpoint,
+            'settle': self.settle,
+            'sky': {
+                'last_transient': self.sky,
+                'waits': self.sky_waits,
+                'holds': self.sky_holds,
+                'wait_s': self.sky_wait_s,
+                'suppressed_moves': self.suppressed_moves,
+                'cloud_trips': self.cloud_trips,
+            },
+            'move_energy': {
+                'gained_wh': self.gained_wh,
+                'spent_wh': self.spent_wh,
+                'spent_total_wh': self.spent_motor_wh + self.spent_settle_wh,
+                'spent_motor_wh': self.spent_motor_wh,
+                'spent_settle_wh': self.spent_settle_wh,
+                'skipped': self.skipped,
+                'skipped_cost_wh': self.skipped_cost_wh,
+            },
+        }
+
+        if self.settle_predictions > 0:
+            retval["settle_mean_abs_error_s"] = self.settle_error_total / self.settle_predictions
+
+        if len(self.samples_per_decision) > 0:
+            retval["samples_per_decision"] = distribution(self.samples_per_decision)
+
+        if len(self.pulse_errors_ms) > 0:
+            retval["pulse_error_ms"] = distribution(self.pulse_errors_ms)
+
+        num_decisions = sum(self.decision_counts.values())
+        if num_decisions > 0:
+            retval["moves_per_decision"] = self.decision_moves / num_decisions
+
+        if self.efficiency_pct is not None:
+            retval["efficiency_pct"] = self.efficiency_pct
+
+        if self.axis_pos is not None:
+            retval["axis_pos"] = self.axis_pos
+
+        return retval
+
+
+class MetricsGroup(object):
+    """
+    What the metrics server reports for several trackers: the first one's
+    metrics at the top level as before, every tracker's under "trackers" and
+    the output of the whole string
+    """
+    def __init__(self, states):
+        self.states = states
+
+    def getValue(self):
+        trackers = {s.config.name: s.metrics.getValue() for s in self.states}
+        retval = dict(trackers[self.states[0].config.name])
+        retval['trackers'] = trackers
+
+        # trackers on one power sensor all report its reading
+        per_sensor = {}
+        for s in self.states:
+            per_sensor.setdefault(s.config.ina_address, s.metrics.value)
+        if None not in per_sensor.values():
+            retval['combined_value'] = sum(per_sensor.values())
+
+        return retval
+
+    def maxAge(self):
+        return min(s.metrics.maxAge() for s in self.states)
+
+
+def distribution(values):
+    values = sorted(values)
+    return {
+        'n': len(values),
+        'mean': sum(values) / len(values),
+        'min': values[0],
+        'p10': values[int(0.1 * (len(values) - 1))],
+        'p50': values[int(0.5 * (len(values) - 1))],
+        'p90': values[int(0.9 * (len(values) - 1))],
+        'max': values[-1],
+    }
+
+
+def move_arm(state, channel, movement_sleep):
+    """
+    Returns how long the motor actually ran, the actuator times the pulse
+    """
+    state.actuator.setup(channel)
+    return state.actuator.pulse(channel, movement_sleep)
+
+
+def move_arm_closed_loop(state, channel, target, max_duration):
+    state.actuator.setup(channel)
+    axis = state.axes[state.axisFor(channel)]
+    dir_mult = (1 if channel == axis.ext_channel else -1)
+    return run_closed_loop(
+        lambda: state.actuator.motor_on(channel),
+        lambda: state.actuator.motor_off(channel),
+        lambda after_ts=None: axis.view(next_inclino_sample(state, after_ts)),
+        target, dir_mult, state.coast.coast_s(channel), max_duration, clock=CLOCK)
+
+
+def pretty_print_pow(measured_power):
+    label = "Power: %.3f W " % (measured_power / 1000)
+    term_width = get_terminal_size()[0] - len(label) - 1
+    ratio = (measured_power / 1000) / 100
+    if ratio > 1:
+        ratio = 1
+
+    log(label + ("*" * int(term_width * ratio)))
+
+def pretty_print_deg(angle_degrees):
+    label = "Angle (degrees): %.3f " % angle_degrees
+    term_width = get_terminal_size()[0] - len(label) - 1
+    ratio = (angle_degrees) / 180
+    log(label + ("*" * int(term_width * ratio)))
+
+
+
+
+class WattsReader(object):
+    def __init__(self, sampler):
+        # the tracker's INA219 sampler, configured once and read continuously
+        self.sampler = sampler
+
+    def _report(self, state, measured_power, hide_metrics, is_decision):
+        if hide_metrics:
+            return
+
+        if is_decision is not None:
+            is_probe = not is_decision
+        else:
+            # None means don't change
+            is_probe = None
+            is_decision = None
+
+        state.metrics.setValue(measured_power / 1000, is_probe=is_probe, is_decision=is_decision)
+        state.metrics.setPos(state.pos)
+        if len(state.axes) > 1:
+            state.metrics.setAxisPos({a.name: p for a, p in zip(state.axes, state.axis_pos)})
+
+    def read(self, state, hide_metrics=False, is_decision=None):
+        last = self.sampler.latest()
+        if last is None:
+            return None
+        else:
+            age = CLOCK.time() - last['ts']
+            measured_power = last['power']
+
+            self._report(state, measured_power, hide_metrics, is_decision)
+
+            if age > MEASURE_SLEEP:
+                return None
+
+            return measured_power
+
+    def wait_for_fresh_sample(self, state, newer_than, timeout=None, hide_metrics=False, is_decision=None):
+        """
+        Blocks until the POWER_WINDOW_S after newer_than (e.g. the end of the
+        last move) has been sampled and returns the median power over it,
+        None if timeout runs out first.
+        """
+        window = self.sampler.wait_for_window(newer_than, POWER_WINDOW_S, timeout)
+        if window is None or len(window['power']) == 0:
+            return None
+        measured_power = float(statistics.median(window['power']))
+
+        self._report(state, measured_power, hide_metrics, is_decision)
+        return measured_power
+
+    def measure(self, state, newer_than, against=None, budget_s=SPRT_BUDGET_S, is_decision=None, until_ts=None):
+        """
+        Power readings taken after newer_than, outliers dropped: the first
+        SPRT_MIN_SAMPLES (or all up to until_ts) or, against the readings at
+        another position, as many as the sequential test needs to tell which
+        is better, for at most budget_s. Returns (readings, 1 better / -1
+        worse / 0 can't tell), the verdict is None without against.
+        """
+        deadline = CLOCK.time() + budget_s
+        readings = []
+        better = None
+        last_ts = newer_than
+        while True:
+            latest = self.sampler.wait_for_fresh_sample(last_ts, timeout=max(deadline - CLOCK.time(), 0))
+            if latest is None:
+                break
+            readings.extend(float(p) for p in self.sampler.window(last_ts, latest['ts'])['power'])
+            last_ts = latest['ts']
+
+            if len(readings) < SPRT_MIN_SAMPLES:
+                continue
+            if against is None:
+                if until_ts is None or last_ts >= until_ts:
+                    break
+                continue
+            better = compare(against, remove_outliers(readings, quiet=True))
+            if better != 0 or CLOCK.time() >= deadline:
+                break
+
+        readings = remove_outliers(readings)
+        if against is not None and better is None:
+            better = 0
+        if len(readings) > 0:
+            self._report(state, statistics.median(readings), False, is_decision)
+        return readings, better
+
+
+def fresh_power(state, hide_metrics=False, is_decision=None):
+    # first reading that is both current and taken after the reflector settled
+    newer_than = max(state.move_end_ts, CLOCK.time() - MEASURE_SLEEP)
+    return state.watts.wait_for_fresh_sample(state, newer_than, hide_metrics=hide_metrics, is_decision=is_decision)
+
+
+class NoReading(Exception):
+    """
+    No power reading where a decision can't do without one, e.g. after an
+    I2C error
+    """
+
+
+def decision_power(state):
+    # fresh_power() for hill_climb()'s comparisons
+    power = fresh_power(state)
+    if power is None:
+        raise NoReading()
+    return power
+
+def measure_power(state, against=None, is_decision=None):
+    # readings taken after the reflector settled, see WattsReader.measure()
+    newer_than = max(state.move_end_ts, CLOCK.time() - MEASURE_SLEEP)
+    return state.watts.measure(state, newer_than, against=against, is_decision=is_decision)
+
+def measure_before(state, budget_s=SPRT_BUDGET_S):
+    """
+    The readings a move is compared against: the last budget_s of them
+    since the reflector settled, waiting for the rest if it settled more
+    recently. With only SPRT_MIN_SAMPLES before the move the 1/len(before)
+    term keeps the difference's variance up however many readings come
+    after, and the test can't tell differences near its minimum effect.
+    """
+    newer_than = max(state.move_end_ts, CLOCK.time() - budget_s)
+    return state.watts.measure(state, newer_than, budget_s=budget_s, until_ts=newer_than + budget_s)
+
+def further(state, is_decision=False):
+    if state.attemted_direction == "ret":
+        state.metrics.setMode(MODE_HILL_CLIMB_RET)
+        log("<== Try Ret")
+        state.armRet(is_decision=is_decision)
+    else:
+        state.metrics.setMode(MODE_HILL_CLIMB_EXT)
+        log("==> Try Ext")
+        state.armExt(is_decision=is_decision)
+
+def undo(state, is_decision=False):
+    if state.attemted_direction == "ret":
+        state.metrics.setMode(MODE_HILL_CLIMB_EXT)
+        log("U<= Undo Ret")
+        state.armExt(is_decision=is_decision)
+    else:
+        state.metrics.setMode(MODE_HILL_CLIMB_RET)
+        log("=>U Undo Ext")
+        state.armRet(is_decision=is_decision)
+
+def wait_for_steady_sky(state, max_wait_s=SKY_MAX_WAIT_S):
+    """
+    Feeds the power readings taken since the reflector last stopped to its
+    sky detector, holding position while they show a transient. Returns
+    False if the transient lasted max_wait_s.
+    """
+    if state.move_end_ts > state.sky_fed_ts:
+        # the move changed the power, readings before it say nothing about the sky
+        state.sky.reset()
+        state.sky_fed_ts = state.move_end_ts
+    if state.sky_fed_ts == 0:
+        # nothing fed and no move yet, e.g. while another tracker has the first scan
+        state.sky_fed_ts = CLOCK.time() - state.sky.window_s
+
+    started = CLOCK.time()
+    transient = None
+    while True:
+        window = state.watts.sampler.window(state.sky_fed_ts, CLOCK.time())
+        for ts, power in zip(window["ts"], window["power"]):
+            state.sky.add(ts, power)
+        if len(window["ts"]) > 0:
+            state.sky_fed_ts = window["ts"][-1]
+
+        steady, reason = state.sky.verdict()
+        if steady is False and transient is None:
+            log("Sky: {}, holding position".format(reason))
+        if steady is False:
+            transient = reason
+
+        waited_s = CLOCK.time() - started
+        if steady or waited_s >= max_wait_s:
+            if transient is not None:
+                held = not steady
+                log("Sky: {} after {:0.1f}s".format("still not steady, skipping the decision" if held else "steady", waited_s))
+                state.metrics.addSkyWait(waited_s, held, transient)
+            return bool(steady)
+
+        CLOCK.sleep(SKY_POLL_S)
+
+
+def decision_worth_it(state, gate=True):
+    """
+    Weighs what a decision is expected to win back against what its moves
+    cost, see move_cost.py. Returns False when the cost is higher (the
+    tracker waits DEFER_S, after giving up its turn on the power sensor),
+    or when there is too little to tell lets the decision run.
+    """
+    gain_wh, cost_wh = state.decisionEconomics()
+    if trailing_stays(state.decision_history) == 0:
+        gain_wh = None  # catching up after a move, the drift rate says too little
+    state.decision_gain_wh = gain_wh
+    state.decision_started_ts = CLOCK.time()
+    if not (gate and GATE_DECISIONS) or gain_wh is None or gain_wh >= cost_wh:
+        return True
+
+    log("Not worth a decision: expected gain {:0.5f} Wh, cost {:0.5f} Wh, waiting {}s".format(
+        gain_wh, cost_wh, DEFER_S))
+    state.metrics.countSkip(cost_wh)
+    return False
+
+
+def hill_climb(state):
+    log(state.decision_history)
+
+    if not wait_for_steady_sky(state):
+        return "hold"
+    if not decision_worth_it(state):
+        return "skip"
+
+    start_pos = state.pos
+    try:
+        power_before = decision_power(state)
+
+        # Try
+        further(state)
+
+        power_after = decision_power(state)
+
+        # log("Power before: {}   <=> Power after {}".format(power_before, power_after))
+        state.updateEfficiency(power_after)
+        state.metrics.setMode(MODE_HILL_CLIMB)
+
+        decision = state.attemted_direction
+        if power_after - power_before > 0:
+            log("We have improvement of +%.3f mW !" % (power_after - power_before))
+            # we still need to test for ani-imporvment to avoid getting tricked by clouds
+
+            undo(state)
+            undo(state)
+
+            power_on_the_filp_side = decision_power(state)
+
+            if power_before - power_on_the_filp_side < (power_after - power_before) * 0.9:
+                log("Anti-improvement of %.3f mW is not sufficient! Maybe a cloud?" % (power_before - power_on_the_filp_side))
+                state.metrics.countCloudTrip()
+                further(state, is_decision=True)
+                decision = "stay"
+            else:
+                # Advance in favorable direction
+                further(state)
+                further(state, is_decision=True)
+        else:
+            # before reversing we still need to test for ani-imporvment to avoid getting tricked by clouds
+            undo(state)
+
+            power_before = decision_power(state)
+
+            undo(state)
+            power_after = decision_power(state)
+
+            if power_after - power_before < 0:
+                log("Reversing also does not make sense. Maybe a cloud?")
+                state.metrics.countCloudTrip()
+                further(state, is_decision=True)
+                decision = "stay"
+            else:
+                log("We have improvement of +%.3f mW when revrsing !" % (power_after - power_before))
+                # we still need to test for ani-imporvment to avoid getting tricked by clouds
+
+                power_on_the_filp_side = decision_power(state)
+
+                if power_on_the_filp_side - power_before > abs(power_after - power_before) * 0.9:
+                    # Reverse directions
+                    if state.attemted_direction == "ret":
+                        state.attemted_direction = "ext"
+                    else:
+                        state.attemted_direction = "ret"
+                else:
+                    log("Anti-improvement of +%.3f mW is not sufficient! Maybe a cloud?" % (power_on_the_filp_side - power_before))
+                    state.metrics.countCloudTrip()
+                    further(state, is_decision=True)
+                    decision = "stay"
+    except NoReading:
+        log("Hill climb: no power reading, back to {:0.3f} degrees and holding".format(start_pos))
+        if abs(state.pos - start_pos) >= MIN_MOVE_DEG:
+            move_by(state, start_pos - state.pos, is_decision=True)
+        return "hold"
+
+    state.metrics.setMode(MODE_HILL_CLIMB)
+
+    state.addDecision(decision)
+    return decision
+
+
+def move_by(state, delta_deg, is_decision=False, axis=0):
+    if delta_deg > 0:
+        state.metrics.setMode(MODE_HILL_CLIMB_EXT)
+        state.armExt(delta_deg, is_decision=is_decision, axis=axis)
+    else:
+        state.metrics.setMode(MODE_HILL_CLIMB_RET)
+        state.armRet(-delta_deg, is_decision=is_decision, axis=axis)
+
+
+def model_climb(state):
+    """
+    One decision from the local quadratic fit: move to the predicted peak
+    when the fit is confident, otherwise probe one step to learn more
+    """
+    log(state.decision_history)
+
+    if not wait_for_steady_sky(state):
+        return "hold"
+    # not skipped, the fit needs samples younger than CURVE_MAX_AGE_S coming in
+    decision_worth_it(state, gate=False)
+
+    state.addCurveSample(fresh_power(state))
+    points = state.curvePoints()
+    fit = fit_quadratic(points)
+
+    if fit is not None and fit.peak is not None and fit.peak_std < MAX_PEAK_STD_DEG:
+        # don't trust the fit far outside of where it was sampled
+        lowest = min(p[0] for p in points) - MAX_MODEL_MOVE_DEG
+        highest = max(p[0] for p in points) + MAX_MODEL_MOVE_DEG
+        target = min(max(fit.peak, lowest, SCAN_DEG_START), highest, SCAN_DEG_END)
+        delta = target - state.pos
+
+        log("Model: peak at {:0.3f} (+/- {:0.3f}) degrees from {} samples, moving {:0.3f}".format(
+            fit.peak, fit.peak_std, fit.n, delta))
+
+        if abs(delta) < EXACT_MOVE_PRECISION:
+            decision = "stay"
+            state.watts.read(state, is_decision=True)
+        else:
+            decision = ("ext" if delta > 0 else "ret")
+            state.attemted_direction = decision
+            move_by(state, delta, is_decision=True)
+    else:
+        # ambiguous, take one step uphill (by the fit if there is one)
+        if fit is not None:
+            state.attemted_direction = ("ext" if slope_at(fit, state.pos) > 0 else "ret")
+        log("Model: ambiguous fit ({}), probing {}".format(
+            "no fit" if fit is None else "peak std {}".format(fit.peak_std), state.attemted_direction))
+
+        decision = "probe"
+        further(state, is_decision=True)
+
+    state.addCurveSample(fresh_power(state))
+    state.metrics.setMode(MODE_HILL_CLIMB)
+
+    state.addDecision(decision)
+    return decision
+
+
+def sprt_climb(state):
+    """
+    One step in the current direction, kept if the sequential test says
+    the power is better there. Otherwise the reflector goes back and the
+    next decision tries the other side.
+    """
+    log(state.decision_history)
+
+    if not wait_for_steady_sky(state):
+        return "hold"
+    if not decision_worth_it(state):
+        return "skip"
+
+    before, _ = measure_before(state)
+    further(state)
+    after, better = measure_power(state, against=before)
+    state.metrics.setMode(MODE_HILL_CLIMB)
+    state.metrics.addDecisionSamples(len(before) + len(after))
+
+    if better > 0:
+        log("SPRT: {} is better after {} readings".format(state.attemted_direction, len(after)))
+        decision = state.attemted_direction
+        state.watts.read(state, is_decision=True)
+    else:
+        log("SPRT: {} is {} after {} readings, going back".format(
+            state.attemted_direction, "worse" if better < 0 else "no different", len(after)))
+        undo(state, is_decision=True)
+        state.attemted_direction = ("ret" if state.attemted_direction == "ext" else "ext")
+        decision = "stay"
+
+    state.metrics.setMode(MODE_HILL_CLIMB)
+    state.addDecision(decision)
+    return decision
+
+
+def pattern_climb(state):
+    """
+    One poll of a compass search over all of the tracker's axes: a step
+    along the axis and direction that paid off last, kept if the sequential
+    test says the power is better. Otherwise the reflector goes back and the
+    next decision tries the opposite direction, then the next axis. Axes
+    after the first have steps of their own and rest between passes, see
+    multi_axis.TrackingPoll.
+    """
+    log(state.decision_history)
+
+    if not wait_for_steady_sky(state):
+        return "hold"
+    if not decision_worth_it(state):
+        return "skip"
+
+    axis, sign = state.pattern.next(CLOCK.time())
+    name = state.axes[axis].directionName(state.axes[axis].channel("ext" if sign > 0 else "ret"))
+    step_deg = state.pattern.step(axis, state.step_deg)
+
+    before, _ = measure_before(state)
+    move_by(state, sign * step_deg, axis=axis)
+    after, better = measure_power(state, against=before)
+    state.metrics.setMode(MODE_HILL_CLIMB)
+    state.metrics.addDecisionSamples(len(before) + len(after))
+
+    if better > 0:
+        log("Pattern: {} is better after {} readings".format(name, len(after)))
+        state.pattern.hit()
+        decision = name
+        state.watts.read(state, is_decision=True)
+    else:
+        log("Pattern: {} is {} after {} readings, going back".format(
+            name, "worse" if better < 0 else "no different", len(after)))
+        move_by(state, -sign * step_deg, is_decision=True, axis=axis)
+        if state.pattern.miss(CLOCK.time()) and axis > 0:
+            log("Pattern: done with {} for now, next poll in {:0.0f}s at {:0.3f} degrees".format(
+                state.axes[axis].name, state.pattern.resting_until[axis] - CLOCK.time(), state.pattern.steps[axis]))
+        decision = "stay"
+
+    state.metrics.setMode(MODE_HILL_CLIMB)
+    state.addDecision(decision)
+    return decision
+
+
+ALGORITHMS = {
+    ALGORITHM_PROBE: hill_climb,
+    ALGORITHM_MODEL: model_climb,
+    ALGORITHM_SPRT: sprt_climb,
+    ALGORITHM_PATTERN: pattern_climb,
+}
+
+
+def remove_outliers(measurements, quiet=False):
+    cutoff = 1.2
+    no_outliers = []
+    if len(measurements) > 0:
+        median_measurement = statistics.median(measurements)
+        delta = median_measurement * cutoff - median_measurement
+        for i in measurements:
+            if i < median_measurement - delta or i > median_measurement + delta:
+                if quiet:
+                    continue
+                human_measurements = ["%.3f" % (i / 1000) for i in measurements]
+                log("OUTLIER: dropping {} from {}".format("%.3f" % (i / 1000), human_measurements))
+                continue  # ignore this measurement
+            no_outliers.append(i)
+
+    return no_outliers
+
+
+class ScanTarget(object):
+    def __init__(self, state):
+        self.state = state
+
+    def pos(self):
+        return self.state.pos
+
+    def move(self, delta_deg, exact):
+        if delta_deg > 0:
+            self.state.armExt(delta_deg, exact=exact)
+        else:
+            self.state.armRet(-delta_deg, exact=exact)
+
+    def measure(self):
+        m = fresh_power(self.state)
+        self.state.addCurveSample(m)
+        return m
+
+    def sweep(self, delta_deg):
+        return self.state.sweep(delta_deg)
+
+    def set_mode(self, mode):
+        self.state.metrics.setMode(mode)
+
+    def move_count(self):
+        return self.state.moves_count
+
+
+class AxesTarget(object):
+    """
+    TrackerState as a multi_axis.py target
+    """
+    def __init__(self, state):
+        self.state = state
+
+    def pos(self):
+        return list(self.state.axis_pos)
+
+    def move(self, axis, delta_deg, exact):
+        if delta_deg > 0:
+            self.state.armExt(delta_deg, exact=exact, axis=axis)
+        else:
+            self.state.armRet(-delta_deg, exact=exact, axis=axis)
+
+    def measure(self):
+        return fresh_power(self.state)
+
+    def set_mode(self, mode):
+        self.state.metrics.setMode(mode)
+
+    def move_count(self):
+        return self.state.moves_count
+
+
+def load_location():
+    try:
+        with open(LOCATION_FILE) as f:
+            location = json.load(f)
+        return location["lat"], location["lon"]
+    except (OSError, ValueError, KeyError) as e:
+        log("No sun feed-forward, cannot load {}: {}".format(LOCATION_FILE, e))
+        return None
+
+
+# set by Controller.start()
+LOCATION = None
+
+
+def sun_position():
+    """
+    (azimuth, elevation) of the sun now, None without a location
+    """
+    if LOCATION is None:
+        return None
+    lat, lon = LOCATION
+    return solar_position(CLOCK.time(), lat, lon)
+
+
+def typical_optimum(state):
+    """
+    (median, lowest, highest) best position at this time of day on the
+    previous days, None without enough history
+    """
+    return state.scan_store.typical_optimum(
+        CLOCK.time(), SCAN_HISTORY_WINDOW_MIN, SCAN_HISTORY_DAYS, SCAN_HISTORY_MIN_DAYS)
+
+
+def doScan(state, narrow=True):
+    """
+    Returns True if the hill is found
+    """
+    state.start_of_scan = None
+    state.metrics.setEfficiency(None)
+
+    start_deg, end_deg = SCAN_DEG_START, SCAN_DEG_END
+    typical = typical_optimum(state) if narrow else None
+    if typical is not None:
+        _, lowest, highest = typical
+        start_deg = max(SCAN_DEG_START, lowest - SCAN_BAND_MARGIN_DEG)
+        end_deg = min(SCAN_DEG_END, highest + SCAN_BAND_MARGIN_DEG)
+
+    log("Starting {} scan from {:0.1f} to {:0.1f} degrees".format(SCAN_STRATEGY, start_deg, end_deg))
+    strategy = with_range(SCAN_STRATEGIES[SCAN_STRATEGY], start_deg, end_deg)
+    result = run_scan(strategy, ScanTarget(state), clock=CLOCK)
+
+    # efficiency wants the scan in position order, left extreme first
+    state.scan_measurements = [power for pos, power in sorted(result.samples)]
+
+    if typical is not None:
+        # a narrowed scan starts near the usual optimum, not with the reflector off
+        log("Efficiency: not from a narrowed scan")
+    elif len(state.scan_measurements) > 0:
+        state.start_of_scan = state.scan_measurements[0]
+        state.updateEfficiency(max(state.scan_measurements))
+
+    found_hill = result.best_pos is not None
+    if found_hill and typical is not None:
+        # the optimum may be outside of the narrowed band, scan it all then
+        at_start = start_deg > SCAN_DEG_START and result.best_pos <= start_deg + SCAN_TOLERANCE_DEG
+        at_end = end_deg < SCAN_DEG_END and result.best_pos >= end_deg - SCAN_TOLERANCE_DEG
+        if at_start or at_end:
+            log("Best position {:0.3f} is at the edge of the narrowed scan".format(result.best_pos))
+            found_hill = False
+
+    if found_hill:
+        curvature = relative_curvature(result.samples, result.best_pos)
+        if curvature is not None:
+            state.curvature = curvature
+        state.scan_optima = (state.scan_optima + [(CLOCK.time(), result.best_pos)])[-2:]
+        log("Scan {}: {:0.1f}s, {} moves, max {:0.3f} W at {:0.3f} degrees, ended at {:0.3f} degrees".format(
+            result.strategy, result.duration_s, result.moves, result.best_power / 1000, result.best_pos, result.final_pos))
+        pretty_print_pow(result.best_power)
+        log("")
+    else:
+        log("Hill NOT found! Scan {} got no measurements".format(result.strategy))
+
+    scan_result = {
+        'strategy': result.strategy,
+        'duration_s': result.duration_s,
+        'moves': result.moves,
+        'best_pos': result.best_pos,
+        'best_power': result.best_power,
+    }
+
+    # the 1-D scan found the best primary angle for the other axes as they are
+    if found_hill and len(state.axes) > 1:
+        spiral = doSpiralScan(state)
+        if spiral is not None:
+            scan_result['spiral'] = {
+                'duration_s': spiral.duration_s,
+                'moves': spiral.moves,
+                'evaluations': spiral.evaluations,
+                'best_pos': {a.name: p for a, p in zip(state.axes, spiral.best_pos)},
+                'best_power': spiral.best_power,
+            }
+
+    state.metrics.setScanResult(scan_result)
+
+    # teach the sun calibration where the optimum is at this sun position
+    sun = sun_position()
+    if found_hill and sun is not None and sun[1] > 0:
+        state.sun_calibration.add(CLOCK.time(), sun[0], sun[1], state.pos)
+
+    state.scan_store.add(result, start_deg, end_deg)
+
+    # one line per scan, for comparing strategies
+    with open(state.config.path(SCANS_FILE), "a") as fout:
+        fout.write("{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(
+            result.started_at, result.strategy, result.duration_s, result.moves,
+            result.best_pos, result.best_power, result.final_pos))
+
+    return found_hill
+
+def doSpiralScan(state):
+    """
+    Spirals around where the 1-D scan ended over the first two axes and
+    refines with pattern search, see multi_axis.py. Returns the SpiralResult,
+    None without measurements.
+    """
+    state.axis_pos = state.readAxes()
+    log("Starting spiral scan around {}".format(
+        ", ".join("{} {:0.3f}".format(a.name, p) for a, p in zip(state.axes, state.axis_pos))))
+    # the primary axis within the scan's range, the others' are unknown
+    bounds = [(SCAN_DEG_START, SCAN_DEG_END)] + [None] * (len(state.axes) - 1)
+    result = run_spiral_scan(AxesTarget(state), bounds=bounds, clock=CLOCK)
+    if result.best_pos is None:
+        log("Spiral scan got no measurements")
+        return None
+
+    log("Spiral scan: {:0.1f}s, {} moves, {} evaluations, max {:0.3f} W at {}".format(
+        result.duration_s, result.moves, result.evaluations, result.best_power / 1000,
+        ", ".join("{} {:0.3f}".format(a.name, p) for a, p in zip(state.axes, result.best_pos))))
+    return result
+
+def wait_for_wobble_to_stop(state, stopped_at, sleep_s=0, axis=None):
+    """
+    Sleeps until sleep_s after stopped_at, then reads the inclinometer until
+    the wobble (of axis, the primary one by default) is gone. Returns how
+    long after stopped_at it settled.
+    """
+    CLOCK.sleep(stopped_at + sleep_s - CLOCK.time())
+    axis = axis or state.axes[0]
+
+    detector = WobbleDetector()
+    sample = axis.view(next_inclino_sample(state))
+    settled_at = sample.ts
+    while detector.add(sample.angle):
+        sample = axis.view(next_inclino_sample(state, after_ts=sample.ts))
+        if detector.stable_run == 0:
+            settled_at = sample.ts  # the stable run starts with this sample at the earliest
+
+    return settled_at - stopped_at
+
+def write_json_atomic(path, obj):
+    # readers see either the old or the new file, never half of one
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as fout:
+        json.dump(obj, fout)
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(tmp_path, path)
+
+
+class TrackerState(object):
+    # what a restarted controller needs to carry on hill climbing
+    CHECKPOINT_FIELDS = [
+        "step_deg", "decision_history", "attemted_direction", "pos",
+        "start_of_scan", "scan_measurements", "last_scan_ts", "last_scan_pos",
+        "moves_count", "useful_total", "wobble_total",
+        "curvature", "scan_optima", "decision_busy_s", "decision_motor_wh",
+    ]
+
+    def __init__(self, config, scheduler, hardware):
+        self.config = config
+        self.scheduler = scheduler
+        self.metrics = Metrics()
+        self.watts = WattsReader(hardware.power)
+        self.actuator = hardware.actuator
+        # one streaming connection to the inclinometer broker, read in the background
+        self.inclino = hardware.inclino
+
+        # learned coast-down after the motor is cut, per channel
+        self.coast = CoastModel()
+        # learned pulse duration -> distance, per direction and angle band
+        self.drag = DragModel(INEXACT_DIST_OVER_TIME_RATIO)
+        # learned settle time per direction, angle and pulse duration
+        self.settle = SettleTable(config.path(SETTLE_FILE))
+        # set by load()
+        self.sun_calibration = None
+        self.scan_store = None
+
+        # the actuators, the primary one first, and where each one is
+        self.axes = config.axes
+        self.axis_pos = [0] * len(self.axes)
+        # the direction pattern_climb() tries next, and the other axes' steps
+        self.pattern = TrackingPoll(len(self.axes), STEP_DEG)
+
+        self.step_deg = STEP_DEG
+        self.decision_history = []
+        self.attemted_direction = "ext"
+        self.start_of_scan = None
+        self.scan_measurements = None
+        self.last_scan_ts = 0
+        self.last_scan_pos = None
+
+        self.moves_count = 0
+        self.useful_total = 0
+        self.wobble_total = 0
+
+        # when the reflector last settled, power read before this is stale
+        self.move_end_ts = 0
+
+        # recent (ts, pos, power) for model_climb()
+        self.curve_samples = collections.deque(maxlen=CURVE_WINDOW)
+
+        # (ts, pos) after each decision, how fast the optimum drifts
+        self.decision_positions = collections.deque(maxlen=DECISION_POSITIONS_KEPT)
+        # at night, see cadence.py
+        self.idle = False
+
+        # passing clouds on the power stream, fed up to sky_fed_ts
+        self.sky = SkyDetector()
+        self.sky_fed_ts = 0
+
+        # what decisions cost and win back, see move_cost.py
+        self.curvature = None  # relative output lost per degree squared, from the last scan
+        self.scan_optima = []  # (ts, best pos) of the last two scans
+        self.decision_busy_s = None  # smoothed, from deciding to go ahead to the last reading
+        self.decision_motor_wh = None  # smoothed
+        self.decision_started_ts = None
+        self.decision_gain_wh = None  # expected, of the current decision
+        self.move_motor_wh = 0.0  # all moves so far
+        self.move_settle_wh = 0.0
+
+    @property
+    def pos(self):
+        # the primary axis, which everything 1-D works with
+        return self.axis_pos[0]
+
+    @pos.setter
+    def pos(self, value):
+        self.axis_pos[0] = value
+
+    def axisFor(self, channel):
+        for i, axis in enumerate(self.axes):
+            if channel in (axis.ext_channel, axis.ret_channel):
+                return i
+        raise ValueError("Channel {} belongs to no axis of {}".format(channel, self.config.name))
+
+    def readAxes(self):
+        sample = next_inclino_sample(self)
+        return [getattr(sample, axis.angle_field) for axis in self.axes]
+
+    def load(self):
+        """
+        Loads what was learned about this tracker on previous runs
+        """
+        drag_file = self.config.path(DRAG_FILE)
+        log("Drag model: loaded {} moves from {}".format(self.drag.load(drag_file), drag_file))
+        log("Settle table: loaded {} moves from {}".format(self.settle.load(), self.settle.path))
+        self.sun_calibration = SunCalibration(self.config.path(SUN_CALIBRATION_FILE))
+        self.scan_store = ScanStore(self.config.path(SCANS_DB_FILE))
+
+    def checkpoint(self, path):
+        obj = {f: getattr(self, f) for f in self.CHECKPOINT_FIELDS}
+        obj["curve_samples"] = list(self.curve_samples)
+        obj["ts"] = CLOCK.time()
+        write_json_atomic(path, obj)
+
+    def restore(self, path):
+        """
+        Loads a checkpoint if it is recent and agrees with the inclinometer.
+        Returns True if the state was restored.
+        """
+        try:
+            with open(path) as f:
+                obj = json.load(f)
+        except (OSError, ValueError) as e:
+            log("No checkpoint to restore from {}: {}".format(path, e))
+            return False
+
+        age = CLOCK.time() - obj.get("ts", 0)
+        if not 0 <= age <= CHECKPOINT_MAX_AGE_S:
+            log("Checkpoint is {} minutes old, not restoring".format(int(age / 60)))
+            return False
+
+        angle = get_line_and_parse(self)
+        if abs(angle - obj["pos"]) > CHECKPOINT_MAX_POS_ERROR_DEG:
+            log("Checkpoint position {:0.3f} does not match the inclinometer {:0.3f}, not restoring".format(
+                obj["pos"], angle))
+            return False
+
+        for f in self.CHECKPOINT_FIELDS:
+            if f in obj:  # checkpoints of older versions lack the newer fields
+                setattr(self, f, obj[f])
+        self.curve_samples.extend(tuple(s) for s in obj["curve_samples"])
+        self.axis_pos[1:] = self.readAxes()[1:]
+        self.pos = angle
+
+        log("Restored checkpoint from {:0.1f}s ago at {:0.3f} degrees, history {}".format(
+            age, self.pos, self.decision_history))
+        return True
+
+    def addDecision(self, decision):
+        self.decision_history.append(decision)
+        self.decision_positions.append((CLOCK.time(), self.pos))
+        if len(self.decision_history) > OPTIMA_SAMPLES:
+            self.decision_history = self.decision_history[-OPTIMA_SAMPLES:]
+        self.metrics.setStep(self.step_deg)
+
+    def addCurveSample(self, power):
+        if power is not None:
+            self.curve_samples.append((CLOCK.time(), self.pos, power))
+
+    def curvePoints(self):
+        now = CLOCK.time()
+        return [(pos, power) for ts, pos, power in self.curve_samples
+                if now - ts < CURVE_MAX_AGE_S and abs(pos - self.pos) <= CURVE_SPAN_DEG]
+
+    def updateWobbleData(self, latest_dur, useful_time):
+        self.moves_count += 1
+        self.wobble_total += latest_dur
+        avg_dur = self.wobble_total / self.moves_count
+
+        self.useful_total += useful_time
+        time_loss_pct = (self.wobble_total / self.useful_total) * 100
+
+        self.metrics.setWobbleData([latest_dur, avg_dur, time_loss_pct])
+
+    def updateEfficiency(self, new_value):
+        # check if efficiency cannot be calculated:
+        # 1. if all scan measurements are similar that means panel is not getting sun or reflector is not adding light
+        # 2. if first measurement is max, this means we are early in the morning where reflector cannot add more light,
+        #    only block light. Moreover, at this morning time, sun energy is increasing quickly and this would make the 
+        #    our approximation exaggerated because it would incorrectly claim natural sunlight increase as
+        #    gain from the reflector
+        if self.scan_measurements is None or len(self.scan_measurements) == 0:
+            return
+
+        avg_m = sum(self.scan_measurements) / len(self.scan_measurements)
+        max_m = max(self.scan_measurements)
+        if max_m < avg_m * 1.01:
+            log("CANNOT updateEfficiency: scan too flat")
+            return
+
+        left_most = self.scan_measurements[0]
+        if left_most > max_m * 0.95:
+            log("CANNOT updateEfficiency: max is too close to the left extreme: left is {}; max is {}".format(int(left_most / 1000), int(max_m / 1000)))
+            return
+
+        if self.start_of_scan is not None and self.start_of_scan != 0:
+            efficiency_pct = (new_value / self.start_of_scan) * 100
+            self.metrics.setEfficiency(efficiency_pct)
+
+    def climbPause(self):
+        """
+        Seconds to wait before the next decision, see cadence.py
+        """
+        now = CLOCK.time()
+        positions = [(ts, pos) for ts, pos in self.decision_positions if now - ts <= DRIFT_WINDOW_S]
+        return climb_pause_s(self.decision_history, positions, self.step_deg)
+
+    def decisionEconomics(self):
+        """
+        (expected gain, cost) of a decision now in Wh, (None, None) until
+        there is a curvature, a drift rate and a few decisions to go by
+        """
+        latest = self.watts.sampler.latest()
+        if self.curvature is None or self.decision_busy_s is None or latest is None:
+            return None, None
+        if len(self.decision_positions) == 0:
+            return None, None
+
+        # a reflector that lags behind understates the drift, the scans don't
+        now = CLOCK.time()
+        rates = [drift_rate([(ts, pos) for ts, pos in self.decision_positions if now - ts <= DRIFT_WINDOW_S]),
+                 drift_rate(self.scan_optima)]
+        rates = [r for r in rates if r is not None]
+        if len(rates) == 0:
+            return None, None
+        rate = max(rates)
+
+        curvature_mw = self.curvature * latest['power']
+        since_s = now - self.decision_positions[-1][0]
+        return (expected_gain_wh(curvature_mw, rate, since_s),
+                decision_cost_wh(curvature_mw, self.step_deg, self.decision_motor_wh, self.decision_busy_s))
+
+    def addDecisionEffort(self, busy_s, motor_wh):
+        if self.decision_busy_s is None:
+            self.decision_busy_s, self.decision_motor_wh = busy_s, motor_wh
+        else:
+            self.decision_busy_s += EFFORT_SMOOTHING * (busy_s - self.decision_busy_s)
+            self.decision_motor_wh += EFFORT_SMOOTHING * (motor_wh - self.decision_motor_wh)
+
+    def setIdle(self, idle):
+        self.idle = idle
+        self.watts.sampler.set_idle(idle)
+        self.metrics.setIdle(idle)
+
+    def prepositionFromSun(self):
+        """
+        Moves to the optimum the sun calibration predicts for the current sun
+        position. Returns False when there is no confident prediction.
+        """
+        sun = sun_position()
+        if sun is None or sun[1] <= 0 or not self.sun_calibration.is_confident(CALIBRATION_MAX_STD_DEG):
+            return False
+
+        predicted_pos, std = self.sun_calibration.predict(*sun)
+        delta = predicted_pos - self.pos
+        log("Sun at azimuth {:0.1f} elevation {:0.1f}, predicted optimum {:0.3f} (+/- {:0.3f}) degrees".format(
+            sun[0], sun[1], predicted_pos, std))
+
+        if abs(delta) >= PREPOSITION_MIN_DEG:
+            move_by(self, delta)
+        return True
+
+    def warmStart(self):
+        """
+        Moves to where the optimum has been at this time of day on the
+        previous days. Returns False without enough scan history.
+        """
+        typical = typical_optimum(self)
+        if typical is None:
+            return False
+
+        self.pos = get_line_and_parse(self)
+        best_pos, lowest, highest = typical
+        log("Warm start: optimum was between {:0.3f} and {:0.3f} degrees at this time of day, moving to {:0.3f}".format(
+            lowest, highest, best_pos))
+
+        if abs(best_pos - self.pos) >= PREPOSITION_MIN_DEG:
+            move_by(self, best_pos - self.pos)
+        return True
+
+    def _flip_dir(self, direction):
+        axis = self.axes[self.axisFor(direction)]
+        if direction == axis.ext_channel:
+            return axis.ret_channel
+        else:
+            return axis.ext_channel
+
+    def _arm(self, distance_deg, direction, exact, is_decision=False, corrections=0):
+        if distance_deg is None:
+            distance_deg = self.step_deg
+
+        # the learned models tell axes apart by direction name
+        axis_i = self.axisFor(direction)
+        axis = self.axes[axis_i]
+        angle_before = get_line_and_parse(self, axis)
+        direction_name = axis.directionName(direction)
+
+        delay = self.drag.delay_for(distance_deg, direction_name, angle_before)
+        log("Requested: {:0.3f} degrees ({:0.3f}s)".format(distance_deg, delay))
+
+        dir_mult = (1 if direction == axis.ext_channel else -1)
+        target = angle_before + distance_deg * dir_mult
+        closed_loop = exact and CLOSED_LOOP_MOVES
+        power_before = self.watts.sampler.latest()
+        motor_started = CLOCK.time()
+
+        try:
+            # only the motor waits for the other trackers, settling does not
+            with self.scheduler.motor:
+                if closed_loop:
+                    delay, cut_pos, cut_vel = move_arm_closed_loop(
+                        self, direction, target, delay * CLOSED_LOOP_MAX_DURATION_MULT)
+                else:
+                    requested_s = delay
+                    delay = move_arm(self, direction, requested_s)
+                    self.metrics.addPulse(requested_s, delay)
+            if closed_loop:
+                log("Closed loop: motor on for {:0.3f}s, cut at {:0.3f} degrees, {:0.3f} deg/s".format(
+                    delay, cut_pos, cut_vel))
+            else:
+                log("Pulse: motor on for {:0.4f}s, {:+0.2f}ms off".format(delay, 1000 * (delay - requested_s)))
+        except KeyboardInterrupt:
+            self.actuator.cleanup()
+        else:
+            # 1. wait for wobble to stop, sleeping through most of it
+            start_wobble_wait = CLOCK.time()
+            predicted = self.settle.predict(direction_name, target, delay)
+            sleep_s = predicted * SETTLE_SLEEP_FRACTION if predicted is not None else 0
+            settle_s = wait_for_wobble_to_stop(self, start_wobble_wait, sleep_s, axis)
+            dur = CLOCK.time() - start_wobble_wait
+            self.move_end_ts = CLOCK.time()
+
+            self.addMoveCost(delay, power_before, motor_started)
+            self.settle.add(start_wobble_wait, direction_name, target, delay, settle_s)
+            self.metrics.setSettle(predicted, sleep_s, settle_s)
+            log("Settle: predicted {}, slept {:0.2f}s, settled after {:0.2f}s".format(
+                "-" if predicted is None else "{:0.2f}s".format(predicted), sleep_s, settle_s))
+
+            # 2. set pos to inclinometer angle
+            angle = get_line_and_parse(self, axis)
+            pretty_print_deg(angle)
+            self.axis_pos[axis_i] = angle
+
+            # 3. update Wobble data
+            self.updateWobbleData(dur, useful_time=delay)
+            if closed_loop:
+                self.coast.update(direction, cut_pos, cut_vel, angle)
+
+            # 4. take a watts reading for the grapher
+            self.watts.read(self, is_decision=is_decision)
+
+            # 5. write angle data to a file and refit the drag model
+            with open(self.config.path(DRAG_FILE), "a") as fout:
+                dist = angle - angle_before
+                fout.write("{}\t{}\t{}\t{}\t{}\n".format(delay, angle_before, angle, dist, direction_name))
+            self.drag.add(delay, angle_before, angle, direction_name)
+
+            # 6. recursive call to adjust to desired precision
+            if exact:
+                error_deg = target - angle
+
+                actual_delta = angle - angle_before
+                if abs(error_deg) < EXACT_MOVE_PRECISION:
+                    verdict = "GOOD"
+                else:
+                    verdict = "correcting..."
+
+                log("Exact angles: requested delta {:0.3f}, actual delta {:0.3f}, was off by {:0.3f} ({})".format(
+                    distance_deg * dir_mult, actual_delta, error_deg, verdict))
+                if abs(error_deg) < EXACT_MOVE_PRECISION:
+                    return
+                if corrections >= MAX_EXACT_CORRECTIONS:
+                    log("Giving up on exact move after {} corrections, off by {:0.3f}".format(corrections, error_deg))
+                    return
+                if error_deg < 0:
+                    direction = self._flip_dir(direction)
+                    error_deg = -error_deg
+                self._arm(error_deg, direction, exact, corrections=corrections + 1)
+
+    def addMoveCost(self, on_s, power_before, started):
+        """
+        Motor energy of a move and the output below the level before it,
+        from when the motor started until the reflector settled
+        """
+        self.move_motor_wh += motor_wh(on_s)
+        if power_before is None:
+            return
+        window = self.watts.sampler.window(started, self.move_end_ts)
+        if len(window["power"]) > 0:
+            lost_mw = power_before['power'] - float(sum(window["power"]) / len(window["power"]))
+            self.move_settle_wh += max(lost_mw, 0) * (self.move_end_ts - started) / 3600 / 1000
+
+    def sweep(self, delta_deg):
+        """
+        Runs the motor through delta_deg without stopping, recording on the
+        way. Returns (angle ts, angles, power ts, powers).
+        """
+        direction = (self.config.ext_channel if delta_deg > 0 else self.config.ret_channel)
+        direction_name = ("ext" if direction == self.config.ext_channel else "ret")
+        dir_mult = (1 if direction == self.config.ext_channel else -1)
+
+        sample = next_inclino_sample(self)
+        power_before = self.watts.sampler.latest()
+        target = sample.angle + delta_deg
+        max_duration = self.drag.delay_for(abs(delta_deg), direction_name, sample.angle) * CLOSED_LOOP_MAX_DURATION_MULT
+        angle_ts = [sample.ts]
+        angles = [sample.angle]
+
+        with self.scheduler.motor:
+            start = CLOCK.time()
+            self.actuator.setup(direction)
+            self.actuator.motor_on(direction)
+            try:
+                while (target - sample.angle) * dir_mult > 0 and CLOCK.time() - start < max_duration:
+                    sample = next_inclino_sample(self, after_ts=sample.ts)
+                    angle_ts.append(sample.ts)
+                    angles.append(sample.angle)
+            finally:
+                self.actuator.motor_off(direction)
+            on_time = CLOCK.time() - start
+
+        stopped_at = CLOCK.time()
+        wait_for_wobble_to_stop(self, stopped_at)
+        self.move_end_ts = CLOCK.time()
+        self.addMoveCost(on_time, power_before, start)
+        self.pos = get_line_and_parse(self)
+        self.updateWobbleData(self.move_end_ts - stopped_at, useful_time=on_time)
+
+        window = self.watts.sampler.window(angle_ts[0], angle_ts[-1])
+        log("Sweep: {:0.3f} to {:0.3f} degrees in {:0.1f}s, {} angles and {} power readings".format(
+            angles[0], angles[-1], on_time, len(angles), len(window["power"])))
+        return angle_ts, angles, window["ts"], window["power"]
+
+    def armRet(self, deg=None, exact=True, is_decision=False, axis=0):
+        self._arm(deg, self.axes[axis].ret_channel, exact, is_decision=is_decision)
+
+    def armExt(self, deg=None, exact=True, is_decision=False, axis=0):
+        self._arm(deg, self.axes[axis].ext_channel, exact, is_decision=is_decision)
+
+
+def next_inclino_sample(state, after_ts=None):
+    try:
+        sample = state.inclino.next_sample(after_ts)
+    except Exception as e:
+        log("ERROR: cold not get incli data: {}".format(e))
+        log(e)
+        raise e
+    else:
+        return sample
+
+
+def get_line_and_parse(state, axis=None):
+    # the primary axis' angle unless another axis is given
+    return (axis or state.axes[0]).view(next_inclino_sample(state)).angle
+
+
+class Controller(object):
+    def __init__(self, algorithm=HILL_CLIMB_ALGORITHM, configs=None):
+        self.algorithm = algorithm
+        self.climb = ALGORITHMS[algorithm]
+        self.configs = configs  # from trackers.json unless given
+        self.scheduler = None  # once the clock is known
+        self.states = []
+        self.state = None  # the first tracker's
+        self.started_at = None
+        self.failed = None  # a tracker's exception, stops the others
+
+    def start(self, hardware=None, serve_metrics=True):
+        """
+        Starts the metrics server and the hardware, the Pi's unless given
+        (one Hardware per tracker, or just one), and loads what was learned
+        on previous runs
+        """
+        global CLOCK, START_TIME, LOCATION
+
+        if self.configs is None:
+            self.configs = load_tracker_configs()
+        if hardware is None:
+            # Run in the background
+            hardware = self._pi_hardware()
+        elif not isinstance(hardware, list):
+            hardware = [hardware]
+        if len(hardware) != len(self.configs):
+            raise ValueError("{} trackers but hardware for {}".format(len(self.configs), len(hardware)))
+
+        # one clock for all trackers, each moves with its own actuator
+        CLOCK = hardware[0].clock
+        self.scheduler = Scheduler(condition=getattr(CLOCK, "Condition", threading.Condition))
+
+        START_TIME = self.started_at = CLOCK.time()
+        log("Hill climb algorithm: {}".format(self.algorithm))
+        log("Shunt resistance: {} ohms".format(SHUNT_OHMS))
+
+        for config, tracker_hardware in zip(self.configs, hardware):
+            if len(self.configs) > 1:
+                log("Tracker {}: ret channel {}, ext channel {}, INA219 {:#x}, inclinometer {}, files in {}".format(
+                    config.name, config.ret_channel, config.ext_channel, config.ina_address,
+                    config.inclino_socket, config.home))
+            for axis in config.axes[1:]:
+                log("Tracker {}: axis {} on ret channel {}, ext channel {}, inclinometer {}".format(
+                    config.name, axis.name, axis.ret_channel, axis.ext_channel, axis.angle_field))
+            state = TrackerState(config, self.scheduler, tracker_hardware)  # last_scan_ts = 0, scan right away
+            state.metrics.setAlgorithm(self.algorithm)
+            state.load()
+            self.states.append(state)
+        self.state = self.states[0]
+
+        if serve_metrics:
+            metrics = self.state.metrics if len(self.states) == 1 else MetricsGroup(self.states)
+            start_metrics_server(metrics, Metrics.ADDR, Metrics.NUM_LISTENER_THREADS)
+
+        LOCATION = load_location()
+        return self
+
+    def _pi_hardware(self):
+        samplers = {}  # INA219 address -> its sampler, trackers on one sensor share it
+        hardware = []
+        for config in self.configs:
+            h = pi_hardware(log=log, ina_address=config.ina_address, inclino_socket=config.inclino_socket,
+                            power=samplers.get(config.ina_address))
+            samplers[config.ina_address] = h.power
+            hardware.append(h)
+        return hardware
+
+    def run(self, until=None):
+        """
+        The main loop, forever or until the clock reaches until. With
+        several trackers each one runs it in its own thread.
+        """
+        try:
+            if len(self.states) == 1:
+                self._run_tracker(self.state, until)
+                return
+
+            threads = [threading.Thread(target=self._run_thread, args=(state, until), name=state.config.name, daemon=True)
+                       for state in self.states]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            # the pins stay set up between moves, and the threads die with the process, the motors would not
+            actuators = []
+            for state in self.states:
+                if not any(state.actuator is a for a in actuators):
+                    actuators.append(state.actuator)
+            for actuator in actuators:
+                actuator.cleanup()
+
+        if self.failed is not None:
+            raise self.failed
+
+    def _run_thread(self, state, until):
+        try:
+            self._run_tracker(state, until)
+        except Exception as e:
+            log("ERROR: tracker stopped: {}".format(e))
+            self.failed = e
+
+    def _run_tracker(self, state, until):
+        checkpoint_file = state.config.path(CHECKPOINT_FILE)
+        # moves of trackers on the same power sensor show up in each other's readings
+        sensor_turn = self.scheduler.sensorTurn(state.config)
+
+        CLOCK.sleep(MEASURE_SLEEP)  # let reader thread get it's first measurement
+        with sensor_turn:
+            restored = state.restore(checkpoint_file)
+            if not restored and state.warmStart():
+                # climb from the usual optimum, the next (narrowed) scan can wait
+                state.last_scan_ts = CLOCK.time()
+        last_preposition_ts = CLOCK.time()
+        first_decision = True
+
+        while((until is None or CLOCK.time() < until) and self.failed is None):
+            latest = state.watts.sampler.latest()
+            power_mw = latest['power'] if latest is not None else None
+            if is_night(power_mw, state.idle):
+                if not state.idle:
+                    log("Night: {:0.3f} W, idling".format(power_mw / 1000))
+                    state.setIdle(True)
+                    state.checkpoint(checkpoint_file)
+                CLOCK.sleep(IDLE_POLL_S)
+                continue
+            if state.idle:
+                log("Morning: {:0.3f} W, tracking again".format(power_mw / 1000))
+                state.setIdle(False)
+
+            if state.sun_calibration.is_confident(CALIBRATION_MAX_STD_DEG):
+                scan_every_s = CALIBRATED_SCAN_EVERY_N_SECONDS
+            else:
+                scan_every_s = SCAN_EVERY_N_SECONDS
+            sun = sun_position()
+
+            with sensor_turn:
+                since_scan_s = CLOCK.time() - state.last_scan_ts
+                moved_deg = abs(state.pos - state.last_scan_pos) if state.last_scan_pos is not None else None
+                due, postponed = scan_due(
+                    since_scan_s, scan_every_s, moved_deg, sun[1] if sun is not None else None, power_mw)
+                if not due:
+                    if since_scan_s < scan_every_s:
+                        log("{} of {} minutes; {} minutes left until next scan".format(
+                                *[int(x / 60) for x in [since_scan_s, scan_every_s, scan_every_s - since_scan_s]]))
+                    else:
+                        log("Scan postponed: {} minutes since the last one, {}".format(
+                            int(since_scan_s / 60), postponed))
+
+                    if CLOCK.time() - last_preposition_ts >= PREPOSITION_EVERY_N_SECONDS:
+                        state.prepositionFromSun()
+                        last_preposition_ts = CLOCK.time()
+                # scans take turns, spread out over the scan interval
+                elif not self.scheduler.claimScan(state.config, CLOCK.time(), scan_every_s / len(self.states)):
+                    log("Time for a scan ({} minutes since the last one), waiting for the other trackers".format(
+                        int(since_scan_s / 60)))
+                else:
+                    log("Time for a scan ({} minutes since the last one)".format(int(since_scan_s / 60)))
+
+                    try:
+                        energy_before = state.watts.sampler.energy_wh()
+                        found_max = doScan(state)
+                        while(not found_max):
+                            found_max = doScan(state, narrow=False)
+                        state.metrics.addEnergy("scan", state.watts.sampler.energy_wh() - energy_before)
+                    finally:
+                        self.scheduler.endScan(state.config, CLOCK.time())
+                    state.last_scan_ts = CLOCK.time()
+                    state.last_scan_pos = state.pos
+                    last_preposition_ts = state.last_scan_ts
+
+                energy_before = state.watts.sampler.energy_wh()
+                moves_before = state.moves_count
+                motor_wh_before, settle_wh_before = state.move_motor_wh, state.move_settle_wh
+                decision = self.climb(state)
+                # holds and skips are counted as such, not as decisions without moves
+                if decision not in ["hold", "skip"]:
+                    state.metrics.countDecision(decision, state.moves_count - moves_before)
+                    state.addDecisionEffort(CLOCK.time() - state.decision_started_ts, state.move_motor_wh - motor_wh_before)
+                    state.metrics.addDecisionEnergy(
+                        state.decision_gain_wh,
+                        state.move_motor_wh - motor_wh_before, state.move_settle_wh - settle_wh_before)
+                state.metrics.addEnergy(self.algorithm, state.watts.sampler.energy_wh() - energy_before)
+
+            if first_decision:
+                state.metrics.setTimeToFirstDecision(CLOCK.time() - self.started_at, restored)
+                log("First decision {:0.1f}s after start".format(CLOCK.time() - self.started_at))
+                first_decision = False
+
+            state.checkpoint(checkpoint_file)
+
+            if decision == "skip":
+                CLOCK.sleep(DEFER_S)  # out of the sensor's turn, the other trackers can use it
+            pause_s = state.climbPause()
+            if pause_s > 0:
+                log("Next decision in {:0.0f}s, {}".format(pause_s, state.decision_history[-3:]))
+                CLOCK.sleep(pause_s)
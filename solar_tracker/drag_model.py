@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Pulse duration -> displacement model of the actuator, learned from drag.tab.
+
+Every move appends "delay, angle_before, angle, dist[, direction]" to
+~/drag.tab. For each direction and angle band the model keeps running sums
+for a least squares line dist = slope * delay + offset, so it refits in O(1)
+with every new move. The offset captures the motor's spin-up dead time.
+
+Rows written before the direction column existed get their direction from
+the sign of dist.
+"""
+import os
+
+ANGLE_BAND_DEG = 10
+MIN_SAMPLES = 5  # per fit, before that the next coarser fit is used
+MIN_DIST_DEG = 0.01  # too small to tell which way the arm moved
+
+
+class LineFit(object):
+    def __init__(self):
+        self.n = 0
+        self.sx = 0.0
+        self.sy = 0.0
+        self.sxx = 0.0
+        self.sxy = 0.0
+
+    def add(self, x, y):
+        self.n += 1
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.sxy += x * y
+
+    def fit(self):
+        """
+        Returns (slope, offset), None if there is not enough data for a
+        line with positive slope
+        """
+        if self.n < MIN_SAMPLES:
+            return None
+
+        denom = self.n * self.sxx - self.sx * self.sx
+        if denom <= 0:
+            return None
+
+        slope = (self.n * self.sxy - self.sx * self.sy) / denom
+        if slope <= 0:
+            return None
+
+        offset = (self.sy - slope * self.sx) / self.n
+        return slope, offset
+
+
+class DragModel(object):
+    def __init__(self, default_ratio, band_deg=ANGLE_BAND_DEG):
+        self.default_ratio = default_ratio  # deg per second, used without data
+        self.band_deg = band_deg
+        self.band_fits = {}  # (direction, band) -> LineFit
+        self.direction_fits = {}  # direction -> LineFit
+
+    def _band(self, angle):
+        return int(angle // self.band_deg)
+
+    def add(self, delay, angle_before, angle, direction):
+        dist = abs(angle - angle_before)
+        key = (direction, self._band(angle_before))
+
+        self.band_fits.setdefault(key, LineFit()).add(delay, dist)
+        self.direction_fits.setdefault(direction, LineFit()).add(delay, dist)
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return 0
+
+        count = 0
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                try:
+                    delay, angle_before, angle, dist = [float(p) for p in parts[:4]]
+                except ValueError:
+                    continue
+
+                if len(parts) > 4:
+                    direction = parts[4]
+                elif abs(dist) >= MIN_DIST_DEG:
+                    direction = "ext" if dist > 0 else "ret"
+                else:
+                    continue
+
+                self.add(delay, angle_before, angle, direction)
+                count += 1
+
+        return count
+
+    def fit_for(self, direction, angle):
+        fit = None
+        band_fit = self.band_fits.get((direction, self._band(angle)))
+        if band_fit is not None:
+            fit = band_fit.fit()
+
+        if fit is None and direction in self.direction_fits:
+            fit = self.direction_fits[direction].fit()
+
+        return fit
+
+    def delay_for(self, distance_deg, direction, angle):
+        """
+        Pulse length that should move the arm distance_deg from angle
+        """
+        fit = self.fit_for(direction, angle)
+        if fit is None:
+            return distance_deg / self.default_ratio
+
+        slope, offset = fit
+        return max(0, (distance_deg - offset) / slope)
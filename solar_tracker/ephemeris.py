@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Sun position and the learned sun -> reflector angle calibration.
+
+solar_position() implements the NOAA solar calculator equations (good to a
+fraction of a degree, no refraction correction), so the tracker knows where
+the sun is without any network or extra packages.
+
+SunCalibration learns the optimal reflector angle as a linear function of sun
+elevation and azimuth from past scan results, kept one per line in a file:
+"ts azimuth elevation best_pos".
+"""
+import math
+import os
+
+import numpy as np
+
+MIN_POINTS = 6  # scans needed before the calibration predicts anything
+MAX_POINTS = 300  # most recent scans used, so the fit follows the seasons
+
+
+def solar_position(ts, lat, lon):
+    """
+    Returns (azimuth, elevation) in degrees for unix time ts at lat/lon
+    (degrees, east positive). Azimuth is clockwise from north.
+    """
+    rad = math.radians
+    deg = math.degrees
+
+    jd = ts / 86400 + 2440587.5
+    jc = (jd - 2451545) / 36525
+
+    mean_long = (280.46646 + jc * (36000.76983 + jc * 0.0003032)) % 360
+    mean_anom = 357.52911 + jc * (35999.05029 - 0.0001537 * jc)
+    ecc = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+
+    eq_ctr = (math.sin(rad(mean_anom)) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+              + math.sin(rad(2 * mean_anom)) * (0.019993 - 0.000101 * jc)
+              + math.sin(rad(3 * mean_anom)) * 0.000289)
+    true_long = mean_long + eq_ctr
+    app_long = true_long - 0.00569 - 0.00478 * math.sin(rad(125.04 - 1934.136 * jc))
+
+    mean_obliq = 23 + (26 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60) / 60
+    obliq = mean_obliq + 0.00256 * math.cos(rad(125.04 - 1934.136 * jc))
+    decl = deg(math.asin(math.sin(rad(obliq)) * math.sin(rad(app_long))))
+
+    var_y = math.tan(rad(obliq / 2)) ** 2
+    eq_time = 4 * deg(
+        var_y * math.sin(2 * rad(mean_long))
+        - 2 * ecc * math.sin(rad(mean_anom))
+        + 4 * ecc * var_y * math.sin(rad(mean_anom)) * math.cos(2 * rad(mean_long))
+        - 0.5 * var_y * var_y * math.sin(4 * rad(mean_long))
+        - 1.25 * ecc * ecc * math.sin(2 * rad(mean_anom)))  # minutes
+
+    true_solar_time = ((ts % 86400) / 60 + eq_time + 4 * lon) % 1440
+    hour_angle = true_solar_time / 4 - 180
+
+    cos_zenith = (math.sin(rad(lat)) * math.sin(rad(decl))
+                  + math.cos(rad(lat)) * math.cos(rad(decl)) * math.cos(rad(hour_angle)))
+    zenith = deg(math.acos(min(max(cos_zenith, -1), 1)))
+
+    denom = math.cos(rad(lat)) * math.sin(rad(zenith))
+    if denom == 0:
+        azimuth = 180.0
+    else:
+        cos_az = (math.sin(rad(lat)) * math.cos(rad(zenith)) - math.sin(rad(decl))) / denom
+        az = deg(math.acos(min(max(cos_az, -1), 1)))
+        if hour_angle > 0:
+            azimuth = (az + 180) % 360
+        else:
+            azimuth = (540 - az) % 360
+
+    return azimuth, 90 - zenith
+
+
+class SunCalibration(object):
+    def __init__(self, path):
+        self.path = path
+        self.points = []  # (ts, azimuth, elevation, best_pos)
+        self.model = None  # (coeffs, residual_std)
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    self.points.append(tuple(float(p) for p in line.split()[:4]))
+                except ValueError:
+                    continue
+
+        self.fit()
+
+    def add(self, ts, azimuth, elevation, best_pos):
+        self.points.append((ts, azimuth, elevation, best_pos))
+        with open(self.path, "a") as fout:
+            fout.write("{}\t{}\t{}\t{}\n".format(ts, azimuth, elevation, best_pos))
+        self.fit()
+
+    def fit(self):
+        points = self.points[-MAX_POINTS:]
+        if len(points) < MIN_POINTS:
+            self.model = None
+            return
+
+        a = np.array([[1, elevation, azimuth] for ts, azimuth, elevation, pos in points])
+        y = np.array([pos for ts, azimuth, elevation, pos in points])
+        coeffs, _, rank, _ = np.linalg.lstsq(a, y, rcond=None)
+        if rank < 3:
+            self.model = None
+            return
+
+        residuals = y - a @ coeffs
+        residual_std = float(np.sqrt(np.sum(residuals ** 2) / (len(points) - 3)))
+        self.model = (coeffs, residual_std)
+
+    def predict(self, azimuth, elevation):
+        """
+        Returns (best_pos, residual_std) in degrees, None without a model
+        """
+        if self.model is None:
+            return None
+
+        coeffs, residual_std = self.model
+        return float(coeffs @ np.array([1, elevation, azimuth])), residual_std
+
+    def is_confident(self, max_std_deg):
+        return self.model is not None and self.model[1] < max_std_deg
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""The hardware the controller talks to, so it can run on the Pi or in sim.py.
+
+A clock is anything with time() and sleep(), the time module on the Pi.
+One that several tracker threads share in simulation also has Condition(),
+for the condition variables they wait on for their turns.
+The other interfaces are implemented by actuator.GpioActuator,
+power_sampler.PowerSampler and inclino_client.InclinoClient on the Pi and by
+the classes in sim.py in simulation.
+"""
+import time
+
+
+class Actuator(object):
+    """
+    Relays that run the linear actuator, one channel per direction
+    """
+    def setup(self, channel):
+        raise NotImplementedError()
+
+    def motor_on(self, channel):
+        raise NotImplementedError()
+
+    def motor_off(self, channel):
+        raise NotImplementedError()
+
+    def pulse(self, channel, duration_s):
+        """
+        Runs the motor for duration_s, returns how long it actually ran
+        """
+        raise NotImplementedError()
+
+    def cleanup(self):
+        raise NotImplementedError()
+
+
+class PowerSensor(object):
+    """
+    Power readings, dicts of ts, voltage, current (mA) and power (mW)
+    """
+    def latest(self):
+        raise NotImplementedError()
+
+    def wait_for_fresh_sample(self, newer_than, timeout=None):
+        raise NotImplementedError()
+
+    def window(self, start_ts, end_ts):
+        """
+        Readings with start_ts < ts <= end_ts as arrays per field
+        """
+        raise NotImplementedError()
+
+    def wait_for_window(self, start_ts, duration, timeout=None):
+        raise NotImplementedError()
+
+    def energy_wh(self):
+        raise NotImplementedError()
+
+    def set_idle(self, idle):
+        """
+        At night, read less often; optional
+        """
+        pass
+
+
+class Inclinometer(object):
+    """
+    Reflector angle, inclino_client.Sample tuples
+    """
+    def next_sample(self, after_ts=None, timeout=None):
+        """
+        First sample taken after after_ts (default now), waiting for it if
+        needed
+        """
+        raise NotImplementedError()
+
+    def latest(self):
+        raise NotImplementedError()
+
+
+class Hardware(object):
+    def __init__(self, clock, actuator, power, inclino):
+        self.clock = clock
+        self.actuator = actuator
+        self.power = power
+        self.inclino = inclino
+
+
+def pi_hardware(log=print, ina_address=None, inclino_socket=None, power=None):
+    """
+    The real thing, starts the power sampler and the inclinometer client.
+    Trackers on one power sensor pass the first one's sampler as power.
+    """
+    from solar_tracker.actuator import GpioActuator
+    from solar_tracker.inclino_client import BROKER_SOCKET
+    from solar_tracker.inclino_client import InclinoClient
+    from solar_tracker.power_sampler import INA_ADDRESS
+    from solar_tracker.power_sampler import PowerSampler
+
+    if power is None:
+        power = PowerSampler(address=ina_address if ina_address is not None else INA_ADDRESS, log=log)
+
+    return Hardware(
+        clock=time,
+        actuator=GpioActuator(log=log),
+        power=power,
+        inclino=InclinoClient(path=inclino_socket or BROKER_SOCKET, log=log),
+    )
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Long-lived client for the SCL3300 streaming port.
+
+Keeps one connection to collect.c's streaming port open, parses every averaged
+frame it pushes and keeps the most recent ones in a ring buffer, so readers
+never pay for a connect per sample.
+"""
+import collections
+import socket
+import threading
+import time
+
+STREAM_HOST = "127.0.0.1"
+STREAM_PORT = 2018
+
+# inclino_broker.py, the preferred source when more than one reader is running
+BROKER_SOCKET = "/tmp/scl3300-broker.sock"
+
+RING_SIZE = 4096  # ~40s of frames at the default 100 Hz stream
+RECONNECT_SLEEP = 1
+NEXT_SAMPLE_TIMEOUT = 5
+
+Sample = collections.namedtuple("Sample", [
+    "ts", "x", "y", "z", "angle", "crc", "sto", "temp", "ang_x", "ang_y", "ang_z"])
+
+
+def format_sample(sample, count=None):
+    fields = [
+        "%f" % sample.ts,
+        "%f" % sample.x,
+        "%f" % sample.y,
+        "%f" % sample.z,
+        "%f" % sample.angle,
+        "%.2f" % sample.crc,
+        "%d" % sample.sto,
+        "%.2f" % sample.temp,
+        "%.4f" % sample.ang_x,
+        "%.4f" % sample.ang_y,
+        "%.4f" % sample.ang_z,
+    ]
+    if count is not None:
+        fields.append("%d" % count)
+
+    return ("\t".join(fields) + "\n").encode()
+
+
+def mean_sample(samples):
+    """
+    Averages frames of equal duration into one, ts/crc/sto come from the last frame
+    """
+    n = len(samples)
+    last = samples[-1]
+    return last._replace(
+        x=sum(s.x for s in samples) / n,
+        y=sum(s.y for s in samples) / n,
+        z=sum(s.z for s in samples) / n,
+        angle=sum(s.angle for s in samples) / n,
+        temp=sum(s.temp for s in samples) / n,
+        ang_x=sum(s.ang_x for s in samples) / n,
+        ang_y=sum(s.ang_y for s in samples) / n,
+        ang_z=sum(s.ang_z for s in samples) / n,
+    )
+
+
+def parse_line(line, with_count=False):
+    """
+    One frame of collect.c's stream, or with_count one of the broker's,
+    which ends in how many frames it averaged. Any other number of fields,
+    e.g. a frame cut short and run into the next one, is a ValueError.
+    """
+    parts = line.strip().split(b'\t')
+    expected = len(Sample._fields) + (1 if with_count else 0)
+    if len(parts) != expected:
+        raise ValueError("expected {} fields, got {}: {}".format(expected, len(parts), line))
+
+    return Sample(
+        ts=float(parts[0]),
+        x=float(parts[1]),
+        y=float(parts[2]),
+        z=float(parts[3]),
+        angle=float(parts[4]),
+        crc=float(parts[5]),
+        sto=int(parts[6]),
+        temp=float(parts[7]),
+        ang_x=float(parts[8]),
+        ang_y=float(parts[9]),
+        ang_z=float(parts[10]),
+    )
+
+
+class InclinoClient(threading.Thread):
+    def __init__(self, host=STREAM_HOST, port=STREAM_PORT, path=None, ring_size=RING_SIZE, log=print):
+        """
+        Reads collect.c's stream from host:port, or every frame from the
+        broker if path is its Unix socket.
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.host = host
+        self.port = port
+        self.path = path
+        self.log = log
+
+        self.samples = collections.deque(maxlen=ring_size)
+        self.cond = threading.Condition()
+        self.connected = False
+
+        self.start()
+
+    def _connect(self):
+        if self.path is not None:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.connect(self.path)
+            s.sendall(b"stream 0\n")  # every frame, no averaging
+            return s
+
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.connect((self.host, self.port))
+        return s
+
+    def _publish(self, sample):
+        with self.cond:
+            self.samples.append(sample)
+            self.cond.notify_all()
+
+    def run(self):
+        while True:
+            try:
+                with self._connect() as s:
+                    self.connected = True
+                    buf = b''
+                    while True:
+                        chunk = s.recv(4096)
+                        if not chunk:
+                            raise ConnectionError("inclinometer closed the stream")
+
+                        buf += chunk
+                        *lines, buf = buf.split(b'\n')
+                        for line in lines:
+                            try:
+                                self._publish(parse_line(line, with_count=self.path is not None))
+                            except ValueError as e:
+                                self.log("Dropping bad inclinometer frame: {}".format(e))
+
+            except Exception as e:
+                self.log("Inclinometer stream error, reconnecting: {}".format(e))
+
+            self.connected = False
+            time.sleep(RECONNECT_SLEEP)
+
+    def _first_after(self, after_ts):
+        # samples are in time order, so walk back from the newest one
+        found = None
+        for sample in reversed(self.samples):
+            if sample.ts <= after_ts:
+                break
+            found = sample
+
+        return found
+
+    def next_sample(self, after_ts=None, timeout=NEXT_SAMPLE_TIMEOUT):
+        """
+        Blocks until there is a sample newer than after_ts and returns the
+        oldest such sample, so passing the previous sample's ts never skips
+        frames. after_ts=None means newer than now.
+        """
+        if after_ts is None:
+            after_ts = time.time()
+
+        deadline = time.time() + timeout
+        with self.cond:
+            while True:
+                sample = self._first_after(after_ts)
+                if sample is not None:
+                    return sample
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError("no inclinometer sample after {:0.3f} within {}s".format(after_ts, timeout))
+                self.cond.wait(remaining)
+
+    def samples_between(self, start_ts, end_ts):
+        """
+        Samples with start_ts < ts <= end_ts that are still in the ring
+        """
+        with self.cond:
+            window = []
+            for sample in reversed(self.samples):
+                if sample.ts <= start_ts:
+                    break
+                if sample.ts <= end_ts:
+                    window.append(sample)
+
+        window.reverse()
+        return window
+
+    def latest(self):
+        with self.cond:
+            if len(self.samples) == 0:
+                return None
+            return self.samples[-1]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""JSON metrics over HTTP, served by a few listener threads on one socket.
+
+Nothing is bound until start_metrics_server() is called.
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+
+
+def make_handler(metrics):
+    # (ts, body) of the last response, reused for metrics.maxAge() seconds
+    # where metrics has it, e.g. while idle at night
+    cache = [None, None]
+    cache_lock = threading.Lock()
+
+    def body():
+        max_age = metrics.maxAge() if hasattr(metrics, "maxAge") else 0
+        with cache_lock:
+            now = time.time()
+            if cache[0] is None or now - cache[0] >= max_age:
+                cache[0] = now
+                cache[1] = json.dumps(metrics.getValue()).encode(encoding='utf_8')
+            return cache[1], max_age
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            response, max_age = body()
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            if max_age > 0:
+                self.send_header("Cache-Control", "max-age={}".format(int(max_age)))
+            self.end_headers()
+
+            self.wfile.write(response)
+
+        def log_message(self, *args):
+            pass
+
+    return MetricsHandler
+
+
+class MetricsListenerThread(threading.Thread):
+    def __init__(self, i, addr, handler, sock):
+        threading.Thread.__init__(self)
+        self.i = i
+        self.addr = addr
+        self.handler = handler
+        self.sock = sock
+        self.daemon = True
+        self.start()
+
+    def run(self):
+        httpd = HTTPServer(self.addr, self.handler, False)
+        httpd.socket = self.sock
+        httpd.server_bind = self.server_close = lambda self: None
+        httpd.serve_forever()
+
+
+def start_metrics_server(metrics, addr, num_threads):
+    """
+    Serves metrics.getValue() on addr, returns the listener threads
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(addr)
+    sock.listen(5)
+
+    handler = make_handler(metrics)
+    return [MetricsListenerThread(i, addr, handler, sock) for i in range(num_threads)]
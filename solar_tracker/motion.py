@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Closed-loop actuator moves.
+
+While the motor runs, every inclinometer frame goes through an alpha-beta
+filter that estimates position and velocity. The motor is cut as soon as the
+estimated position plus the expected coast-down reaches the target. The coast
+time is learned per direction from where the reflector actually settles, so it
+also absorbs the inclinometer's filter lag.
+"""
+import time
+
+ALPHA = 0.3
+BETA = 0.05
+
+COAST_S = 0.1  # initial guess, refined after every closed-loop move
+MAX_COAST_S = 1.0
+COAST_SMOOTHING = 0.2
+MIN_CUT_VELOCITY = 0.05  # deg/s, slower cuts say nothing about coast
+
+
+class AlphaBetaFilter(object):
+    def __init__(self, alpha=ALPHA, beta=BETA):
+        self.alpha = alpha
+        self.beta = beta
+        self.pos = None
+        self.vel = 0.0
+        self.ts = None
+
+    def update(self, ts, measured_pos):
+        if self.pos is None:
+            self.pos = measured_pos
+            self.ts = ts
+            return self.pos, self.vel
+
+        dt = ts - self.ts
+        if dt <= 0:
+            return self.pos, self.vel
+
+        predicted = self.pos + self.vel * dt
+        residual = measured_pos - predicted
+        self.pos = predicted + self.alpha * residual
+        self.vel = self.vel + (self.beta / dt) * residual
+        self.ts = ts
+
+        return self.pos, self.vel
+
+
+class CoastModel(object):
+    def __init__(self, coast_s=COAST_S, smoothing=COAST_SMOOTHING):
+        self.default_coast_s = coast_s
+        self.smoothing = smoothing
+        self.coast = {}  # direction -> seconds of travel at cut velocity
+
+    def coast_s(self, direction):
+        return self.coast.get(direction, self.default_coast_s)
+
+    def update(self, direction, cut_pos, cut_vel, settled_pos):
+        if abs(cut_vel) < MIN_CUT_VELOCITY:
+            return
+
+        observed = (settled_pos - cut_pos) / cut_vel
+        observed = min(max(observed, 0), MAX_COAST_S)
+        self.coast[direction] = (1 - self.smoothing) * self.coast_s(direction) + self.smoothing * observed
+
+
+def run_closed_loop(motor_on, motor_off, next_sample, target, dir_mult, coast_s, max_duration, clock=time):
+    """
+    Runs the motor until the filtered position predicts arrival at target,
+    or max_duration runs out. next_sample(after_ts) must return inclinometer
+    samples with ts and angle. Returns (on_time, cut_pos, cut_vel).
+    """
+    filt = AlphaBetaFilter()
+    sample = next_sample(None)
+    filt.update(sample.ts, sample.angle)
+
+    start = clock.time()
+    motor_on()
+    try:
+        while True:
+            sample = next_sample(sample.ts)
+            pos, vel = filt.update(sample.ts, sample.angle)
+
+            predicted_stop = pos + vel * coast_s
+            if (predicted_stop - target) * dir_mult >= 0:
+                break
+
+            if clock.time() - start > max_duration:
+                break
+    finally:
+        motor_off()
+
+    return clock.time() - start, pos, vel
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Whether a hill climb decision is worth its moves.
+
+Every decision runs the motor a few times and leaves the reflector a step
+off the optimum while it settles and measures. Right after a "stay" the
+reflector is about where the optimum is and another decision only costs.
+The optimum drifts away at the rate the reflector has been following it, so
+the offset, and the output a correction wins back, grows with the time t
+since the last decision:
+
+    cost = motor_wh + curvature * step^2 * busy_s * OFF_FRACTION
+    gain = curvature * (offset^2 * t + offset * rate * t^2), offset = rate * t
+
+motor_wh is MOTOR_W times the motor's on-time over a decision's moves, and
+busy_s how long a decision takes, both as recent decisions went. curvature
+is the output lost per degree squared off the optimum, fit to the last scan
+relative to its peak so it scales with the sun. The gain is counted until
+the next decision, assumed as far away again as the last one.
+
+After a decision that moved the reflector is catching up with the optimum
+and its own drift rate understates how fast the optimum goes, so only
+decisions after a "stay" are weighed.
+"""
+from solar_tracker.power_curve import fit_quadratic
+
+MOTOR_W = 24.0  # 12V actuator at about 2A, measure yours
+OFF_FRACTION = 0.5  # of a decision's busy time the reflector is a step off
+DEFER_S = 15  # before asking again when a decision isn't worth it
+FIT_SPAN_DEG = 4  # scan samples this close to the best one give the curvature
+EFFORT_SMOOTHING = 0.2  # weight of the newest decision's busy time and motor energy
+
+
+def relative_curvature(points, best_pos, span_deg=FIT_SPAN_DEG):
+    """
+    Output lost per degree squared off the peak, relative to the peak, from
+    the (pos, power) points around best_pos. None if they don't show a peak.
+    """
+    near = [(pos, power) for pos, power in points if abs(pos - best_pos) <= span_deg]
+    fit = fit_quadratic(near)
+    if fit is None or fit.peak is None:
+        return None
+
+    x = fit.peak - fit.center
+    peak_power = fit.a * x * x + fit.b * x + fit.c
+    if peak_power <= 0:
+        return None
+    return -fit.a / peak_power
+
+
+def motor_wh(on_s, motor_w=MOTOR_W):
+    return motor_w * on_s / 3600
+
+
+def decision_cost_wh(curvature_mw, step_deg, decision_motor_wh, busy_s):
+    """
+    Motor energy and output lost while probing, curvature_mw in mW/deg^2
+    """
+    lost_mwh = curvature_mw * step_deg ** 2 * busy_s * OFF_FRACTION / 3600
+    return decision_motor_wh + lost_mwh / 1000
+
+
+def expected_gain_wh(curvature_mw, rate_deg_per_s, since_s):
+    """
+    Output a correction after since_s of drift wins back until the next one
+    """
+    offset = rate_deg_per_s * since_s
+    gain_mws = curvature_mw * (offset ** 2 * since_s + offset * rate_deg_per_s * since_s ** 2)
+    return gain_mws / 3600 / 1000
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""Hill climbing and scanning over more than one actuator.
+
+Every evaluation of the power surface is a move, a wait for the wobble to
+stop and a few readings, so the search is pattern search (compass search
+with opportunistic polling): each probe moves one axis, one actuator run
+and one settle, where a Nelder-Mead vertex moves all of them. The poll
+starts with the axis and direction that paid off last and takes the first
+improvement, so on a slope most evaluations are a single step uphill. When
+no direction improves the steps shrink, down to a minimum.
+
+The 2-D scan visits a square spiral around a starting point (neighbouring
+points differ in one axis, one move each), nearest first, then refines from
+the best point with pattern search.
+
+A target is anything with pos() returning one angle per axis,
+move(axis, delta_deg, exact), measure() (power or None), set_mode(mode) and
+move_count(), the controller's AxesTarget wraps TrackerState.
+"""
+import collections
+import time
+
+from solar_tracker.step_size import GROW
+from solar_tracker.step_size import MAX_STEP_DEG
+from solar_tracker.step_size import MIN_STEP_DEG
+from solar_tracker.step_size import RUN_TO_GROW
+from solar_tracker.step_size import SHRINK
+
+MODE_SCAN_SPIRAL = "scan-spiral"
+MODE_SCAN_REFINE = "scan-refine"
+
+SPIRAL_STEP_DEG = 1.0
+SPIRAL_RINGS = 2  # 5x5 points
+REFINE_MIN_STEP_DEG = 0.2
+REFINE_MAX_EVALS = 20
+MIN_MOVE_DEG = 0.05  # exact moves land this close, closer is there already
+
+AXIS_REST_S = 900  # between passes over a secondary axis, see TrackingPoll
+MAX_AXIS_REST_S = 3600  # doubling after each pass that ended where it began
+
+SpiralResult = collections.namedtuple("SpiralResult", [
+    "started_at", "duration_s", "moves", "evaluations", "best_pos", "best_power", "samples"])
+
+
+class CompassPoll(object):
+    """
+    The order a compass search tries (axis, sign) in: the last improvement
+    first, after a miss the opposite direction on the same axis, then the
+    next axis
+    """
+    def __init__(self, num_axes):
+        self.directions = [(axis, sign) for axis in range(num_axes) for sign in (1, -1)]
+        self.i = 0
+        self.misses = 0  # in a row
+
+    def next(self):
+        return self.directions[self.i]
+
+    def hit(self):
+        self.misses = 0
+
+    def miss(self):
+        """
+        Returns True once every direction missed in a row, a full poll
+        """
+        self.misses += 1
+        self.i = (self.i + 1) % len(self.directions)
+        return self.misses >= len(self.directions)
+
+    def reset(self):
+        self.misses = 0
+
+
+class TrackingPoll(CompassPoll):
+    """
+    A CompassPoll for hill climbing an optimum that moves. The first axis
+    is polled as the 1-D algorithms climb, at the tracker's step. Every
+    other axis has a step of its own, which grows after RUN_TO_GROW hits in
+    a row and shrinks after a pass over the axis that ended where it began,
+    like step_size.py's, and rests after each pass: a tilt optimum drifts
+    a fraction of a degree an hour, polled as often as the first axis its
+    moves would be misses, or hits that only the first axis' drift during
+    the readings made. The rest doubles after a pass that ended where it
+    began, up to MAX_AXIS_REST_S, and is back to AXIS_REST_S after one that
+    moved RUN_TO_GROW steps or more.
+    """
+    def __init__(self, num_axes, step_deg):
+        CompassPoll.__init__(self, num_axes)
+        self.steps = [step_deg] * num_axes
+        self.rest_s = [AXIS_REST_S] * num_axes
+        self.resting_until = [0] * num_axes
+        self.hits = 0  # in a row, in the same direction
+        self.moved = 0  # steps, this pass over the axis
+
+    def next(self, now):
+        # the first axis never rests
+        while now < self.resting_until[self.directions[self.i][0]]:
+            self.i = (self.i + 1) % len(self.directions)
+        return self.directions[self.i]
+
+    def step(self, axis, step_deg):
+        """
+        The step along axis, step_deg (the tracker's) for the first one
+        """
+        return step_deg if axis == 0 else self.steps[axis]
+
+    def hit(self):
+        axis, sign = self.directions[self.i]
+        CompassPoll.hit(self)
+        self.hits += 1
+        self.moved += sign
+        if axis > 0 and self.hits >= RUN_TO_GROW:
+            self.steps[axis] = min(self.steps[axis] * GROW, MAX_STEP_DEG)
+
+    def miss(self, now):
+        """
+        Returns True when that ends the pass over the axis, an axis other
+        than the first rests then
+        """
+        axis, _ = self.directions[self.i]
+        CompassPoll.miss(self)
+        self.hits = 0
+        if self.directions[self.i][0] == axis:
+            return False
+
+        if axis > 0:
+            if self.moved == 0:
+                self.steps[axis] = max(self.steps[axis] * SHRINK, MIN_STEP_DEG)
+                self.rest_s[axis] = min(2 * self.rest_s[axis], MAX_AXIS_REST_S)
+            elif abs(self.moved) >= RUN_TO_GROW:
+                self.rest_s[axis] = AXIS_REST_S
+            self.resting_until[axis] = now + self.rest_s[axis]
+        self.moved = 0
+        return True
+
+
+def pattern_search(f, start, step_deg, min_step_deg, max_evals, f_start=None):
+    """
+    Maximizes f(point) from start by compass search: polls one axis at a
+    time, takes the first improvement and halves the step after a full poll
+    without one. f returns None for a point it couldn't measure, which
+    counts as a miss. Returns (best point, best value, evaluations).
+    """
+    best = tuple(start)
+    best_value = f(best) if f_start is None else f_start
+    evals = 0 if f_start is not None else 1
+    poll = CompassPoll(len(best))
+
+    while step_deg >= min_step_deg and evals < max_evals:
+        axis, sign = poll.next()
+        candidate = list(best)
+        candidate[axis] += sign * step_deg
+        candidate = tuple(candidate)
+
+        value = f(candidate)
+        evals += 1
+        if value is not None and (best_value is None or value > best_value):
+            best, best_value = candidate, value
+            poll.hit()
+        elif poll.miss():
+            step_deg /= 2
+            poll.reset()
+
+    return best, best_value, evals
+
+
+def spiral_offsets(rings):
+    """
+    (dx, dy) of a square spiral out of (0, 0), in units of the spacing,
+    every point a unit step from the one before
+    """
+    offsets = [(0, 0)]
+    x = y = 0
+    for ring in range(1, rings + 1):
+        # step out to the right, then up, left, down and right along the ring
+        x += 1
+        offsets.append((x, y))
+        for dx, dy, n in [(0, 1, 2 * ring - 1), (-1, 0, 2 * ring), (0, -1, 2 * ring), (1, 0, 2 * ring)]:
+            for _ in range(n):
+                x += dx
+                y += dy
+                offsets.append((x, y))
+    return offsets
+
+
+def run_spiral_scan(target, step_deg=SPIRAL_STEP_DEG, rings=SPIRAL_RINGS, axes=(0, 1), bounds=None,
+                    min_step_deg=REFINE_MIN_STEP_DEG, max_evals=REFINE_MAX_EVALS, clock=time):
+    """
+    Spirals around target's position in the plane of two axes, then
+    refines from the best point with pattern search and ends there. bounds
+    has a (lowest, highest) angle or None per axis, points outside aren't
+    visited.
+    """
+    started_at = clock.time()
+    moves_before = target.move_count()
+    samples = []  # (pos, power)
+
+    def go_to(point):
+        for axis, (now, there) in enumerate(zip(target.pos(), point)):
+            if abs(there - now) >= MIN_MOVE_DEG:
+                target.move(axis, there - now, True)
+
+    def inside(point):
+        return all(b is None or b[0] <= p <= b[1] for p, b in zip(point, bounds or []))
+
+    def f(point):
+        if not inside(point):
+            return None
+        go_to(point)
+        power = target.measure()
+        if power is not None:
+            samples.append((tuple(target.pos()), power))
+        return power
+
+    center = tuple(target.pos())
+    target.set_mode(MODE_SCAN_SPIRAL)
+    for dx, dy in spiral_offsets(rings):
+        point = list(center)
+        point[axes[0]] += dx * step_deg
+        point[axes[1]] += dy * step_deg
+        f(tuple(point))
+
+    if len(samples) == 0:
+        return SpiralResult(started_at, clock.time() - started_at, target.move_count() - moves_before,
+                            0, None, None, samples)
+    spiral_evals = len(samples)
+    start, start_power = max(samples, key=lambda s: s[1])
+
+    target.set_mode(MODE_SCAN_REFINE)
+    go_to(start)
+    best, best_power, evals = pattern_search(f, start, step_deg / 2, min_step_deg, max_evals, f_start=start_power)
+    go_to(best)
+
+    return SpiralResult(
+        started_at=started_at,
+        duration_s=clock.time() - started_at,
+        moves=target.move_count() - moves_before,
+        evaluations=spiral_evals + evals,
+        best_pos=best,
+        best_power=best_power,
+        samples=samples,
+    )
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Local quadratic model of power vs reflector position.
+
+Used by model_climb() in do.py: fit the recent (position, power) samples
+around the current position and move straight to the predicted peak when the
+fit is confident, instead of probing both directions.
+"""
+import collections
+import warnings
+
+import numpy as np
+
+# numpy 1.25 moved it, the old name is gone in 2.0
+RankWarning = getattr(np, "exceptions", np).RankWarning
+
+MIN_POINTS = 5  # polyfit needs deg + 3 points to estimate the covariance
+
+QuadraticFit = collections.namedtuple("QuadraticFit", [
+    "a", "b", "c", "center", "peak", "peak_std", "residual_std", "n"])
+
+
+def fit_quadratic(points):
+    """
+    Least squares fit of power = a*x^2 + b*x + c over (pos, power) points,
+    with x = pos - center. Returns None with too few points, no spread in
+    position or a fit too badly conditioned to trust (positions bunched up
+    but for one). peak is None unless the curve is concave.
+    """
+    if len(points) < MIN_POINTS:
+        return None
+
+    pos = np.array([p[0] for p in points], dtype=float)
+    power = np.array([p[1] for p in points], dtype=float)
+    if np.ptp(pos) == 0:
+        return None
+
+    # fitted on x scaled to about -1..1, then the coefficients scaled back
+    center = float(np.mean(pos))
+    scale = float(np.ptp(pos)) / 2
+    x = pos - center
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", RankWarning)
+            coeffs, cov = np.polyfit(x / scale, power, 2, cov=True)
+    except (ValueError, np.linalg.LinAlgError, RankWarning):
+        return None
+
+    to_x = np.array([1 / scale ** 2, 1 / scale, 1])
+    coeffs = coeffs * to_x
+    cov = cov * np.outer(to_x, to_x)
+    a, b, c = [float(v) for v in coeffs]
+    residual_std = float(np.std(power - np.polyval(coeffs, x)))
+
+    peak = None
+    peak_std = None
+    if a < 0:
+        peak = center - b / (2 * a)
+        # delta method: gradient of -b/2a with respect to (a, b, c)
+        grad = np.array([b / (2 * a * a), -1 / (2 * a), 0])
+        peak_std = float(np.sqrt(max(grad @ cov @ grad, 0)))
+
+    return QuadraticFit(a, b, c, center, peak, peak_std, residual_std, len(points))
+
+
+def slope_at(fit, pos):
+    x = pos - fit.center
+    return 2 * fit.a * x + fit.b
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""INA219 power sampler shared by the controller, measure.py and testing/test-ina219.py.
+
+The chip is configured once, in continuous shunt and bus conversion with
+on-chip averaging, and read every time a conversion completes. Readings go
+into a numpy ring buffer of (ts, voltage, current, power) that can be queried
+for windows aligned to the end of a move.
+
+The ina219 driver is only imported when the sampler is created, so this
+module can be imported without the hardware.
+"""
+import threading
+import time
+
+import numpy as np
+
+# Set the constants that were calculated
+SHUNT_MV = 75
+MAX_EXPECTED_AMPS = 100
+SHUNT_OHMS = (SHUNT_MV / 1000) / MAX_EXPECTED_AMPS  # R = V / i
+
+INA_ADDRESS = 0x40
+
+# 32 sample on-chip averaging, 17.02ms per conversion (INA219 datasheet table 5),
+# and in continuous mode the chip converts shunt then bus
+ADC_SAMPLES = "ADC_32SAMP"  # INA219 attribute, looked up once the driver is imported
+CONVERSION_S = 2 * 0.01702
+
+RING_SIZE = 32768  # ~18 minutes at ~29 readings per second
+RETRY_SLEEP = 0.2
+MAX_ENERGY_GAP_S = 5  # longer gaps between readings are not integrated
+IDLE_READ_S = 2  # between readings at night
+
+FIELDS = ["ts", "voltage", "current", "power"]
+
+
+class PowerSampler(threading.Thread):
+    def __init__(self, address=INA_ADDRESS, ring_size=RING_SIZE, log=print):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.address = address
+        self.log = log
+        self.ina = None
+
+        # ts is when the averaged conversion started, so a reading with
+        # ts > t only saw light after t
+        self.ring_size = ring_size
+        self.ring = {f: np.zeros(ring_size) for f in FIELDS}
+        self.seq = 0  # readings so far, the next one goes to seq % ring_size
+        self.cond = threading.Condition()
+
+        self.energy_mwh = 0.0  # integral of power over all readings
+        self.idle = False
+
+        self.start()
+
+    def _configure(self):
+        from ina219 import INA219
+
+        ina = INA219(SHUNT_OHMS, MAX_EXPECTED_AMPS, address=self.address)
+        # Configure the object with the expected bus voltage
+        # (either up to 16V or up to 32V with .RANGE_32V)
+        adc = getattr(INA219, ADC_SAMPLES)
+        ina.configure(voltage_range=ina.RANGE_32V, bus_adc=adc, shunt_adc=adc)
+        return ina
+
+    def _wait_for_conversion(self):
+        while not self.ina.is_conversion_ready():
+            time.sleep(CONVERSION_S / 8)
+
+    def _append(self, ts, voltage, current, power):
+        with self.cond:
+            if self.seq > 0:
+                prev = (self.seq - 1) % self.ring_size
+                dt = ts - self.ring["ts"][prev]
+                if 0 < dt < MAX_ENERGY_GAP_S:
+                    self.energy_mwh += (power + self.ring["power"][prev]) / 2 * dt / 3600
+
+            i = self.seq % self.ring_size
+            self.ring["ts"][i] = ts
+            self.ring["voltage"][i] = voltage
+            self.ring["current"][i] = current
+            self.ring["power"][i] = power
+            self.seq += 1
+            self.cond.notify_all()
+
+    def run(self):
+        while True:
+            try:
+                if self.ina is None:
+                    self.ina = self._configure()
+
+                self._wait_for_conversion()
+                ts = time.time() - CONVERSION_S
+
+                # reading power also clears the conversion ready flag
+                voltage = self.ina.voltage()  # V
+                current = self.ina.current()  # mA
+                power = self.ina.power()  # mW
+
+                self._append(ts, voltage, current, power)
+
+                if self.idle:
+                    time.sleep(IDLE_READ_S)
+
+            except Exception as e:
+                self.log("Exception when reading from INA, {}".format(e))
+                self.ina = None  # start over with a fresh configuration
+                time.sleep(RETRY_SLEEP)
+
+    def _get(self, i):
+        return {f: float(self.ring[f][i]) for f in FIELDS}
+
+    def latest(self):
+        with self.cond:
+            if self.seq == 0:
+                return None
+            sample = self._get((self.seq - 1) % self.ring_size)
+            sample["seq"] = self.seq
+            return sample
+
+    def wait_for_fresh_sample(self, newer_than, timeout=None):
+        """
+        Blocks until there is a reading taken after newer_than and returns
+        the latest one, None if timeout runs out first.
+        """
+        with self.cond:
+            is_fresh = lambda: self.seq > 0 and self.ring["ts"][(self.seq - 1) % self.ring_size] > newer_than
+            if not self.cond.wait_for(is_fresh, timeout):
+                return None
+            return self.latest()
+
+    def energy_wh(self):
+        return self.energy_mwh / 1000
+
+    def set_idle(self, idle):
+        """
+        At night one reading every IDLE_READ_S is plenty
+        """
+        self.idle = idle
+
+    def window(self, start_ts, end_ts):
+        """
+        Readings with start_ts < ts <= end_ts as arrays, oldest first
+        """
+        with self.cond:
+            n = min(self.seq, self.ring_size)
+            order = np.arange(self.seq - n, self.seq) % self.ring_size
+            ts = self.ring["ts"][order]
+            lo = np.searchsorted(ts, start_ts, side="right")
+            hi = np.searchsorted(ts, end_ts, side="right")
+            return {f: self.ring[f][order[lo:hi]] for f in FIELDS}
+
+    def wait_for_window(self, start_ts, duration, timeout=None):
+        """
+        Blocks until the window of duration after start_ts (e.g. the end of a
+        move) is complete and returns it
+        """
+        end_ts = start_ts + duration
+        if self.wait_for_fresh_sample(end_ts, timeout) is None:
+            return None
+        return self.window(start_ts, end_ts)
+
+    def window_mean(self, start_ts, end_ts, field="power"):
+        values = self.window(start_ts, end_ts)[field]
+        if len(values) == 0:
+            return None
+        return float(np.mean(values))
+
+    def window_median(self, start_ts, end_ts, field="power"):
+        values = self.window(start_ts, end_ts)[field]
+        if len(values) == 0:
+            return None
+        return float(np.median(values))
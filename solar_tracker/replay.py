@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Replays recorded measurement sessions through the simulator.
+
+measure.py sweeps the reflector and logs angle and power as it goes, to
+measurements.txt (tab separated, "None" for missing readings) or, after the
+conversion in analysis/README.md, measurements-*.csv with a header:
+
+    ts, delay, gen, ext, count, angle, watts, watts_ts
+
+(watts is really milliwatts). Every sweep, one gen, is a power vs angle
+curve at one time of day. ReplayWorld answers "what would the panel have
+made at angle pos at time ts" by interpolating the curve of the sweeps on
+either side of ts, so clouds and the real shape of the curve come from the
+recording. The actuator's speed and dead time per direction come from the
+drag model fitted to drag.tab.
+"""
+import bisect
+import collections
+import time
+
+import numpy as np
+
+from solar_tracker.drag_model import DragModel
+from solar_tracker.sim import ArmModel
+from solar_tracker.sim import SimWorld
+
+MIN_SWEEP_SPAN_DEG = 1.0  # sweeps covering less say nothing about the curve
+MIN_SWEEP_ROWS = 10
+DEFAULT_SPEED = 0.951497  # deg per second, without a drag fit
+
+Sweep = collections.namedtuple("Sweep", ["ts", "angles", "powers"])
+
+
+def parse_measurements(path):
+    """
+    (ts, gen, angle, milliwatts) rows of a measurements file, rows without
+    a power reading are skipped
+    """
+    rows = []
+    with open(path) as f:
+        for line in f:
+            parts = line.strip().replace(",", "\t").split("\t")
+            if len(parts) < 7:
+                continue
+            try:
+                ts, gen, angle, milliwatts = float(parts[0]), parts[2], float(parts[5]), float(parts[6])
+            except ValueError:
+                continue  # header or None
+            rows.append((ts, gen, angle, milliwatts))
+    return rows
+
+
+def sweeps_from_rows(rows):
+    by_gen = collections.defaultdict(list)
+    for ts, gen, angle, milliwatts in rows:
+        by_gen[gen].append((ts, angle, milliwatts))
+
+    sweeps = []
+    for gen_rows in by_gen.values():
+        angles = np.array([r[1] for r in gen_rows])
+        if len(gen_rows) < MIN_SWEEP_ROWS or np.ptp(angles) < MIN_SWEEP_SPAN_DEG:
+            continue
+        order = np.argsort(angles)
+        powers = np.array([r[2] for r in gen_rows])
+        sweeps.append(Sweep(float(np.mean([r[0] for r in gen_rows])), angles[order], powers[order]))
+
+    sweeps.sort(key=lambda s: s.ts)
+    return sweeps
+
+
+def load_sessions(paths):
+    """
+    Sweeps from all files, one list per UTC day: {day: [Sweep]}
+    """
+    rows = []
+    for path in paths:
+        rows.extend(parse_measurements(path))
+
+    sessions = collections.defaultdict(list)
+    for sweep in sweeps_from_rows(rows):
+        sessions[time.strftime("%Y-%m-%d", time.gmtime(sweep.ts))].append(sweep)
+    return {day: sweeps for day, sweeps in sessions.items() if len(sweeps) > 0}
+
+
+def arm_from_drag(drag_path, pos):
+    """
+    ArmModel with the speed and dead time per direction fitted to drag.tab
+    """
+    drag = DragModel(DEFAULT_SPEED)
+    drag.load(drag_path)
+
+    speeds = {}
+    spin_up = []
+    for direction in ["ext", "ret"]:
+        fit = drag.direction_fits[direction].fit() if direction in drag.direction_fits else None
+        if fit is None:
+            speeds[direction] = DEFAULT_SPEED
+            continue
+        slope, offset = fit
+        speeds[direction] = slope
+        if offset < 0:
+            spin_up.append(-offset / slope)  # seconds before it starts moving
+
+    return ArmModel(pos=pos, ext_speed=speeds["ext"], ret_speed=speeds["ret"],
+                    spin_up_s=max(spin_up) if len(spin_up) > 0 else 0.0)
+
+
+class ReplayWorld(SimWorld):
+    def __init__(self, clock, sweeps, arm, lat=0, lon=0, inclino_noise_deg=0.002, seed=None):
+        SimWorld.__init__(self, clock, lat=lat, lon=lon, arm=arm, power_noise=0,
+                          inclino_noise_deg=inclino_noise_deg, seed=seed)
+        self.sweeps = sweeps
+        self.sweep_ts = [s.ts for s in sweeps]
+
+    def _curve_at(self, ts, pos):
+        i = bisect.bisect_right(self.sweep_ts, ts)
+        if i == 0:
+            s = self.sweeps[0]
+            return float(np.interp(pos, s.angles, s.powers))
+        if i == len(self.sweeps):
+            s = self.sweeps[-1]
+            return float(np.interp(pos, s.angles, s.powers))
+
+        before, after = self.sweeps[i - 1], self.sweeps[i]
+        w = (ts - before.ts) / (after.ts - before.ts)
+        return ((1 - w) * float(np.interp(pos, before.angles, before.powers))
+                + w * float(np.interp(pos, after.angles, after.powers)))
+
+    def true_power(self, ts, pos=None):
+        if pos is None:
+            pos = self.arm.state_at(ts)[0]
+        return self._curve_at(ts, pos)
+
+    def optimum_at(self, ts):
+        i = min(max(bisect.bisect_right(self.sweep_ts, ts) - 1, 0), len(self.sweeps) - 1)
+        s = self.sweeps[i]
+        return float(s.angles[np.argmax(s.powers)])
+
+    def positions(self):
+        """
+        Every position any sweep covered, for finding the best fixed one
+        """
+        lo = max(min(s.angles[0] for s in self.sweeps), self.arm.min_deg)
+        hi = min(max(s.angles[-1] for s in self.sweeps), self.arm.max_deg)
+        return np.arange(lo, hi, 0.25)
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""Scan engine with pluggable strategies.
+
+A strategy drives the reflector through a ScanRun, which moves the target,
+records every (position, power) measurement and lets the engine report how
+long the scan took, how many moves it cost and what it found. The target is
+anything with pos(), move(delta_deg, exact), measure(), set_mode(mode) and
+move_count(), the controller's ScanTarget wraps TrackerState. Continuous
+strategies also need sweep(delta_deg), which runs the motor through
+delta_deg without stopping and returns the inclinometer and power streams
+recorded on the way.
+"""
+import collections
+import copy
+import math
+import time
+
+import numpy as np
+
+from solar_tracker.power_curve import fit_quadratic
+
+MODE_SCAN_RESET = "scan-reset"
+MODE_SCAN_EXT = "scan-ext"
+MODE_SCAN_RET = "scan-ret"
+
+GOLDEN = (math.sqrt(5) - 1) / 2
+
+DENSE_BIN_DEG = 0.1  # sweep readings are binned by angle before the peak is looked for
+DENSE_PEAK_SPAN_DEG = 2  # bins this close to the best one are fit for the peak
+
+ScanResult = collections.namedtuple("ScanResult", [
+    "strategy", "started_at", "duration_s", "moves", "best_pos", "best_power", "final_pos", "samples", "sample_ts"])
+
+
+class ScanRun(object):
+    def __init__(self, target, clock=time):
+        self.target = target
+        self.clock = clock
+        self.samples = []  # (pos, power) in the order they were measured
+        self.sample_ts = []  # when each of them was measured
+        self.peak = None  # (pos, power) if the strategy estimated one, else the best sample
+
+    def pos(self):
+        return self.target.pos()
+
+    def set_mode(self, mode):
+        self.target.set_mode(mode)
+
+    def move(self, delta_deg, exact):
+        if delta_deg != 0:
+            self.target.move(delta_deg, exact)
+
+    def move_to(self, pos, exact=True):
+        delta_deg = pos - self.pos()
+        self.set_mode(MODE_SCAN_EXT if delta_deg > 0 else MODE_SCAN_RET)
+        self.move(delta_deg, exact)
+
+    def measure(self):
+        power = self.target.measure()
+        if power is not None:
+            self.samples.append((self.pos(), power))
+            self.sample_ts.append(self.clock.time())
+        return power
+
+    def sweep(self, delta_deg, power_offset_s=0):
+        """
+        Moves delta_deg without stopping and returns (ts, pos, power) for
+        every power reading taken on the way
+        """
+        angle_ts, angles, power_ts, powers = self.target.sweep(delta_deg)
+        points = align(angle_ts, angles, power_ts, powers, power_offset_s)
+        for ts, pos, power in points:
+            self.samples.append((pos, power))
+            self.sample_ts.append(ts)
+        return points
+
+    def best(self, lo=None, hi=None):
+        candidates = [s for s in self.samples
+                      if (lo is None or s[0] >= lo) and (hi is None or s[0] <= hi)]
+        if len(candidates) == 0:
+            return None, None
+        return max(candidates, key=lambda s: s[1])
+
+
+def rewind(run, start_deg, rewind_deg):
+    run.set_mode(MODE_SCAN_RESET)
+    if run.pos() < start_deg - rewind_deg:
+        # a narrowed range starts well above us, just get close below it
+        run.move(start_deg - rewind_deg / 2 - run.pos(), exact=False)
+        return
+
+    run.move(-rewind_deg, exact=False)
+    while run.pos() > start_deg:
+        run.move(-rewind_deg, exact=False)
+
+
+class SweepStrategy(object):
+    """
+    Rewind, step through the whole range measuring at every step, then walk
+    back to the best step.
+    """
+    name = "sweep"
+
+    def __init__(self, start_deg, end_deg, rewind_deg, step_deg):
+        self.start_deg = start_deg
+        self.end_deg = end_deg
+        self.rewind_deg = rewind_deg
+        self.step_deg = step_deg
+
+    def run(self, run):
+        rewind(run, self.start_deg, self.rewind_deg)
+
+        run.set_mode(MODE_SCAN_EXT)
+        while run.pos() < self.end_deg:
+            run.move(self.step_deg, exact=False)
+            run.measure()
+
+        hill_pos, _ = run.best()
+        if hill_pos is None:
+            return None
+
+        # localize, take steps back until within a step of the hill
+        run.set_mode(MODE_SCAN_RET)
+        while True:
+            hill_on_the_left = (hill_pos < self.start_deg and run.pos() < self.start_deg)
+            if run.pos() <= (hill_pos + self.step_deg) or hill_on_the_left:
+                return run.pos()
+            run.move(-self.step_deg, exact=False)
+
+
+def golden_section(f, lo, hi, tolerance):
+    x1 = hi - GOLDEN * (hi - lo)
+    x2 = lo + GOLDEN * (hi - lo)
+    f1 = f(x1)
+    f2 = f(x2)
+    while hi - lo > tolerance:
+        if f1 >= f2:
+            hi = x2
+            x2, f2 = x1, f1
+            x1 = hi - GOLDEN * (hi - lo)
+            f1 = f(x1)
+        else:
+            lo = x1
+            x1, f1 = x2, f2
+            x2 = lo + GOLDEN * (hi - lo)
+            f2 = f(x2)
+
+
+def ternary(f, lo, hi, tolerance):
+    while hi - lo > tolerance:
+        m1 = lo + (hi - lo) / 3
+        m2 = hi - (hi - lo) / 3
+        if f(m1) >= f(m2):
+            hi = m2
+        else:
+            lo = m1
+
+
+REFINEMENTS = {
+    "golden": golden_section,
+    "ternary": ternary,
+}
+
+
+class CoarseToFineStrategy(object):
+    """
+    Rewind, sweep the range in big inexact steps, then refine the bracket
+    around the best coarse step with exact moves and go to the best position
+    measured inside it.
+    """
+    def __init__(self, start_deg, end_deg, rewind_deg, coarse_step_deg, tolerance_deg, refine="golden"):
+        self.start_deg = start_deg
+        self.end_deg = end_deg
+        self.rewind_deg = rewind_deg
+        self.coarse_step_deg = coarse_step_deg
+        self.tolerance_deg = tolerance_deg
+        self.refine = REFINEMENTS[refine]
+        self.name = "coarse-to-fine-{}".format(refine)
+
+    def run(self, run):
+        rewind(run, self.start_deg, self.rewind_deg)
+
+        run.set_mode(MODE_SCAN_EXT)
+        run.measure()
+        while run.pos() < self.end_deg:
+            run.move(self.coarse_step_deg, exact=False)
+            run.measure()
+
+        coarse = sorted(run.samples)
+        if len(coarse) == 0:
+            return None
+
+        best_i = max(range(len(coarse)), key=lambda i: coarse[i][1])
+        lo = coarse[max(best_i - 1, 0)][0]
+        hi = coarse[min(best_i + 1, len(coarse) - 1)][0]
+
+        def f(pos):
+            run.move_to(pos)
+            power = run.measure()
+            return power if power is not None else -math.inf
+
+        self.refine(f, lo, hi, self.tolerance_deg)
+
+        best_pos, _ = run.best(lo, hi)
+        run.move_to(best_pos)
+        return run.pos()
+
+
+def align(angle_ts, angles, power_ts, powers, offset_s=0):
+    """
+    The reflector angle at each power reading, interpolated from the
+    inclinometer stream at the reading's ts + offset_s. Readings outside of
+    the stream are dropped.
+    """
+    angle_ts = np.asarray(angle_ts)
+    power_ts = np.asarray(power_ts)
+    if len(angle_ts) < 2 or len(power_ts) == 0:
+        return []
+
+    at = power_ts + offset_s
+    inside = (at >= angle_ts[0]) & (at <= angle_ts[-1])
+    pos = np.interp(at[inside], angle_ts, np.asarray(angles))
+    return list(zip(power_ts[inside].tolist(), pos.tolist(), np.asarray(powers)[inside].tolist()))
+
+
+def dense_peak(points, bin_deg=DENSE_BIN_DEG, span_deg=DENSE_PEAK_SPAN_DEG):
+    """
+    (pos, power) of the peak of a dense (ts, pos, power) sweep: the median
+    of every angle bin, then a quadratic through the bins around the best
+    one. None without points.
+    """
+    if len(points) == 0:
+        return None
+
+    bins = collections.defaultdict(list)
+    for ts, pos, power in points:
+        bins[math.floor(pos / bin_deg)].append(power)
+    binned = sorted(((b + 0.5) * bin_deg, float(np.median(p))) for b, p in bins.items())
+
+    best_pos, best_power = max(binned, key=lambda b: b[1])
+    near = [b for b in binned if abs(b[0] - best_pos) <= span_deg]
+    fit = fit_quadratic(near)
+    if fit is not None and fit.peak is not None and near[0][0] <= fit.peak <= near[-1][0]:
+        x = fit.peak - fit.center
+        return fit.peak, fit.a * x * x + fit.b * x + fit.c
+    return best_pos, best_power
+
+
+class ContinuousStrategy(object):
+    """
+    Go back to the start and sweep the whole range without stopping while
+    recording angle and power, then sweep back past the peak the same way. The sensor lag
+    shifts the apparent peak forward in both directions, so the midpoint of
+    the two peaks is where the hill really is. Ends with an exact move there.
+    """
+    name = "continuous"
+
+    def __init__(self, start_deg, end_deg, rewind_deg, return_margin_deg=2, power_offset_s=0):
+        self.start_deg = start_deg
+        self.end_deg = end_deg
+        self.rewind_deg = rewind_deg
+        self.return_margin_deg = return_margin_deg
+        self.power_offset_s = power_offset_s  # e.g. half the power sensor's averaging time
+
+    def run(self, run):
+        if run.pos() > self.start_deg:
+            # one continuous move back instead of rewind steps that each settle
+            run.set_mode(MODE_SCAN_RESET)
+            run.sweep(self.start_deg - run.pos(), self.power_offset_s)
+        else:
+            rewind(run, self.start_deg, self.rewind_deg)
+
+        run.set_mode(MODE_SCAN_EXT)
+        up = dense_peak(run.sweep(self.end_deg - run.pos(), self.power_offset_s))
+        if up is None:
+            return None
+
+        run.set_mode(MODE_SCAN_RET)
+        back_to = max(up[0] - self.return_margin_deg, self.start_deg)
+        down = dense_peak(run.sweep(back_to - run.pos(), self.power_offset_s))
+
+        if down is None or abs(up[0] - down[0]) > 2 * self.return_margin_deg:
+            run.peak = up  # the way back missed the hill, e.g. a cloud
+        else:
+            run.peak = ((up[0] + down[0]) / 2, max(up[1], down[1]))
+
+        run.move_to(run.peak[0])
+        run.measure()
+        return run.pos()
+
+
+def with_range(strategy, start_deg, end_deg):
+    """
+    A copy of strategy that scans start_deg..end_deg instead
+    """
+    narrowed = copy.copy(strategy)
+    narrowed.start_deg = start_deg
+    narrowed.end_deg = end_deg
+    return narrowed
+
+
+def run_scan(strategy, target, clock=time):
+    started_at = clock.time()
+    moves_before = target.move_count()
+
+    run = ScanRun(target, clock)
+    final_pos = strategy.run(run)
+    best_pos, best_power = run.peak if run.peak is not None else run.best()
+
+    return ScanResult(
+        strategy=strategy.name,
+        started_at=started_at,
+        duration_s=clock.time() - started_at,
+        moves=target.move_count() - moves_before,
+        best_pos=best_pos,
+        best_power=best_power,
+        final_pos=final_pos,
+        samples=run.samples,
+        sample_ts=run.sample_ts,
+    )
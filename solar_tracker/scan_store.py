@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""On-disk history of scan results, keyed by day and time of day.
+
+Every scan is kept in an sqlite database with its whole curve as
+(ts, pos, power) rows, so after a restart the tracker can start where the
+optimum usually is at this time of day, and scans only need to cover the
+band the optimum has been in on the previous days.
+
+Time of day is UTC minutes, so it does not jump with daylight saving time.
+"""
+import sqlite3
+import statistics
+import time
+
+MINUTES_PER_DAY = 24 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    minute_of_day INTEGER NOT NULL,
+    strategy TEXT,
+    duration_s REAL,
+    moves INTEGER,
+    best_pos REAL,
+    best_power REAL,
+    final_pos REAL,
+    start_deg REAL,
+    end_deg REAL
+);
+CREATE INDEX IF NOT EXISTS scans_by_day ON scans (day, minute_of_day);
+CREATE INDEX IF NOT EXISTS scans_by_minute ON scans (minute_of_day);
+CREATE TABLE IF NOT EXISTS scan_samples (
+    scan_id INTEGER NOT NULL REFERENCES scans (id),
+    ts REAL NOT NULL,
+    pos REAL NOT NULL,
+    power REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scan_samples_by_scan ON scan_samples (scan_id);
+"""
+
+
+def day_and_minute(ts):
+    t = time.gmtime(ts)
+    return time.strftime("%Y-%m-%d", t), t.tm_hour * 60 + t.tm_min
+
+
+def minute_ranges(minute_of_day, window_min):
+    """
+    [lo, hi] minute ranges within window_min of minute_of_day, split in two
+    when the window wraps around midnight
+    """
+    lo = minute_of_day - window_min
+    hi = minute_of_day + window_min
+    if lo < 0:
+        return [(0, hi), (lo + MINUTES_PER_DAY, MINUTES_PER_DAY - 1)]
+    if hi >= MINUTES_PER_DAY:
+        return [(lo, MINUTES_PER_DAY - 1), (0, hi - MINUTES_PER_DAY)]
+    return [(lo, hi)]
+
+
+class ScanStore(object):
+    def __init__(self, path):
+        self.path = path
+        # opened by Controller.start(), used by the tracker's own thread
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.db:
+            self.db.executescript(SCHEMA)
+
+    def add(self, result, start_deg=None, end_deg=None):
+        """
+        Stores a scan.ScanResult with its curve, returns the scan id
+        """
+        day, minute_of_day = day_and_minute(result.started_at)
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO scans (ts, day, minute_of_day, strategy, duration_s, moves,"
+                " best_pos, best_power, final_pos, start_deg, end_deg)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (result.started_at, day, minute_of_day, result.strategy, result.duration_s, result.moves,
+                 result.best_pos, result.best_power, result.final_pos, start_deg, end_deg))
+            scan_id = cursor.lastrowid
+            self.db.executemany(
+                "INSERT INTO scan_samples (scan_id, ts, pos, power) VALUES (?, ?, ?, ?)",
+                [(scan_id, ts, pos, power) for (pos, power), ts in zip(result.samples, result.sample_ts)])
+        return scan_id
+
+    def optima_near(self, ts, window_min, days):
+        """
+        (day, best_pos) of the scans from the previous days that were taken
+        within window_min of the time of day of ts
+        """
+        _, minute_of_day = day_and_minute(ts)
+        since_day, _ = day_and_minute(ts - days * 86400)
+        today, _ = day_and_minute(ts)
+
+        ranges = minute_ranges(minute_of_day, window_min)
+        where = " OR ".join(["minute_of_day BETWEEN ? AND ?"] * len(ranges))
+        params = [since_day, today] + [m for r in ranges for m in r]
+
+        return self.db.execute(
+            "SELECT day, best_pos FROM scans"
+            " WHERE day >= ? AND day < ? AND best_pos IS NOT NULL AND (" + where + ")",
+            params).fetchall()
+
+    def typical_optimum(self, ts, window_min, days, min_days):
+        """
+        Returns (median, lowest, highest) best position at this time of day,
+        None with history from fewer than min_days days
+        """
+        optima = self.optima_near(ts, window_min, days)
+        if len(set(day for day, pos in optima)) < min_days:
+            return None
+
+        positions = [pos for day, pos in optima]
+        return statistics.median(positions), min(positions), max(positions)
+
+    def curve(self, scan_id):
+        """
+        The (ts, pos, power) rows of a scan, in the order they were measured
+        """
+        return self.db.execute(
+            "SELECT ts, pos, power FROM scan_samples WHERE scan_id = ? ORDER BY ts",
+            (scan_id,)).fetchall()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""How long the reflector wobbles after a move, learned per kind of move.
+
+Settle time depends strongly on where the reflector is and how long the
+motor ran (see analysis/plot5_heatmap.py). Every move appends
+"ts, direction, angle, pulse_s, settle_s" to ~/settle.tab and the table keeps
+a moving average per (direction, angle bin, pulse bin) cell, so the
+controller can sleep through most of the wobble before it starts reading
+the inclinometer.
+"""
+import os
+
+ANGLE_BIN_DEG = 2
+PULSE_BIN_S = 0.25
+MIN_SAMPLES = 3  # per cell, before that the direction's pulse bin is used
+SMOOTHING = 0.2  # weight of the newest settle time
+
+
+class SettleCell(object):
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+
+    def add(self, settle_s):
+        self.n += 1
+        if self.n == 1:
+            self.mean = settle_s
+        else:
+            self.mean += SMOOTHING * (settle_s - self.mean)
+
+
+class SettleTable(object):
+    def __init__(self, path, angle_bin_deg=ANGLE_BIN_DEG, pulse_bin_s=PULSE_BIN_S):
+        self.path = path
+        self.angle_bin_deg = angle_bin_deg
+        self.pulse_bin_s = pulse_bin_s
+        self.cells = {}  # (direction, angle bin, pulse bin) -> SettleCell
+        self.pulse_cells = {}  # (direction, pulse bin) -> SettleCell, any angle
+
+    def _keys(self, direction, angle, pulse_s):
+        pulse_bin = int(pulse_s // self.pulse_bin_s)
+        return (direction, int(angle // self.angle_bin_deg), pulse_bin), (direction, pulse_bin)
+
+    def _add(self, direction, angle, pulse_s, settle_s):
+        key, pulse_key = self._keys(direction, angle, pulse_s)
+        self.cells.setdefault(key, SettleCell()).add(settle_s)
+        self.pulse_cells.setdefault(pulse_key, SettleCell()).add(settle_s)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return 0
+
+        count = 0
+        with open(self.path) as f:
+            for line in f:
+                parts = line.split()
+                try:
+                    direction = parts[1]
+                    angle, pulse_s, settle_s = [float(p) for p in parts[2:5]]
+                except (IndexError, ValueError):
+                    continue
+                self._add(direction, angle, pulse_s, settle_s)
+                count += 1
+
+        return count
+
+    def add(self, ts, direction, angle, pulse_s, settle_s):
+        self._add(direction, angle, pulse_s, settle_s)
+        with open(self.path, "a") as fout:
+            fout.write("{}\t{}\t{}\t{}\t{}\n".format(ts, direction, angle, pulse_s, settle_s))
+
+    def predict(self, direction, angle, pulse_s):
+        """
+        Expected settle time in seconds, None without enough data
+        """
+        key, pulse_key = self._keys(direction, angle, pulse_s)
+        for cell in [self.cells.get(key), self.pulse_cells.get(pulse_key)]:
+            if cell is not None and cell.n >= MIN_SAMPLES:
+                return cell.mean
+        return None
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""Closed-loop simulator of the reflector, the panel and the sky.
+
+Everything runs on a VirtualClock: sleeping or waiting for a sensor reading
+just moves the clock forward, so a simulated day takes seconds instead of a
+day. Nothing is stepped: the arm's position is a piecewise function of time
+that changes only when a relay switches (spin-up, constant speed, exponential
+coast-down, damped wobble on top), and the sensors evaluate it at their own
+sample times when asked.
+
+Power is the panel's sun-driven output plus what the reflector adds, a
+gaussian in reflector angle around an optimum that follows the sun, times
+the transmission of passing clouds. With a tilt arm the gaussian is 2-D,
+the second angle has its own optimum and the inclinometer reports it as
+ang_y.
+
+    hardware = sim_hardware(SimWorld(VirtualClock(start_ts), lat, lon, seed=1))
+    Controller().start(hardware, serve_metrics=False).run(until=end_ts)
+
+Several trackers run in threads of their own and share a
+SharedVirtualClock, which lets one of them run at a time and moves time
+on only when all of them wait for it.
+"""
+import bisect
+import json
+import math
+import os
+import random
+import threading
+
+import numpy as np
+
+from solar_tracker.ephemeris import solar_position
+from solar_tracker.hal import Actuator
+from solar_tracker.hal import Hardware
+from solar_tracker.hal import Inclinometer
+from solar_tracker.hal import PowerSensor
+from solar_tracker.inclino_client import Sample
+
+RET_CHANNEL = 20  # same channels as the controller
+EXT_CHANNEL = 21
+TILT_RET_CHANNEL = 17  # the second actuator in trackers.example.json
+TILT_EXT_CHANNEL = 27
+
+INCLINO_HZ = 100
+INCLINO_LAG_S = 0.03  # the sensor's filtering, a sample shows the angle this long before its ts
+POWER_PERIOD_S = 2 * 0.01702  # same as power_sampler.CONVERSION_S
+ENERGY_STEP_S = 1.0
+VOLTAGE = 30.0
+DEAD_THREAD_POLL_S = 0.05  # real time, how soon a finished thread's turn goes to the others
+
+
+class VirtualClock(object):
+    def __init__(self, start_ts):
+        self.now = start_ts
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+    def advance_to(self, ts):
+        self.now = max(self.now, ts)
+
+
+class SharedVirtualClock(VirtualClock):
+    """
+    A VirtualClock for a given number of threads, run one at a time so the
+    simulation is repeatable. A thread takes part from its first sleep (or
+    wait on one of the clock's conditions) and has the turn until the next
+    one, then the turn goes to the first thread, in the order they joined,
+    that is due or was notified. Time moves on to the earliest wake-up only
+    when no thread can run. The thread that made the clock, e.g. the one
+    starting the controller before the trackers' threads, sleeps as a
+    VirtualClock does.
+    """
+    def __init__(self, start_ts, threads):
+        VirtualClock.__init__(self, start_ts)
+        self.threads = threads
+        self.owner = threading.current_thread()
+        self.cond = threading.Condition()
+        self.members = []  # in the order they joined
+        self.wakeups = {}  # sleeping member -> ts
+        self.notified = set()  # members whose wait on a condition ended
+        self.running = None  # the member that has the turn
+
+    def sleep(self, seconds):
+        me = threading.current_thread()
+        if me is self.owner:
+            VirtualClock.sleep(self, seconds)
+            return
+        with self.cond:
+            self.wakeups[me] = self.now + max(seconds, 0)
+            self._wait_for_turn(me)
+
+    def advance_to(self, ts):
+        self.sleep(ts - self.now)
+
+    def Condition(self):
+        return _ClockCondition(self)
+
+    def _wait_for_turn(self, me):
+        # with self.cond held, me is sleeping or waiting on a condition
+        if me not in self.members:
+            self.members.append(me)
+        if self.running is me:
+            self.running = None
+        while self.running is not me:
+            self._schedule()
+            if self.running is not me:
+                self.cond.wait(DEAD_THREAD_POLL_S)
+
+    def _schedule(self):
+        if self.running is not None and self.running.is_alive():
+            return
+        if len(self.members) < self.threads:
+            return  # they all start at the same time
+        self.running = None
+        while self.running is None:
+            due = [m for m in self.members if m in self.notified or self.wakeups.get(m, math.inf) <= self.now]
+            if len(due) > 0:
+                self.running = due[0]
+                self.notified.discard(self.running)
+                self.wakeups.pop(self.running, None)
+            elif len(self.wakeups) > 0:
+                self.now = max(self.now, min(self.wakeups.values()))
+            else:
+                return  # all waiting on conditions or finished
+        self.cond.notify_all()
+
+
+class _ClockCondition(object):
+    """
+    A condition variable whose waiters give up their SharedVirtualClock
+    turn and get it back in turn once notified
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.waiters = []
+
+    def __enter__(self):
+        self.lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+    def wait(self):
+        me = threading.current_thread()
+        self.waiters.append(me)
+        self.lock.release()
+        try:
+            with self.clock.cond:
+                self.clock._wait_for_turn(me)
+        finally:
+            self.lock.acquire()
+
+    def notify_all(self):
+        with self.clock.cond:
+            self.clock.notified.update(self.waiters)
+        self.waiters = []
+
+
+class ArmModel(object):
+    """
+    Actuator physics: speed per direction after a spin-up dead time, an
+    exponential coast-down when the relay opens and a damped oscillation of
+    the reflector, proportional to the speed it was stopped from
+    """
+    def __init__(self, pos=30.0, ext_speed=0.95, ret_speed=1.05, spin_up_s=0.05, coast_tau_s=0.08,
+                 wobble_deg_per_speed=0.3, wobble_tau_s=1.5, wobble_hz=2.0, min_deg=0.0, max_deg=65.0,
+                 ext_channel=EXT_CHANNEL, ret_channel=RET_CHANNEL):
+        self.channels = (ret_channel, ext_channel)
+        self.speed = {ext_channel: ext_speed, ret_channel: -ret_speed}
+        self.spin_up_s = spin_up_s
+        self.coast_tau_s = coast_tau_s
+        self.wobble_deg_per_speed = wobble_deg_per_speed
+        self.wobble_tau_s = wobble_tau_s
+        self.wobble_hz = wobble_hz
+        self.min_deg = min_deg
+        self.max_deg = max_deg
+
+        # segments start when a relay switches: (t0, pos0, vel0, channel or None)
+        self.segment_ts = [-math.inf]
+        self.segments = [(-math.inf, pos, 0.0, None)]
+
+    def _segment(self, ts):
+        i = bisect.bisect_right(self.segment_ts, ts) - 1
+        return self.segments[i]
+
+    def _clamp(self, pos):
+        return min(max(pos, self.min_deg), self.max_deg)
+
+    def state_at(self, ts):
+        """
+        (pos, vel, wobble) at ts
+        """
+        t0, pos0, vel0, channel = self._segment(ts)
+        dt = ts - t0
+        if channel is not None:
+            driving = max(dt - self.spin_up_s, 0)
+            vel = self.speed[channel] if dt > self.spin_up_s else 0.0
+            return self._clamp(pos0 + self.speed[channel] * driving), vel, 0.0
+
+        if t0 == -math.inf:
+            return pos0, 0.0, 0.0
+
+        decay = math.exp(-dt / self.coast_tau_s)
+        pos = pos0 + vel0 * self.coast_tau_s * (1 - decay)
+        amplitude = self.wobble_deg_per_speed * abs(vel0) * math.exp(-dt / self.wobble_tau_s)
+        wobble = amplitude * math.sin(2 * math.pi * self.wobble_hz * dt)
+        return self._clamp(pos), vel0 * decay, wobble
+
+    def switch(self, ts, channel):
+        pos, vel, _ = self.state_at(ts)
+        self.segment_ts.append(ts)
+        self.segments.append((ts, pos, vel, channel))
+
+
+class Sky(object):
+    """
+    Clouds as random dips in transmission, with smooth edges
+    """
+    def __init__(self, start_ts, duration_s, clouds_per_hour=2.0, mean_cloud_s=120.0, max_depth=0.8, seed=None):
+        rng = random.Random(seed)
+        self.clouds = []  # (start, duration, depth)
+        ts = start_ts
+        while clouds_per_hour > 0:
+            ts += rng.expovariate(clouds_per_hour / 3600)
+            if ts > start_ts + duration_s:
+                break
+            self.clouds.append((ts, rng.expovariate(1 / mean_cloud_s), rng.uniform(0.2, max_depth)))
+
+    def transmission(self, ts):
+        t = 1.0
+        for start, duration, depth in self.clouds:
+            # raised cosine, deepest half way through the cloud
+            x = (ts - start) / duration
+            if 0 <= x <= 1:
+                t *= 1 - depth * math.sin(math.pi * x) ** 2
+        return t
+
+
+class SimWorld(object):
+    def __init__(self, clock, lat, lon, arm=None, sky=None, panel_peak_mw=300000.0, reflector_gain=0.25,
+                 curve_width_deg=4.0, optimum=None, power_noise=0.002, inclino_noise_deg=0.002, seed=None,
+                 tilt_arm=None, tilt_optimum=None, tilt_width_deg=6.0):
+        self.clock = clock
+        self.lat = lat
+        self.lon = lon
+        self.arm = arm if arm is not None else ArmModel()
+        self.tilt_arm = tilt_arm  # None for a single actuator
+        self.tilt_width_deg = tilt_width_deg
+        self.tilt_optimum = tilt_optimum if tilt_optimum is not None else (
+            lambda az, el: min(max(20 + 0.05 * (az - 180), 10), 30))
+        self.sky = sky if sky is not None else Sky(clock.time(), 86400, seed=seed)
+        self.panel_peak_mw = panel_peak_mw
+        self.reflector_gain = reflector_gain
+        self.curve_width_deg = curve_width_deg
+        # reflector angle that adds the most light for a sun position
+        self.optimum = optimum if optimum is not None else (
+            lambda az, el: min(max(10 + 0.5 * el + 0.05 * (az - 180), 5), 55))
+        self.power_noise = power_noise
+        self.inclino_noise_deg = inclino_noise_deg
+        self.rng = random.Random(seed)
+
+    def sun(self, ts):
+        return solar_position(ts, self.lat, self.lon)
+
+    def optimum_at(self, ts):
+        return self.optimum(*self.sun(ts))
+
+    def tilt_optimum_at(self, ts):
+        return self.tilt_optimum(*self.sun(ts))
+
+    def arm_for(self, channel):
+        if self.tilt_arm is not None and channel in self.tilt_arm.channels:
+            return self.tilt_arm
+        return self.arm
+
+    def true_power(self, ts, pos=None, tilt=None):
+        """
+        Noise free panel output in mW, with the reflector at pos and tilt
+        (default wherever it is at ts)
+        """
+        az, el = self.sun(ts)
+        if el <= 0:
+            return 0.0
+        if pos is None:
+            pos = self.arm.state_at(ts)[0]
+
+        panel = self.panel_peak_mw * math.sin(math.radians(el)) * self.sky.transmission(ts)
+        x = (pos - self.optimum(az, el)) / self.curve_width_deg
+        exponent = x * x
+        if self.tilt_arm is not None:
+            if tilt is None:
+                tilt = self.tilt_arm.state_at(ts)[0]
+            y = (tilt - self.tilt_optimum(az, el)) / self.tilt_width_deg
+            exponent += y * y
+        return panel * (1 + self.reflector_gain * math.exp(-exponent / 2))
+
+    def measured_power(self, ts):
+        return self.true_power(ts) * (1 + self.rng.gauss(0, self.power_noise))
+
+    def measured_angle(self, ts):
+        pos, _, wobble = self.arm.state_at(ts)
+        return pos + wobble + self.rng.gauss(0, self.inclino_noise_deg)
+
+    def measured_tilt(self, ts):
+        """
+        0 without a tilt arm, without drawing noise, so single actuator
+        runs see the same noise as before
+        """
+        if self.tilt_arm is None:
+            return 0.0
+        pos, _, wobble = self.tilt_arm.state_at(ts)
+        return pos + wobble + self.rng.gauss(0, self.inclino_noise_deg)
+
+
+class SimActuator(Actuator):
+    def __init__(self, world):
+        self.world = world
+        self.on = {}  # arm -> channel that is running
+
+    def setup(self, channel):
+        pass
+
+    def motor_on(self, channel):
+        arm = self.world.arm_for(channel)
+        if self.on.get(arm) != channel:
+            self.on[arm] = channel
+            arm.switch(self.world.clock.time(), channel)
+
+    def motor_off(self, channel):
+        arm = self.world.arm_for(channel)
+        if self.on.get(arm) == channel:
+            del self.on[arm]
+            arm.switch(self.world.clock.time(), None)
+
+    def pulse(self, channel, duration_s):
+        self.motor_on(channel)
+        self.world.clock.sleep(duration_s)
+        self.motor_off(channel)
+        return duration_s
+
+    def cleanup(self):
+        for channel in list(self.on.values()):
+            self.motor_off(channel)
+
+
+class SimPowerSensor(PowerSensor):
+    """
+    Readings on the INA219's conversion grid, taken when asked for
+    """
+    def __init__(self, world, period_s=POWER_PERIOD_S):
+        self.world = world
+        self.clock = world.clock
+        self.period_s = period_s
+        self.readings = {}  # grid index -> reading, so a reading never changes
+        self.energy_ts = self.clock.time()
+        self.energy_mwh = 0.0
+
+    def _reading(self, i):
+        if i not in self.readings:
+            ts = i * self.period_s
+            power = self.world.measured_power(ts)
+            self.readings[i] = {"ts": ts, "voltage": VOLTAGE, "current": power / VOLTAGE, "power": power, "seq": i}
+        return dict(self.readings[i])
+
+    def latest(self):
+        return self._reading(math.floor(self.clock.time() / self.period_s))
+
+    def wait_for_fresh_sample(self, newer_than, timeout=None):
+        i = math.floor(newer_than / self.period_s) + 1
+        self.clock.advance_to(i * self.period_s)
+        return self.latest()
+
+    def window(self, start_ts, end_ts):
+        end_ts = min(end_ts, self.clock.time())
+        first = math.floor(start_ts / self.period_s) + 1
+        last = math.floor(end_ts / self.period_s)
+        readings = [self._reading(i) for i in range(first, last + 1)]
+        return {f: np.array([r[f] for r in readings]) for f in ["ts", "voltage", "current", "power"]}
+
+    def wait_for_window(self, start_ts, duration, timeout=None):
+        self.wait_for_fresh_sample(start_ts + duration)
+        return self.window(start_ts, start_ts + duration)
+
+    def energy_wh(self):
+        # integrated at a fixed step from the noise free output
+        now = self.clock.time()
+        while self.energy_ts + ENERGY_STEP_S <= now:
+            ts = self.energy_ts + ENERGY_STEP_S / 2
+            self.energy_mwh += self.world.true_power(ts) * ENERGY_STEP_S / 3600
+            self.energy_ts += ENERGY_STEP_S
+        return self.energy_mwh / 1000
+
+
+class SimInclinometer(Inclinometer):
+    def __init__(self, world, rate_hz=INCLINO_HZ, lag_s=INCLINO_LAG_S):
+        self.world = world
+        self.clock = world.clock
+        self.rate_hz = rate_hz
+        self.lag_s = lag_s
+
+    def _sample(self, ts):
+        angle = self.world.measured_angle(ts - self.lag_s)
+        tilt = self.world.measured_tilt(ts - self.lag_s)
+        return Sample(ts, 0, 0, 0, angle, 0, 0, 25.0, angle, tilt, 0)
+
+    def next_sample(self, after_ts=None, timeout=None):
+        if after_ts is None:
+            after_ts = self.clock.time()
+        ts = (math.floor(after_ts * self.rate_hz) + 1) / self.rate_hz
+        self.clock.advance_to(ts)
+        return self._sample(ts)
+
+    def latest(self):
+        return self._sample(math.floor(self.clock.time() * self.rate_hz) / self.rate_hz)
+
+
+def write_location(home, lat, lon):
+    """
+    The ~/location.json of location.example.json in a simulated home, so the
+    controller pre-positions from the sun and scans less once calibrated
+    """
+    with open(os.path.join(home, "location.json"), "w") as f:
+        json.dump({"lat": lat, "lon": lon}, f)
+
+
+def sim_hardware(world):
+    return Hardware(
+        clock=world.clock,
+        actuator=SimActuator(world),
+        power=SimPowerSensor(world),
+        inclino=SimInclinometer(world),
+    )
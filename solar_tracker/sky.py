@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Tells passing clouds from a steady sky on the power stream.
+
+Hill climb compares readings a few seconds apart and a step is worth well
+under a percent of the panel's output, so a cloud edge moving the output by
+a few percent turns every comparison into noise. The detector gets every
+power reading taken while the reflector is at rest and looks for three
+things over the last WINDOW_S:
+
+1. the derivative: a linear fit whose slope is both significant (SLOPE_Z
+   standard errors) and large (MAX_SLOPE_PER_S of the output per second)
+2. the variance: the scatter around the fit is more than MAX_NOISE_RATIO
+   times what it is under a steady sky, which is learned as it goes
+3. change points: a two-sided CUSUM of the readings against the level at
+   the start, in units of the steady-sky noise, alarmed within the window
+
+The reflector's own moves change the level, reset() starts over after one.
+"""
+import collections
+import math
+
+WINDOW_S = 2.0
+MIN_SAMPLES = 30  # ~1s of INA219 readings, fewer can't tell
+MAX_SLOPE_PER_S = 0.001
+SLOPE_Z = 3
+MAX_NOISE_RATIO = 2.0
+MIN_NOISE = 0.001  # relative, floor for the learned steady-sky noise
+NOISE_SMOOTHING = 0.05  # weight of the newest window's noise
+CUSUM_DRIFT = 0.5  # in noise units, slack per reading
+CUSUM_THRESHOLD = 5.0
+CUSUM_REF_SAMPLES = 10  # readings averaged for the level after a change
+
+
+class SkyDetector(object):
+    def __init__(self, window_s=WINDOW_S, min_samples=MIN_SAMPLES):
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.noise = None  # relative std of the readings under a steady sky
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the readings, e.g. after the reflector moved
+        """
+        self.window = collections.deque()  # (ts, power)
+        self.ref = None  # level the CUSUM compares against
+        self.cusum_up = 0.0
+        self.cusum_down = 0.0
+        self.last_change_ts = None
+
+    def _sigma(self):
+        return max(self.noise if self.noise is not None else MIN_NOISE, MIN_NOISE)
+
+    def add(self, ts, power):
+        self.window.append((ts, power))
+        while self.window[0][0] < ts - self.window_s:
+            self.window.popleft()
+
+        if self.ref is None:
+            if len(self.window) >= self.min_samples:
+                self.ref = sum(p for _, p in self.window) / len(self.window)
+            return
+        if self.ref <= 0:
+            return  # night
+
+        z = (power / self.ref - 1) / self._sigma()
+        self.cusum_up = max(0.0, self.cusum_up + z - CUSUM_DRIFT)
+        self.cusum_down = max(0.0, self.cusum_down - z - CUSUM_DRIFT)
+        if self.cusum_up > CUSUM_THRESHOLD or self.cusum_down > CUSUM_THRESHOLD:
+            self.last_change_ts = ts
+            # carry on from the new level
+            recent = [p for _, p in list(self.window)[-CUSUM_REF_SAMPLES:]]
+            self.ref = sum(recent) / len(recent)
+            self.cusum_up = self.cusum_down = 0.0
+
+    def verdict(self):
+        """
+        (steady, reason): steady is None while there are too few readings
+        to tell, reason is what gave the transient away
+        """
+        n = len(self.window)
+        if n < self.min_samples:
+            return None, "{} of {} readings".format(n, self.min_samples)
+
+        ts0 = self.window[0][0]
+        mean_t = sum(ts - ts0 for ts, _ in self.window) / n
+        mean_p = sum(p for _, p in self.window) / n
+        if mean_p <= 0:
+            return True, None  # night, nothing to wait for
+
+        stt = sum((ts - ts0 - mean_t) ** 2 for ts, _ in self.window)
+        slope = sum((ts - ts0 - mean_t) * (p - mean_p) for ts, p in self.window) / stt if stt > 0 else 0.0
+        residual = sum((p - mean_p - slope * (ts - ts0 - mean_t)) ** 2 for ts, p in self.window)
+        noise = math.sqrt(residual / (n - 2)) / mean_p
+        slope_se = math.sqrt(residual / (n - 2) / stt) / mean_p if stt > 0 else 0.0
+        rel_slope = slope / mean_p
+
+        last_ts = self.window[-1][0]
+        if self.last_change_ts is not None and last_ts - self.last_change_ts < self.window_s:
+            return False, "change point {:0.1f}s ago".format(last_ts - self.last_change_ts)
+        if abs(rel_slope) > MAX_SLOPE_PER_S and abs(rel_slope) > SLOPE_Z * slope_se:
+            return False, "output changing {:+0.2f}%/s".format(100 * rel_slope)
+
+        if self.noise is not None and noise > MAX_NOISE_RATIO * self._sigma():
+            steady, reason = False, "noise {:0.2f}% vs {:0.2f}% steady".format(100 * noise, 100 * self._sigma())
+        else:
+            steady, reason = True, None
+
+        # lasting scatter without a trend becomes the new normal, slowly
+        if self.noise is None:
+            self.noise = noise
+        else:
+            self.noise = math.sqrt((1 - NOISE_SMOOTHING) * self.noise ** 2 + NOISE_SMOOTHING * noise ** 2)
+        return steady, reason
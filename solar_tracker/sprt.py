@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Sequential test for "is the power here better than there".
+
+A hill climb comparison reads power at one position, moves and reads it at
+the next. Instead of one median each and a fixed threshold, the readings
+after the move keep coming until Wald's sequential probability ratio test
+tells the two hypotheses apart:
+
+    H1: after - before = +MIN_EFFECT * before
+    H0: after - before = -MIN_EFFECT * before
+
+with the difference of the means normal and the variance pooled from both
+sides. The log likelihood ratio of H1 over H0 is 2 * delta * D / var(D),
+the test stops when it leaves +-log((1 - ALPHA) / ALPHA). With little noise
+or a big difference that takes a handful of readings, on a flat top it runs
+into the caller's time budget and says it can't tell.
+"""
+import math
+
+ALPHA = 0.05  # chance of calling a difference of MIN_EFFECT the wrong way
+MIN_EFFECT = 0.001  # relative, smaller differences are not worth a move
+MIN_SAMPLES = 6  # per side, before that the variance is a guess
+
+
+def _mean_and_ss(values):
+    mean = sum(values) / len(values)
+    return mean, sum((v - mean) ** 2 for v in values)
+
+
+def log_likelihood_ratio(before, after, min_effect=MIN_EFFECT):
+    """
+    Log likelihood ratio of "after is better by min_effect" over "after is
+    worse by min_effect", None with too few readings
+    """
+    if len(before) < 2 or len(after) < 2:
+        return None
+
+    mean_before, ss_before = _mean_and_ss(before)
+    mean_after, ss_after = _mean_and_ss(after)
+    difference = mean_after - mean_before
+    delta = min_effect * abs(mean_before)
+
+    var = (ss_before + ss_after) / (len(before) + len(after) - 2) * (1 / len(before) + 1 / len(after))
+    if var == 0:
+        return math.copysign(math.inf, difference) if difference != 0 else 0.0
+    return 2 * delta * difference / var
+
+
+def compare(before, after, alpha=ALPHA, min_effect=MIN_EFFECT, min_samples=MIN_SAMPLES):
+    """
+    1 if the readings after are better, -1 if worse, 0 while they can't tell
+    """
+    if len(before) < min_samples or len(after) < min_samples:
+        return 0
+
+    llr = log_likelihood_ratio(before, after, min_effect)
+    bound = math.log((1 - alpha) / alpha)
+    if llr >= bound:
+        return 1
+    if llr <= -bound:
+        return -1
+    return 0
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Hill climb step size from the recent decisions.
+
+With a fixed step, perturb and observe spends full size probes on an
+optimum that barely moves and many small steps catching up after it ran
+away. Decisions in the same direction in a row mean the optimum is getting
+away, so the step grows. A reversal on the same axis or a "stay" means it
+is around here, so the step shrinks.
+
+The bounds matter more than the rates: below MIN_STEP_DEG a step hardly
+changes the power, comparisons come out as noise and hill climb random
+walks (in simulation it lost time near the optimum), above MAX_STEP_DEG it
+overshoots.
+
+The controller climbs its primary axis at a fixed step: over ten simulated
+days adapt_step() won neither moves nor time near the optimum consistently.
+multi_axis.TrackingPoll grows and shrinks the other axes' steps with these
+rates and bounds.
+"""
+MIN_STEP_DEG = 0.4
+MAX_STEP_DEG = 0.8
+GROW = 1.25
+SHRINK = 0.7
+RUN_TO_GROW = 3  # same direction decisions in a row
+
+DIRECTIONS = ["ext", "ret"]
+
+
+def direction(decision):
+    """
+    (axis, direction) of a decision that moved, "ext" or "tilt-ext" (a
+    secondary axis, see AxisConfig.directionName), None for the others
+    """
+    axis, _, name = decision.rpartition("-")
+    if name not in DIRECTIONS:
+        return None
+    return axis, name
+
+
+def adapt_step(step_deg, decision_history, min_deg=MIN_STEP_DEG, max_deg=MAX_STEP_DEG):
+    """
+    Step for the next decision, after the last one in decision_history
+    """
+    if len(decision_history) == 0:
+        return step_deg
+
+    last = decision_history[-1]
+    if last == "stay":
+        step_deg *= SHRINK
+    elif direction(last) is not None:
+        run = decision_history[-RUN_TO_GROW:]
+        previous = direction(decision_history[-2]) if len(decision_history) >= 2 else None
+        if len(run) == RUN_TO_GROW and all(d == last for d in run):
+            step_deg *= GROW
+        elif previous is not None and previous[0] == direction(last)[0] and previous != direction(last):
+            step_deg *= SHRINK
+
+    return min(max(step_deg, min_deg), max_deg)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Several reflectors on one panel string, run by one controller process.
+
+Without ~/trackers.json there is one tracker with the channels, INA219 and
+inclinometer broker the controller always used, and its learned files in
+HOME. With it (see trackers.example.json) every entry is a tracker with its
+own relay channels, power sensor, inclinometer broker and home directory for
+its learned files.
+
+A tracker moves its reflector with one actuator, the primary axis, unless
+its entry lists more under "axes": each with its own pair of relay channels
+and the inclinometer field (ang_x, ang_y, ang_z) that measures it.
+
+Each tracker runs its main loop in its own thread. The Scheduler makes them
+take turns where they would get in each other's way:
+ - one motor runs at a time, but a tracker waiting for its reflector to
+   settle does not hold anything, so another one moves meanwhile
+ - trackers that read the same power sensor take turns for a whole scan or
+   decision, the other's moves would show up in its readings
+ - one tracker scans at a time and periodic scans are spread out over the
+   scan interval, so the string never loses all its reflectors at once
+"""
+import json
+import os
+import threading
+
+from solar_tracker.inclino_client import BROKER_SOCKET
+from solar_tracker.power_sampler import INA_ADDRESS
+
+HOME = os.path.expanduser("~")
+TRACKERS_FILE = HOME + "/trackers.json"  # see trackers.example.json
+
+RET_CHANNEL = 20
+EXT_CHANNEL = 21
+
+PRIMARY_AXIS = "main"
+ANGLE_FIELDS = ["angle", "ang_x", "ang_y", "ang_z"]  # inclino_client.Sample fields
+
+
+class AxisConfig(object):
+    """
+    One actuator: its relay channels and the inclinometer field that
+    measures it. The primary axis keeps the plain "ext" and "ret" direction
+    names the learned models have always used, the others prefix them with
+    their name.
+    """
+    def __init__(self, name, ret_channel, ext_channel, angle_field="angle", primary=False):
+        if angle_field not in ANGLE_FIELDS:
+            raise ValueError("Axis {}: unknown inclinometer field {}".format(name, angle_field))
+        self.name = name
+        self.ret_channel = ret_channel
+        self.ext_channel = ext_channel
+        self.angle_field = angle_field
+        self.primary = primary
+
+    def channel(self, direction):
+        return self.ext_channel if direction == "ext" else self.ret_channel
+
+    def directionName(self, channel):
+        direction = "ext" if channel == self.ext_channel else "ret"
+        return direction if self.primary else "{}-{}".format(self.name, direction)
+
+    def view(self, sample):
+        """
+        The inclinometer sample with this axis' angle as its angle
+        """
+        if self.angle_field == "angle":
+            return sample
+        return sample._replace(angle=getattr(sample, self.angle_field))
+
+
+class TrackerConfig(object):
+    def __init__(self, name="tracker", ret_channel=RET_CHANNEL, ext_channel=EXT_CHANNEL,
+                 ina_address=INA_ADDRESS, inclino_socket=BROKER_SOCKET, home=HOME, axes=None):
+        self.name = name
+        self.ret_channel = ret_channel
+        self.ext_channel = ext_channel
+        self.ina_address = ina_address
+        self.inclino_socket = inclino_socket
+        self.home = home
+        # the primary axis first, then e.g. a second actuator on ang_y
+        self.axes = [AxisConfig(PRIMARY_AXIS, ret_channel, ext_channel, primary=True)] + (axes or [])
+
+    def path(self, filename):
+        return os.path.join(self.home, filename)
+
+
+def load_tracker_configs(path=TRACKERS_FILE):
+    """
+    One TrackerConfig per entry of path, a single default one without it
+    """
+    if not os.path.exists(path):
+        return [TrackerConfig()]
+
+    with open(path) as f:
+        entries = json.load(f)["trackers"]
+
+    configs = []
+    for entry in entries:
+        name = entry["name"]
+        config = TrackerConfig(
+            name=name,
+            ret_channel=entry["ret_channel"],
+            ext_channel=entry["ext_channel"],
+            ina_address=int(str(entry.get("ina_address", INA_ADDRESS)), 0),
+            inclino_socket=entry.get("inclino_socket", BROKER_SOCKET),
+            home=os.path.expanduser(entry.get("home", os.path.join(HOME, "tracker-" + name))),
+            axes=[AxisConfig(a["name"], a["ret_channel"], a["ext_channel"], a["angle"])
+                  for a in entry.get("axes", [])],
+        )
+        os.makedirs(config.home, exist_ok=True)
+        configs.append(config)
+
+    names = [c.name for c in configs]
+    if len(set(names)) != len(names):
+        raise ValueError("Tracker names in {} are not unique: {}".format(path, names))
+    for c in configs:
+        axis_names = [a.name for a in c.axes]
+        if len(set(axis_names)) != len(axis_names):
+            raise ValueError("Axis names of tracker {} in {} are not unique: {}".format(c.name, path, axis_names))
+    channels = [ch for c in configs for a in c.axes for ch in (a.ret_channel, a.ext_channel)]
+    if len(set(channels)) != len(channels):
+        raise ValueError("Trackers in {} share relay channels: {}".format(path, channels))
+    return configs
+
+
+class TurnLock(object):
+    """
+    A lock handed out in the order it was asked for, so a tracker that
+    releases it and asks again right away goes to the back of the queue
+    """
+    def __init__(self, condition=threading.Condition):
+        self.cond = condition()
+        self.next_ticket = 0
+        self.serving = 0
+
+    def __enter__(self):
+        with self.cond:
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            while ticket != self.serving:
+                self.cond.wait()
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.cond:
+            self.serving += 1
+            self.cond.notify_all()
+
+
+class Scheduler(object):
+    def __init__(self, condition=threading.Condition):
+        """
+        condition makes the turns' condition variables, a simulated clock
+        shared by the tracker threads has its own (sim.SharedVirtualClock)
+        """
+        self.condition = condition
+        # the relays share one supply
+        self.motor = TurnLock(condition)
+        self.sensor_turns = {}  # INA219 address -> TurnLock
+        self.lock = threading.Lock()
+        self.scanning = None  # name of the tracker scanning now
+        self.last_scan_end = None
+        self.scanned = set()  # trackers that scanned at least once
+
+    def sensorTurn(self, config):
+        with self.lock:
+            if config.ina_address not in self.sensor_turns:
+                self.sensor_turns[config.ina_address] = TurnLock(self.condition)
+            return self.sensor_turns[config.ina_address]
+
+    def claimScan(self, config, now, min_gap_s):
+        """
+        True if config's tracker may scan now: nobody else is scanning and,
+        unless it never scanned, the last scan ended min_gap_s ago. Must be
+        followed by endScan().
+        """
+        with self.lock:
+            if self.scanning is not None:
+                return False
+            first = config.name not in self.scanned
+            if not first and self.last_scan_end is not None and now - self.last_scan_end < min_gap_s:
+                return False
+            self.scanning = config.name
+            return True
+
+    def endScan(self, config, now):
+        with self.lock:
+            self.scanning = None
+            self.last_scan_end = now
+            self.scanned.add(config.name)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Streaming wobble detection for the reflector after a move.
+
+Same three conditions the old has_wobble() checked over the whole list of
+angles, kept up to date in O(1) per sample with bounded memory:
+
+1. the 300 sample SMA moved less than 0.001 degree since the previous sample
+2. the sample is within 0.05 degree of the SMA
+3. 1. and 2. held for the last 50 samples
+"""
+import collections
+
+SMA_WINDOW = 300
+SMA_DRIFT_MAX = 0.001
+DEVIATION_MAX = 0.05
+STABLE_SAMPLES = 50
+
+
+class WobbleDetector(object):
+    def __init__(self, sma_window=SMA_WINDOW, sma_drift_max=SMA_DRIFT_MAX,
+                 deviation_max=DEVIATION_MAX, stable_samples=STABLE_SAMPLES):
+        self.sma_drift_max = sma_drift_max
+        self.deviation_max = deviation_max
+        self.stable_samples = stable_samples
+
+        self.window = collections.deque(maxlen=sma_window)
+        self.window_sum = 0.0
+        self.prev_sma = None
+        self.stable_run = 0  # consecutive samples that passed 1. and 2.
+        self.count = 0
+
+    def add(self, angle):
+        """
+        Adds the next angle, returns True while the reflector still wobbles
+        """
+        if len(self.window) == self.window.maxlen:
+            self.window_sum -= self.window[0]
+        self.window.append(angle)
+        self.count += 1
+
+        # re-sum once per window so float error of the running sum can't build up
+        if self.count % self.window.maxlen == 0:
+            self.window_sum = sum(self.window)
+        else:
+            self.window_sum += angle
+
+        sma = self.window_sum / len(self.window)
+
+        # the first sample always fails 1., there is no previous SMA
+        passed = (self.prev_sma is not None
+                  and abs(self.prev_sma - sma) <= self.sma_drift_max
+                  and abs(angle - sma) <= self.deviation_max)
+        self.prev_sma = sma
+
+        if passed:
+            self.stable_run += 1
+        else:
+            self.stable_run = 0
+
+        return self.has_wobble()
+
+    def has_wobble(self):
+        return self.stable_run < self.stable_samples
@@ -8,13 +8,14 @@ signal.signal(signal.SIGTERM, _shutdown)
 signal.signal(signal.SIGHUP, _shutdown)
 
 # --- Temperature sensor ---
-INCLO_PORT = 2017
+BROKER_SOCKET = "/tmp/scl3300-broker.sock"  # inclino_broker.py
 
 def get_temp():
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
             s.settimeout(5)
-            s.connect(("127.0.0.1", INCLO_PORT))
+            s.connect(BROKER_SOCKET)
+            s.sendall(f"mean {DT}\n".encode())
             data = s.recv(1024).decode().strip()
         return float(data.split("\t")[7])
     except (socket.error, IndexError, ValueError) as e:
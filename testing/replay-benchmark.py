@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Scores hill climb algorithms on recorded days before they go on the Pi.
+
+Every (algorithm, day) pair runs in its own process: the controller is
+started on a ReplayWorld built from that day's measure.py sweeps and the
+actuator dynamics fitted to drag.tab, with a fresh home directory. Reports
+energy against the best fixed reflector position of the day, moves per hour,
+total settle time and decision latency (simulated seconds per decision).
+
+Results are appended as JSON lines to --out with the git commit and a hash
+of the input files, so runs from different commits can be compared.
+
+Algorithms are names from controller.ALGORITHMS or module:function for a
+climb function that is not registered there.
+
+--lat/--lon, where the sweeps were recorded, write a location.json into the
+home directories so the controller pre-positions from the sun; without
+them it finds the sun by scans alone.
+
+    testing/replay-benchmark.py ~/measurements-*.csv --drag ~/drag.tab [--algorithms probe,model] [--lat 37.77 --lon -122.42]
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+ENERGY_STEP_S = 10
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def files_hash(paths):
+    h = hashlib.sha1()
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+def fixed_energy_wh(world, start, end):
+    """
+    Energy at the best position the reflector could have stayed at all day
+    """
+    best_mwh = 0
+    for pos in world.positions():
+        mwh = sum(world.true_power(ts, pos=pos) for ts in range(int(start), int(end), ENERGY_STEP_S))
+        best_mwh = max(best_mwh, mwh * ENERGY_STEP_S / 3600)
+    return best_mwh / 1000
+
+
+def resolve(algorithm, algorithms):
+    if algorithm in algorithms:
+        return algorithms[algorithm]
+    module, function = algorithm.split(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def replay(algorithm, day, sweeps, drag_path, seed, location):
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="replay-{}-{}-".format(day, algorithm.replace(":", ".")))
+
+    from solar_tracker import controller
+    from solar_tracker.replay import ReplayWorld
+    from solar_tracker.replay import arm_from_drag
+    from solar_tracker.sim import VirtualClock
+    from solar_tracker.sim import sim_hardware
+    from solar_tracker.sim import write_location
+
+    lat, lon = location if location is not None else (0, 0)
+    if location is not None:
+        write_location(os.environ["HOME"], lat, lon)
+
+    start = sweeps[0].ts
+    end = sweeps[-1].ts
+    arm = arm_from_drag(drag_path, pos=float(sweeps[0].angles[len(sweeps[0].angles) // 2]))
+    world = ReplayWorld(VirtualClock(start), sweeps, arm, lat=lat, lon=lon, seed=seed)
+    hardware = sim_hardware(world)
+
+    # time every decision on the simulated clock
+    climb = resolve(algorithm, controller.ALGORITHMS)
+    latencies = []
+
+    def timed_climb(state):
+        started = hardware.clock.time()
+        decision = climb(state)
+        latencies.append(hardware.clock.time() - started)
+        return decision
+    controller.ALGORITHMS[algorithm] = timed_climb
+
+    wall_start = time.perf_counter()
+    with open(os.path.join(os.environ["HOME"], "controller.log"), "w") as log_file:
+        with contextlib.redirect_stdout(log_file):
+            c = controller.Controller(algorithm).start(hardware, serve_metrics=False)
+            c.run(until=end)
+    wall_s = time.perf_counter() - wall_start
+
+    sim_end = hardware.clock.time()
+    hours = (sim_end - start) / 3600
+    energy_wh = hardware.power.energy_wh()
+    fixed_wh = fixed_energy_wh(world, start, sim_end)
+    return {
+        "algorithm": algorithm,
+        "day": day,
+        "hours": hours,
+        "energy_wh": energy_wh,
+        "fixed_wh": fixed_wh,
+        "vs_fixed_pct": 100 * energy_wh / fixed_wh if fixed_wh > 0 else None,
+        "moves": c.state.moves_count,
+        "moves_per_hour": c.state.moves_count / hours if hours > 0 else None,
+        "settle_s": c.state.wobble_total,
+        "decisions": len(latencies),
+        "decision_latency_mean_s": statistics.mean(latencies) if latencies else None,
+        "decision_latency_p95_s": sorted(latencies)[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        "wall_s": wall_s,
+        "home": os.environ["HOME"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("measurements", nargs="+", help="measurements.txt or measurements-*.csv files")
+    parser.add_argument("--drag", default=os.path.expanduser("~/drag.tab"))
+    parser.add_argument("--algorithms", default="probe,model")
+    parser.add_argument("--workers", type=int, default=None, help="default one per CPU")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--lat", type=float, default=None, help="where the sweeps were recorded")
+    parser.add_argument("--lon", type=float, default=None)
+    parser.add_argument("--out", default="replay-results.jsonl")
+    args = parser.parse_args()
+    if (args.lat is None) != (args.lon is None):
+        parser.error("--lat and --lon go together")
+    location = (args.lat, args.lon) if args.lat is not None else None
+
+    from solar_tracker.replay import load_sessions
+
+    sessions = load_sessions(args.measurements)
+    if len(sessions) == 0:
+        sys.exit("No usable sweeps in {}".format(", ".join(args.measurements)))
+
+    run_info = {
+        "commit": git_commit(),
+        "data": files_hash(args.measurements + ([args.drag] if os.path.exists(args.drag) else [])),
+        "seed": args.seed,
+        "location": location,
+        "run_at": time.time(),
+    }
+
+    tasks = [(a, day, sweeps) for day, sweeps in sorted(sessions.items()) for a in args.algorithms.split(",")]
+    # one fresh process per run, the controller keeps its state in module globals
+    with concurrent.futures.ProcessPoolExecutor(args.workers, max_tasks_per_child=1) as pool:
+        futures = [pool.submit(replay, a, day, sweeps, args.drag, args.seed, location) for a, day, sweeps in tasks]
+        results = [f.result() for f in futures]
+
+    with open(args.out, "a") as fout:
+        for r in results:
+            fout.write(json.dumps(dict(run_info, **r)) + "\n")
+
+    print("commit {commit}, data {data}, seed {seed}".format(**run_info))
+    print("{:<20} {:<10} {:>6} {:>10} {:>9} {:>8} {:>9} {:>11} {:>7}".format(
+        "algorithm", "day", "hours", "energy Wh", "% fixed", "moves/h", "settle s", "latency s", "wall s"))
+    for r in results:
+        print("{:<20} {:<10} {:>6.1f} {:>10.1f} {:>9.2f} {:>8.1f} {:>9.0f} {:>11.1f} {:>7.1f}".format(
+            r["algorithm"], r["day"], r["hours"], r["energy_wh"], r["vs_fixed_pct"] or 0, r["moves_per_hour"] or 0,
+            r["settle_s"], r["decision_latency_mean_s"] or 0, r["wall_s"]))
+    print("appended to {}".format(args.out))
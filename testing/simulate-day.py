@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Runs the controller against the simulator for one day of sun.
+
+Each hill climb algorithm gets its own process, a fresh home directory (so
+nothing learned on the Pi is used or overwritten) and the same simulated
+world. Prints the energy harvested against a reflector that always sits at
+the optimum, the motor energy and moves spent, the time lost waiting for
+wobble and the part of the day the output was within --within percent of
+the optimum's. "% net" takes the motor energy off the harvest.
+
+--gates on,off runs every algorithm with and without skipping decisions
+that aren't worth their moves (see solar_tracker/move_cost.py).
+
+The home directory gets a location.json for --lat/--lon, so the controller
+pre-positions from the sun as it does on the Pi; --no-location leaves it
+out and the controller finds the sun by scans alone.
+
+    testing/simulate-day.py [--date 2026-06-21] [--lat 37.77 --lon -122.42] [--hours 12] [--seed 1] [--no-location]
+"""
+import argparse
+import calendar
+import concurrent.futures
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+MIN_ELEVATION_DEG = 5
+ENERGY_STEP_S = 10
+
+
+def daylight(date, lat, lon):
+    """
+    First sunrise to sunset, above MIN_ELEVATION_DEG, after midnight UTC
+    of date
+    """
+    from solar_tracker.ephemeris import solar_position
+
+    ts = calendar.timegm(time.strptime(date, "%Y-%m-%d"))
+    start = None
+    was_below = False
+    for step in range(0, 2 * 86400, 300):
+        elevation = solar_position(ts + step, lat, lon)[1]
+        if start is None and elevation > MIN_ELEVATION_DEG and was_below:
+            start = ts + step
+        elif start is not None and elevation <= MIN_ELEVATION_DEG:
+            return start, ts + step
+        was_below = elevation <= MIN_ELEVATION_DEG
+    raise ValueError("no daylight at {}, {} on {}".format(lat, lon, date))
+
+
+def reference_energy_wh(world, start, end, pos=None):
+    """
+    Energy with the reflector always at the optimum, or fixed at pos
+    """
+    mwh = 0.0
+    for ts in range(int(start), int(end), ENERGY_STEP_S):
+        at = pos if pos is not None else world.optimum_at(ts)
+        mwh += world.true_power(ts, pos=at) * ENERGY_STEP_S / 3600
+    return mwh / 1000
+
+
+def in_band_pct(world, start, end, within_pct):
+    """
+    Part of the time the output was within within_pct of the optimum's
+    """
+    steps = range(int(start), int(end), ENERGY_STEP_S)
+    in_band = sum(1 for ts in steps
+                  if world.true_power(ts) >= (1 - within_pct / 100) * world.true_power(ts, pos=world.optimum_at(ts)))
+    return 100 * in_band / len(steps) if len(steps) > 0 else None
+
+
+def simulate(algorithm, gate, start, end, lat, lon, seed, within_pct, location):
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="sim-{}-{}-".format(algorithm, gate))
+
+    from solar_tracker import controller
+    from solar_tracker.sim import SimWorld
+    from solar_tracker.sim import VirtualClock
+    from solar_tracker.sim import sim_hardware
+    from solar_tracker.sim import write_location
+
+    if location:
+        write_location(os.environ["HOME"], lat, lon)
+
+    controller.GATE_DECISIONS = (gate == "on")
+    world = SimWorld(VirtualClock(start), lat, lon, seed=seed)
+    hardware = sim_hardware(world)
+
+    wall_start = time.perf_counter()
+    with open(os.path.join(os.environ["HOME"], "controller.log"), "w") as log_file:
+        with contextlib.redirect_stdout(log_file):
+            c = controller.Controller(algorithm).start(hardware, serve_metrics=False)
+            c.run(until=end)
+    wall_s = time.perf_counter() - wall_start
+
+    sim_end = hardware.clock.time()
+    noon_pos = world.optimum_at((start + end) / 2)
+    return {
+        "algorithm": algorithm if gate == "on" else "{}/no-gate".format(algorithm),
+        "energy_wh": hardware.power.energy_wh(),
+        "motor_wh": c.state.move_motor_wh,
+        "ideal_wh": reference_energy_wh(world, start, sim_end),
+        "fixed_wh": reference_energy_wh(world, start, sim_end, pos=noon_pos),
+        "moves": c.state.moves_count,
+        "decisions": sum(c.state.metrics.decision_counts.values()),
+        "wobble_s": c.state.wobble_total,
+        "in_band_pct": in_band_pct(world, start, sim_end, within_pct),
+        "simulated_h": (sim_end - start) / 3600,
+        "wall_s": wall_s,
+        "home": os.environ["HOME"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--date", default="2026-06-21")
+    parser.add_argument("--lat", type=float, default=37.7749)
+    parser.add_argument("--lon", type=float, default=-122.4194)
+    parser.add_argument("--hours", type=float, default=None, help="simulate only this much of the day")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--algorithms", default="probe,model")
+    parser.add_argument("--gates", default="on", help="on, off or both")
+    parser.add_argument("--within", type=float, default=1.0, help="percent of the optimum's output")
+    parser.add_argument("--no-location", action="store_true", help="no location.json, no sun feed-forward")
+    args = parser.parse_args()
+
+    start, end = daylight(args.date, args.lat, args.lon)
+    if args.hours is not None:
+        end = min(end, start + args.hours * 3600)
+
+    runs = [(a, gate) for a in args.algorithms.split(",") for gate in args.gates.split(",")]
+    # one fresh process per run, the controller keeps its state in module globals
+    with concurrent.futures.ProcessPoolExecutor(max_tasks_per_child=1) as pool:
+        futures = [pool.submit(simulate, a, gate, start, end, args.lat, args.lon, args.seed, args.within,
+                               not args.no_location)
+                   for a, gate in runs]
+        results = [f.result() for f in futures]
+
+    print("{:<20} {:>10} {:>10} {:>10} {:>8} {:>8} {:>8} {:>8} {:>10} {:>10} {:>9} {:>7}".format(
+        "", "energy Wh", "% ideal", "% fixed", "motor Wh", "% net", "moves", "moves/h", "wobble %",
+        "% in {:g}%".format(args.within), "sim h", "wall s"))
+    for r in results:
+        print("{:<20} {:>10.1f} {:>10.2f} {:>10.2f} {:>8.2f} {:>8.2f} {:>8} {:>8.1f} {:>10.1f} {:>10.1f} {:>9.1f} {:>7.1f}".format(
+            r["algorithm"], r["energy_wh"], 100 * r["energy_wh"] / r["ideal_wh"], 100 * r["energy_wh"] / r["fixed_wh"],
+            r["motor_wh"], 100 * (r["energy_wh"] - r["motor_wh"]) / r["ideal_wh"], r["moves"], r["moves"] / r["simulated_h"], 100 * r["wobble_s"] / (r["simulated_h"] * 3600),
+            r["in_band_pct"], r["simulated_h"], r["wall_s"]))
+    for r in results:
+        print("{} log and learned files in {}".format(r["algorithm"], r["home"]))
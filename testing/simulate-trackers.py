@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Runs several trackers in one controller against the simulator.
+
+Every tracker gets its own simulated world (arm, sky and noise from its own
+seed) with the channels of trackers.example.json, all on one
+SharedVirtualClock, so the tracker threads and the Scheduler's turns run as
+they do on the Pi. Prints each tracker's energy against a reflector always
+at the optimum and its moves, then checks the Scheduler's promises: that
+no two motors ran at the same time and no two scans overlapped.
+
+--shared-sensor puts all trackers on one INA219 address, so they also take
+turns for their scans and decisions. The home directory gets a location.json
+for --lat/--lon unless --no-location.
+
+    testing/simulate-trackers.py [--trackers 2] [--hours 2] [--seed 1] [--algorithm sprt] [--shared-sensor] [--no-location]
+"""
+import argparse
+import contextlib
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+CHANNELS = [(20, 21), (23, 24), (12, 13), (16, 19)]  # (ret, ext) per tracker
+INA_ADDRESSES = [0x40, 0x41, 0x44, 0x45]
+
+
+def simulate_day():
+    # the neighbouring script's helpers, its file name is not importable
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulate-day.py")
+    spec = importlib.util.spec_from_file_location("simulate_day", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def motor_intervals(arm, end):
+    """
+    (start, stop) of every time a relay of arm was closed
+    """
+    intervals = []
+    for i, (t0, _, _, channel) in enumerate(arm.segments):
+        if channel is not None:
+            stop = arm.segments[i + 1][0] if i + 1 < len(arm.segments) else end
+            intervals.append((t0, stop))
+    return intervals
+
+
+def scan_intervals(path):
+    intervals = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                fields = line.split("\t")
+                intervals.append((float(fields[0]), float(fields[0]) + float(fields[2])))
+    return intervals
+
+
+def overlaps(intervals_by_tracker):
+    """
+    (tracker, tracker, seconds) of every overlap between two trackers'
+    intervals
+    """
+    found = []
+    names = sorted(intervals_by_tracker)
+    for i, a in enumerate(names):
+        for b in names[i + 1:]:
+            for start_a, stop_a in intervals_by_tracker[a]:
+                for start_b, stop_b in intervals_by_tracker[b]:
+                    overlap = min(stop_a, stop_b) - max(start_a, start_b)
+                    if overlap > 1e-9:
+                        found.append((a, b, overlap))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--date", default="2026-06-21")
+    parser.add_argument("--lat", type=float, default=37.7749)
+    parser.add_argument("--lon", type=float, default=-122.4194)
+    parser.add_argument("--hours", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trackers", type=int, default=2)
+    parser.add_argument("--algorithm", default="sprt")
+    parser.add_argument("--shared-sensor", action="store_true", help="all trackers on one INA219")
+    parser.add_argument("--no-location", action="store_true", help="no location.json, no sun feed-forward")
+    args = parser.parse_args()
+    if not 1 <= args.trackers <= len(CHANNELS):
+        parser.error("--trackers must be 1 to {}".format(len(CHANNELS)))
+
+    home = tempfile.mkdtemp(prefix="sim-trackers-")
+    os.environ["HOME"] = home  # before the controller reads it
+
+    from solar_tracker import controller
+    from solar_tracker.sim import ArmModel
+    from solar_tracker.sim import SharedVirtualClock
+    from solar_tracker.sim import SimWorld
+    from solar_tracker.sim import sim_hardware
+    from solar_tracker.sim import write_location
+    from solar_tracker.trackers import TrackerConfig
+
+    if not args.no_location:
+        write_location(home, args.lat, args.lon)
+
+    day = simulate_day()
+    start, end = day.daylight(args.date, args.lat, args.lon)
+    end = min(end, start + args.hours * 3600)
+
+    clock = SharedVirtualClock(start, threads=args.trackers)
+    configs = []
+    worlds = []
+    for i in range(args.trackers):
+        ret_channel, ext_channel = CHANNELS[i]
+        name = "tracker{}".format(i + 1)
+        tracker_home = os.path.join(home, name)
+        os.makedirs(tracker_home)
+        configs.append(TrackerConfig(name=name, ret_channel=ret_channel, ext_channel=ext_channel,
+                                     ina_address=INA_ADDRESSES[0 if args.shared_sensor else i], home=tracker_home))
+        arm = ArmModel(ext_channel=ext_channel, ret_channel=ret_channel)
+        worlds.append(SimWorld(clock, args.lat, args.lon, arm=arm, seed=args.seed + i))
+    hardware = [sim_hardware(w) for w in worlds]
+
+    wall_start = time.perf_counter()
+    with open(os.path.join(home, "controller.log"), "w") as log_file:
+        with contextlib.redirect_stdout(log_file):
+            c = controller.Controller(args.algorithm, configs=configs).start(hardware, serve_metrics=False)
+            c.run(until=end)
+    wall_s = time.perf_counter() - wall_start
+    sim_end = clock.time()
+
+    print("{:<10} {:>10} {:>10} {:>8} {:>8} {:>8} {:>8}".format(
+        "", "energy Wh", "% ideal", "motor Wh", "% net", "moves", "scans"))
+    motors = {}
+    scans = {}
+    for config, state, world, h in zip(configs, c.states, worlds, hardware):
+        energy_wh = h.power.energy_wh()
+        ideal_wh = day.reference_energy_wh(world, start, sim_end)
+        motors[config.name] = motor_intervals(world.arm, sim_end)
+        scans[config.name] = scan_intervals(config.path(controller.SCANS_FILE))
+        print("{:<10} {:>10.1f} {:>10.2f} {:>8.2f} {:>8.2f} {:>8} {:>8}".format(
+            config.name, energy_wh, 100 * energy_wh / ideal_wh, state.move_motor_wh,
+            100 * (energy_wh - state.move_motor_wh) / ideal_wh, state.moves_count, len(scans[config.name])))
+
+    print("Simulated {:0.1f}h in {:0.1f}s".format((sim_end - start) / 3600, wall_s))
+    failed = False
+    for what, intervals in [("motors", motors), ("scans", scans)]:
+        found = overlaps(intervals)
+        if len(found) > 0:
+            failed = True
+            for a, b, seconds in found[:10]:
+                print("OVERLAP: {} of {} and {} ran together for {:0.3f}s".format(what, a, b, seconds))
+        else:
+            print("No overlapping {}: {}".format(what, ", ".join(
+                "{} {}".format(name, len(intervals[name])) for name in sorted(intervals))))
+    print("Log and learned files in {}".format(home))
+    sys.exit(1 if failed else 0)
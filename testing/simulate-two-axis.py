@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Runs the pattern search on a reflector with a second, tilt actuator.
+
+First the search on its own, on a fixed 2-D gaussian from random starts:
+how many evaluations (moves, on the reflector) it takes to get within
+--tolerance degrees of the peak. Then the controller against the simulator
+with a tilt arm, for each algorithm: energy against a reflector that always
+sits at the 2-D optimum, moves and the spiral scans' evaluations. Every
+algorithm scans in a spiral over both axes, the 1-D ones move the tilt
+only then. The home directory gets a location.json for --lat/--lon unless
+--no-location.
+
+    testing/simulate-two-axis.py [--date 2026-06-21] [--hours 4] [--seed 1] [--algorithms pattern,sprt] [--no-location]
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import importlib.util
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+STATIC_STARTS = 200
+STATIC_SPREAD_DEG = 3.0
+ENERGY_STEP_S = 10
+
+
+def simulate_day():
+    # the neighbouring script's helpers, its file name is not importable
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulate-day.py")
+    spec = importlib.util.spec_from_file_location("simulate_day", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def static_search(seed, tolerance_deg):
+    """
+    Evaluations per start and how many ended within tolerance_deg of the
+    peak, on a gaussian 4 by 6 degrees wide
+    """
+    from solar_tracker.multi_axis import REFINE_MIN_STEP_DEG
+    from solar_tracker.multi_axis import pattern_search
+
+    rng = random.Random(seed)
+    peak = (30.0, 20.0)
+    evals = []
+    found = 0
+    for _ in range(STATIC_STARTS):
+        def f(point):
+            x = (point[0] - peak[0]) / 4.0
+            y = (point[1] - peak[1]) / 6.0
+            return 1 + 0.25 * math.exp(-(x * x + y * y) / 2)
+
+        start = (peak[0] + rng.uniform(-STATIC_SPREAD_DEG, STATIC_SPREAD_DEG),
+                 peak[1] + rng.uniform(-STATIC_SPREAD_DEG, STATIC_SPREAD_DEG))
+        best, _, n = pattern_search(f, start, 1.0, REFINE_MIN_STEP_DEG, 100)
+        evals.append(n)
+        if math.hypot(best[0] - peak[0], best[1] - peak[1]) <= tolerance_deg:
+            found += 1
+    return evals, found
+
+
+def reference_energy_wh(world, start, end):
+    """
+    Energy with the reflector always at the 2-D optimum
+    """
+    mwh = 0.0
+    for ts in range(int(start), int(end), ENERGY_STEP_S):
+        mwh += world.true_power(ts, pos=world.optimum_at(ts), tilt=world.tilt_optimum_at(ts)) * ENERGY_STEP_S / 3600
+    return mwh / 1000
+
+
+def simulate(algorithm, start, end, lat, lon, seed, location):
+    home = tempfile.mkdtemp(prefix="sim2-{}-".format(algorithm))
+    os.environ["HOME"] = home
+
+    from solar_tracker import controller
+    from solar_tracker.sim import TILT_EXT_CHANNEL
+    from solar_tracker.sim import TILT_RET_CHANNEL
+    from solar_tracker.sim import ArmModel
+    from solar_tracker.sim import SimWorld
+    from solar_tracker.sim import VirtualClock
+    from solar_tracker.sim import sim_hardware
+    from solar_tracker.sim import write_location
+    from solar_tracker.trackers import AxisConfig
+    from solar_tracker.trackers import TrackerConfig
+
+    if location:
+        write_location(home, lat, lon)
+
+    config = TrackerConfig(home=home, axes=[AxisConfig("tilt", TILT_RET_CHANNEL, TILT_EXT_CHANNEL, "ang_y")])
+    tilt_arm = ArmModel(pos=20.0, ext_channel=TILT_EXT_CHANNEL, ret_channel=TILT_RET_CHANNEL)
+    world = SimWorld(VirtualClock(start), lat, lon, seed=seed, tilt_arm=tilt_arm)
+    hardware = sim_hardware(world)
+
+    wall_start = time.perf_counter()
+    with open(os.path.join(home, "controller.log"), "w") as log_file:
+        with contextlib.redirect_stdout(log_file):
+            c = controller.Controller(algorithm, configs=[config]).start(hardware, serve_metrics=False)
+            c.run(until=end)
+    wall_s = time.perf_counter() - wall_start
+
+    sim_end = hardware.clock.time()
+    spirals = [line for line in open(os.path.join(home, "controller.log")) if "Spiral scan:" in line]
+    return {
+        "algorithm": algorithm,
+        "energy_wh": hardware.power.energy_wh(),
+        "motor_wh": c.state.move_motor_wh,
+        "ideal_wh": reference_energy_wh(world, start, sim_end),
+        "moves": c.state.moves_count,
+        "spirals": len(spirals),
+        "spiral_evals": sum(int(line.split(" evaluations")[0].split()[-1]) for line in spirals),
+        "tilt_off_deg": abs(tilt_arm.state_at(sim_end)[0] - world.tilt_optimum_at(sim_end)),
+        "simulated_h": (sim_end - start) / 3600,
+        "wall_s": wall_s,
+        "home": home,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--date", default="2026-06-21")
+    parser.add_argument("--lat", type=float, default=37.7749)
+    parser.add_argument("--lon", type=float, default=-122.4194)
+    parser.add_argument("--hours", type=float, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--algorithms", default="pattern,sprt")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="degrees from the peak, for the static search")
+    parser.add_argument("--no-location", action="store_true", help="no location.json, no sun feed-forward")
+    args = parser.parse_args()
+
+    evals, found = static_search(args.seed, args.tolerance)
+    print("Pattern search from {} starts within {:g} degrees: {:0.1f} evaluations on average, at most {}, "
+          "{} ended within {:g} degrees of the peak".format(
+              STATIC_STARTS, STATIC_SPREAD_DEG, sum(evals) / len(evals), max(evals), found, args.tolerance))
+
+    start, end = simulate_day().daylight(args.date, args.lat, args.lon)
+    end = min(end, start + args.hours * 3600)
+
+    with concurrent.futures.ProcessPoolExecutor(max_tasks_per_child=1) as pool:
+        futures = [pool.submit(simulate, a, start, end, args.lat, args.lon, args.seed, not args.no_location)
+                   for a in args.algorithms.split(",")]
+        results = [f.result() for f in futures]
+
+    print("{:<10} {:>10} {:>10} {:>8} {:>8} {:>8} {:>8} {:>12} {:>10} {:>7} {:>7}".format(
+        "", "energy Wh", "% ideal", "motor Wh", "% net", "moves", "spirals", "spiral evals", "tilt off", "sim h", "wall s"))
+    for r in results:
+        print("{:<10} {:>10.1f} {:>10.2f} {:>8.2f} {:>8.2f} {:>8} {:>8} {:>12} {:>10.2f} {:>7.1f} {:>7.1f}".format(
+            r["algorithm"], r["energy_wh"], 100 * r["energy_wh"] / r["ideal_wh"], r["motor_wh"],
+            100 * (r["energy_wh"] - r["motor_wh"]) / r["ideal_wh"], r["moves"], r["spirals"], r["spiral_evals"],
+            r["tilt_off_deg"], r["simulated_h"], r["wall_s"]))
+    for r in results:
+        print("{} log and learned files in {}".format(r["algorithm"], r["home"]))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Import cost and startup time of the controller.
+
+Times importing each solar_tracker module in a fresh interpreter, against
+a bare interpreter start, and checks that the import had no side effects
+(no threads, no metrics port). With --start, on the Pi, also times
+Controller.start() until the first power reading and inclinometer sample
+are in.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+RUNS = 10
+MODULES = [
+    "solar_tracker",
+    "solar_tracker.inclino_client",
+    "solar_tracker.power_sampler",
+    "solar_tracker.scan_store",
+    "solar_tracker.controller",
+]
+
+SIDE_EFFECTS_CHECK = """
+import socket, threading
+import {module}
+assert threading.active_count() == 1, "import started threads"
+s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+s.bind(("", 9732))  # fails if the import bound the metrics port
+"""
+
+
+def time_python(code):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def time_start():
+    from solar_tracker import controller
+
+    start = time.perf_counter()
+    c = controller.Controller().start()
+    started = time.perf_counter()
+    c.state.watts.sampler.wait_for_fresh_sample(0)
+    c.state.inclino.next_sample()
+    ready = time.perf_counter()
+
+    print("Controller.start(): {:0.1f} ms, first power and angle after {:0.1f} ms".format(
+        (started - start) * 1000, (ready - start) * 1000))
+    return c
+
+
+if __name__ == "__main__":
+    bare = time_python("pass")
+    print("bare interpreter: {:0.1f} ms (median of {})".format(bare * 1000, RUNS))
+
+    for module in MODULES:
+        subprocess.run([sys.executable, "-c", SIDE_EFFECTS_CHECK.format(module=module)], cwd=ROOT, check=True)
+        t = time_python("import {}".format(module))
+        print("import {:<32} {:6.1f} ms (+{:0.1f} ms), no side effects".format(
+            module, t * 1000, (t - bare) * 1000))
+
+    if "--start" in sys.argv:
+        time_start()
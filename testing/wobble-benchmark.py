@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Per-sample cost of WobbleDetector vs the old list-based has_wobble().
+
+Feeds a synthetic settle (damped oscillation plus sensor noise, then a long
+tail of noise) through both and prints the cost of checking one more sample
+at growing list sizes. The detector should stay flat, the old check grows
+with the number of samples seen since the move.
+"""
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from solar_tracker.wobble import WobbleDetector
+
+SIZES = [1000, 2000, 5000, 10000, 20000, 50000]
+LEGACY_MAX_SIZE = 10000  # the old check gets too slow to time beyond this
+EQUIVALENCE_SAMPLES = 1500
+
+
+# the has_wobble() that used to live in do.py and measure.py
+def rolling_mean(data, window_size):
+    moving_averages = []
+
+    for i in range(len(data)):
+        new_window_size = window_size
+        if (i + 1) >= window_size:
+            window_start = i - (window_size - 1)
+        else:
+            window_start = 0
+            new_window_size = i + 1
+
+        window = data[window_start:(i + 1)]
+        window_average = sum(window) / new_window_size
+        moving_averages.append(window_average)
+
+    return moving_averages
+
+
+def legacy_has_wobble(angles):
+    sma = rolling_mean(angles, 300)
+    prev_sma = sma[0] - 1
+    for i in range(len(sma)):
+        currnet_sma = sma[i]
+        if abs(prev_sma - currnet_sma) > 0.001:
+            sma[i] = None
+
+        prev_sma = currnet_sma
+
+    for i in range(len(sma)):
+        if sma[i] is not None and abs(angles[i] - sma[i]) > 0.05:
+            sma[i] = None
+
+    for s in sma[-50:]:
+        if s is None:
+            return True
+
+    return False
+
+
+def settle_trace(n, seed=1):
+    rnd = random.Random(seed)
+    angles = []
+    for i in range(n):
+        t = i / 100  # 100 Hz stream
+        wobble = 0.5 * math.exp(-t / 2) * math.sin(2 * math.pi * 1.5 * t)
+        angles.append(20 + wobble + rnd.gauss(0, 0.01))
+    return angles
+
+
+def check_equivalence():
+    angles = settle_trace(EQUIVALENCE_SAMPLES)
+    detector = WobbleDetector()
+    for i, angle in enumerate(angles):
+        if detector.add(angle) != legacy_has_wobble(angles[:i + 1]):
+            print("MISMATCH at sample {}".format(i))
+            return False
+
+    print("equivalence: detector matches has_wobble() on all {} samples".format(EQUIVALENCE_SAMPLES))
+    return True
+
+
+def detector_cost_per_sample(angles):
+    detector = WobbleDetector()
+    for angle in angles[:-1000]:
+        detector.add(angle)
+
+    # time the last 1000 samples, after the detector has seen all the others
+    start = time.perf_counter()
+    for angle in angles[-1000:]:
+        detector.add(angle)
+    return (time.perf_counter() - start) / 1000
+
+
+def legacy_cost_per_sample(angles):
+    start = time.perf_counter()
+    legacy_has_wobble(angles)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    ok = check_equivalence()
+
+    print("{:>8} {:>16} {:>16}".format("samples", "detector us", "has_wobble us"))
+    for n in SIZES:
+        angles = settle_trace(n)
+        detector_us = detector_cost_per_sample(angles) * 1e6
+        if n <= LEGACY_MAX_SIZE:
+            legacy_us = "{:16.1f}".format(legacy_cost_per_sample(angles) * 1e6)
+        else:
+            legacy_us = "{:>16}".format("-")
+        print("{:>8} {:16.2f} {}".format(n, detector_us, legacy_us))
+
+    sys.exit(0 if ok else 1)